@@ -0,0 +1,126 @@
+"""
+Control de admisión por clase de endpoint (bulkheads).
+
+Cada clase de trabajo tiene su propio límite de concurrencia dentro del proceso,
+de modo que un re-entrenamiento, una carga grande y el job de alertas no
+compiten por los mismos hilos que /predict:
+
+- training:    re-entrenamiento (CPU intensivo, minutos).
+- ingestion:   cargas de ventas e inventario, aprobación automática.
+- alerts:      evaluación de alertas (en un hilo aparte).
+- predictions: predicción interactiva.
+- log_streams: conexiones SSE a los logs de los workers (cada una retiene un hilo).
+
+Si la clase está llena, la petición espera en una cola corta (BULKHEAD_<CLASE>_QUEUE
+lugares, hasta BULKHEAD_<CLASE>_TIMEOUT segundos). Con la cola llena se responde
+429 de inmediato; si vence la espera, 503. Ambas con Retry-After. Los límites
+son por proceso (cada worker de gunicorn tiene los suyos).
+"""
+import os
+import threading
+from functools import wraps
+
+from flask import jsonify
+
+from backend.telemetry import Counter, CallbackGauge, register
+
+
+class Bulkhead:
+    """Semáforo con cola de espera acotada y contadores para la exposición de métricas."""
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float, retry_after: int):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, block: bool = True):
+        """
+        Returns:
+            None si se admitió, o el status HTTP de rechazo (429 cola llena, 503 espera vencida).
+        """
+        with self._cond:
+            if self.active < self.max_concurrent:
+                self.active += 1
+                return None
+            if not block or self.waiting >= self.max_queue:
+                return 429
+            self.waiting += 1
+            try:
+                admitted = self._cond.wait_for(lambda: self.active < self.max_concurrent, self.queue_timeout)
+            finally:
+                self.waiting -= 1
+            if not admitted:
+                return 503
+            self.active += 1
+            return None
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+
+def _bulkhead_from_env(name: str, concurrency: int, queue: int, timeout: float, retry_after: int) -> Bulkhead:
+    prefix = f"BULKHEAD_{name.upper()}_"
+    return Bulkhead(
+        name,
+        max_concurrent=int(os.environ.get(prefix + "CONCURRENCY", concurrency)),
+        max_queue=int(os.environ.get(prefix + "QUEUE", queue)),
+        queue_timeout=float(os.environ.get(prefix + "TIMEOUT", timeout)),
+        retry_after=int(os.environ.get(prefix + "RETRY_AFTER", retry_after)),
+    )
+
+
+BULKHEADS = {
+    # Un solo entrenamiento por proceso; el segundo se rechaza sin esperar
+    "training": _bulkhead_from_env("training", 1, 0, 0, 60),
+    "ingestion": _bulkhead_from_env("ingestion", 2, 2, 5, 10),
+    "alerts": _bulkhead_from_env("alerts", 1, 0, 0, 30),
+    "predictions": _bulkhead_from_env("predictions", 8, 16, 2, 1),
+    "log_streams": _bulkhead_from_env("log_streams", 4, 0, 0, 5),
+}
+
+BULKHEAD_REJECTIONS = register(Counter(
+    "bulkhead_rejections_total", "Peticiones rechazadas por clase saturada.", ("bulkhead", "status")
+))
+register(CallbackGauge(
+    "bulkhead_in_flight", "Trabajos en ejecución por clase.", ("bulkhead",),
+    lambda: {(name,): b.active for name, b in BULKHEADS.items()}
+))
+register(CallbackGauge(
+    "bulkhead_queue_depth", "Peticiones esperando lugar por clase.", ("bulkhead",),
+    lambda: {(name,): b.waiting for name, b in BULKHEADS.items()}
+))
+
+
+def rejection_response(bulkhead: Bulkhead, status: int):
+    BULKHEAD_REJECTIONS.inc(bulkhead=bulkhead.name, status=status)
+    response = jsonify({
+        "error": f"Capacidad de '{bulkhead.name}' agotada. Reintente en {bulkhead.retry_after} s."
+    })
+    response.status_code = status
+    response.headers["Retry-After"] = str(bulkhead.retry_after)
+    return response
+
+
+def limit_concurrency(name: str):
+    """Decorador de endpoint: ejecuta la vista dentro del bulkhead 'name'."""
+    bulkhead = BULKHEADS[name]
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            status = bulkhead.acquire()
+            if status is not None:
+                return rejection_response(bulkhead, status)
+            try:
+                return f(*args, **kwargs)
+            finally:
+                bulkhead.release()
+        return decorated_function
+    return decorator
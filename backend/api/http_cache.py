@@ -0,0 +1,56 @@
+"""
+ETag / GET condicional para las respuestas de lectura de la API.
+
+El ETag se deriva de los contadores de 'versiones_datos' de los recursos de los
+que depende la respuesta (ver get_data_versions en db_utils), más la URL, el
+cuerpo de la petición y el día actual (valores por defecto de 'hasta'). Si el
+cliente envía If-None-Match con ese ETag se responde 304 sin ejecutar el
+endpoint: sin consulta a la BD ni serialización.
+"""
+import hashlib
+import datetime
+from functools import wraps
+
+from flask import request, make_response, Response
+
+from backend.database.db_utils import get_data_versions
+
+
+def compute_etag(recursos, versions) -> str:
+    h = hashlib.sha1()
+    for recurso in recursos:
+        h.update(f"{recurso}:{versions.get(recurso, 0)};".encode())
+    h.update(datetime.date.today().isoformat().encode())
+    h.update(request.full_path.encode())
+    h.update(request.get_data())
+    return h.hexdigest()[:20]
+
+
+def etag_cached(*recursos):
+    """
+    Decorador de endpoint: añade ETag a las respuestas 200 y responde 304 si
+    If-None-Match coincide. Sin versiones disponibles (BD caída, tabla ausente)
+    el endpoint se ejecuta normalmente y la respuesta va sin ETag.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            versions = get_data_versions()
+            if versions is None:
+                return f(*args, **kwargs)
+
+            etag = compute_etag(recursos, versions)
+            # Comparación débil (RFC 7232): la capa de compresión envía el ETag como W/"..."
+            if request.if_none_match.contains_weak(etag):
+                not_modified = Response(status=304)
+                not_modified.set_etag(etag)
+                return not_modified
+
+            response = make_response(f(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+                # El cliente puede guardar la respuesta pero debe revalidarla siempre
+                response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return decorated_function
+    return decorator
@@ -0,0 +1,151 @@
+"""
+Capa de respuestas de la API: serialización JSON rápida y compresión negociada.
+
+- JSON: si 'orjson' está instalado, jsonify serializa con él (en C, numpy nativo,
+  NaN -> null). Sin orjson se usa el proveedor estándar de Flask.
+- DataFrames: frame_split() los convierte a la orientación "split" de pandas
+  (columns + data) sin construir un dict por fila.
+- Compresión: respuestas de texto/JSON mayores que COMPRESS_MIN_BYTES se
+  comprimen con brotli (si el paquete está instalado y el cliente lo acepta) o
+  gzip. Las respuestas en stream (/history/batch) se comprimen por fragmentos.
+"""
+import os
+import zlib
+import decimal
+import datetime
+
+import pandas as pd
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # Dependencia opcional: se usa el encoder estándar
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Dependencia opcional: solo gzip
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+COMPRESS_GZIP_LEVEL = int(os.environ.get("COMPRESS_GZIP_LEVEL", 6))
+# Calidad 5: buena relación tamaño/CPU para respuestas dinámicas (11 es para estáticos)
+COMPRESS_BROTLI_QUALITY = int(os.environ.get("COMPRESS_BROTLI_QUALITY", 5))
+COMPRESSIBLE_MIMETYPES = ("application/json", "text/")
+# SSE: el compresor retendría los eventos en su buffer hasta acumular un bloque
+UNCOMPRESSED_MIMETYPES = ("text/event-stream",)
+
+
+def _orjson_default(obj):
+    """Tipos que orjson no serializa de forma nativa."""
+    if isinstance(obj, (datetime.datetime, datetime.date)):  # pd.Timestamp es subclase
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, pd.DataFrame):
+        return frame_split(obj)
+    if obj is pd.NaT or obj is pd.NA:
+        return None
+    raise TypeError(f"Tipo no serializable a JSON: {type(obj).__name__}")
+
+
+ORJSON_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Proveedor JSON de Flask respaldado por orjson (mismo contrato que jsonify)."""
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=_orjson_default, option=ORJSON_OPTIONS).decode()
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=_orjson_default, option=ORJSON_OPTIONS),
+            mimetype=self.mimetype
+        )
+
+
+def frame_split(df: pd.DataFrame) -> dict:
+    """
+    DataFrame -> {"columns": [...], "data": [[...], ...]} (orient 'split', sin índice).
+    Fechas en ISO 8601 y nulos (NaN/NaT) como None; la conversión es por columna.
+    """
+    out = df.copy()
+    for col in out.columns:
+        if pd.api.types.is_datetime64_any_dtype(out[col]):
+            out[col] = out[col].dt.strftime('%Y-%m-%dT%H:%M:%S')
+    values = out.to_numpy(dtype=object)
+    values[pd.isna(values)] = None
+    return {"columns": [str(c) for c in out.columns], "data": values.tolist()}
+
+
+# --- Compresión ---
+
+def _negotiate_encoding():
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return request.accept_encodings.best_match(offered)
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY)
+    compressor = zlib.compressobj(COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 31)  # 31 = cabecera gzip
+    return compressor.compress(data) + compressor.flush()
+
+
+def _compress_stream(chunks, encoding: str):
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=COMPRESS_BROTLI_QUALITY)
+        compress, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 31)
+        compress, finish = compressor.compress, compressor.flush
+    for chunk in chunks:
+        out = compress(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+        if out:
+            yield out
+    yield finish()
+
+
+def compress_response(response):
+    """after_request: comprime el cuerpo si el cliente lo acepta y vale la pena."""
+    if (request.method == "HEAD" or response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough or "Content-Encoding" in response.headers
+            or not (response.mimetype or "").startswith(COMPRESSIBLE_MIMETYPES)
+            or response.mimetype in UNCOMPRESSED_MIMETYPES):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = _negotiate_encoding()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_BYTES:
+            return response
+        response.set_data(_compress(data, encoding))
+
+    response.headers["Content-Encoding"] = encoding
+    # El cuerpo en bytes cambió: el ETag pasa a débil (mismo contenido, otra codificación)
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_response_layer(app):
+    """Instala el proveedor JSON y la compresión en la aplicación Flask."""
+    app.json = FastJSONProvider(app)
+    app.after_request(compress_response)
@@ -2,26 +2,43 @@ import logging
 import pandas as pd
 
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, send_file, Response, stream_with_context, g
 import datetime 
+import time
 import os
-import subprocess
-import signal
 
 # Importar lógica BD
 from backend.database.db_utils import (
     get_db_engine, save_dataframe_to_db, get_model_metrics_history, get_active_alerts,
-    update_alert_status, get_db_engine_and_init, get_config_params, update_config_params,
+    update_alert_status, get_config_params, update_config_params,
     reset_db_tables, get_all_users, update_user_email, get_pipeline_interval, set_pipeline_interval,
-    register_uploaded_file, get_all_uploaded_files, delete_uploaded_file,
-    mark_files_as_processed, update_file_status, get_approved_files, auto_approve_valid_files
+    get_all_uploaded_files, count_uploaded_files_by_status, delete_uploaded_file, find_uploaded_file_by_hash,
+    get_file_rejection_report,
+    update_file_status, get_approved_files, auto_approve_valid_files,
+    get_pipeline_intervals, get_pipeline_enabled, set_pipeline_enabled, get_last_job_runs, get_job_runs,
+    start_job_run, finish_job_run, HISTORY_RESOLUTIONS
+)
+from backend.database.leases import Lease
+from backend.database.pool_stats import pool_stats, pool_occupancy
+from backend.api.http_cache import etag_cached
+from backend.api.responses import frame_split
+from backend.telemetry import HTTP_REQUEST_SECONDS, render_prometheus, PROMETHEUS_CONTENT_TYPE
+from backend.api.admission import BULKHEADS, limit_concurrency, rejection_response
+from backend.database.pagination import clamp_limit, decode_cursor
+from backend.services.ingestion_service import (
+    ingest_dataframe_to_db, process_excel_file_from_disk, compute_file_hash, read_sales_file,
+    DUPLICATE_CONTENT_MSG
 )
-from backend.services.ingestion_service import ingest_dataframe_to_db, process_excel_file_from_disk
 # --- INICIO DE AGREGADO ---
 # Importamos el Servicio de Ingesta (HU-010) y alertas (HU-007)
 from backend.services.auth_service import authenticate_user
 from backend.services.alert_service import run_daily_alert_analysis
+from backend.services.inventory_service import ingest_inventory_file
+from backend.services.history_service import get_product_history, stream_history_batch, HISTORY_BATCH_MAX_SKUS
 from backend.services.email_service import send_alerts_summary
+from backend.services.retraining_service import retrain_and_reload
+from backend.services.scheduler import SCHEDULER
+from backend.services.log_tail import tail_lines, sse_log_stream, TAIL_MAX_LINES
 import threading
 import jwt
 from functools import wraps
@@ -56,19 +73,63 @@ def require_role(roles):
 
 # Importamos la lógica de predicción...
 import backend.ml_core.predict as predictor
-import backend.ml_core.training as training_pipeline
 
 
 # Blueprint
 api_bp = Blueprint('api', __name__)
 
 
+@api_bp.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@api_bp.after_request
+def _record_request_latency(response):
+    """Latencia por ruta (regla de Flask, no la URL: cardinalidad acotada), método y status."""
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, route=route,
+                                     method=request.method, status=response.status_code)
+    return response
+
+
+def _keyset_args():
+    """
+    Parámetros comunes de los listados paginados (query string):
+    limit, cursor (next_cursor de la página anterior), desde/hasta (YYYY-MM-DD).
+
+    Raises:
+        ValueError: Cursor o fechas mal formados.
+    """
+    cursor = request.args.get('cursor')
+    try:
+        desde = datetime.date.fromisoformat(request.args['desde']) if request.args.get('desde') else None
+        hasta = datetime.date.fromisoformat(request.args['hasta']) if request.args.get('hasta') else None
+    except ValueError:
+        raise ValueError("Formato de fecha inválido en 'desde'/'hasta' (use YYYY-MM-DD)")
+    return {
+        "limit": clamp_limit(request.args.get('limit', type=int)),
+        "after": decode_cursor(cursor) if cursor else None,
+        "desde": desde,
+        "hasta": hasta,
+    }
+
+
+def _csv_arg(name):
+    """Lista desde un parámetro repetido o separado por comas (?estado=a,b)."""
+    values = [v.strip() for raw in request.args.getlist(name) for v in raw.split(',') if v.strip()]
+    return values or None
+
+
 
 # --- Endpoint /upload (Refactorizado para usar Servicio Centralizado) ---
 @api_bp.route('/upload', methods=['POST'])
+@limit_concurrency("ingestion")
 def upload_file():
     """
-    Recibe CSV/Excel. Lee el archivo (mantiene lógica de lectura existente).
+    Recibe Excel, CSV, Parquet o Arrow IPC (ver read_sales_file).
     Delega la Validación, Limpieza y Guardado al servicio 'ingest_dataframe_to_db'.
     """
     try:
@@ -80,26 +141,24 @@ def upload_file():
         if file.filename == '':
              return jsonify({"error": "Nombre de archivo vacío"}), 400
 
-        df = None
-        
-        # --- BLOQUE 1: Lectura (MANTENIENDO TU LÓGICA DE LECTURA ROBUSTA) ---
-        try:
-            if file.filename.endswith('.csv'):
-                df = pd.read_csv(file)
-            elif file.filename.endswith(('.xls', '.xlsx')):
-                try:
-                    # Mantenemos tu validación específica de hoja 'Detalle'
-                    df = pd.read_excel(file, sheet_name='Detalle', engine='openpyxl')
-                    logging.info(f"Leída hoja 'Detalle' del archivo Excel '{file.filename}'.")
-                except ValueError as sheet_error:
-                    logging.error(f"Error al leer hoja 'Detalle' de '{file.filename}': {sheet_error}")
-                    return jsonify({"error": "El archivo Excel no contiene una hoja llamada 'Detalle'."}), 400
-                except Exception as excel_read_error:
-                    logging.error(f"Error general al leer Excel '{file.filename}': {excel_read_error}", exc_info=True)
-                    return jsonify({"error": f"Error al leer el archivo Excel: {excel_read_error}"}), 400
-            else:
-                return jsonify({"error": "Formato de archivo no soportado (solo .csv, .xls, .xlsx)"}), 400
+        # --- BLOQUE 0: Deduplicación por contenido (antes de parsear nada) ---
+        hash_contenido = compute_file_hash(file.stream)
+        existente = find_uploaded_file_by_hash(hash_contenido)
+        if existente:
+            logging.warning(f"Archivo '{file.filename}' rechazado: mismo contenido que el archivo #{existente['id']}.")
+            return jsonify({
+                "error": f"El archivo ya fue cargado como '{existente['nombre_archivo']}' "
+                         f"el {existente['fecha_carga']} (estado: {existente['estado']}).",
+                "archivo_existente": existente
+            }), 409
 
+        # --- BLOQUE 1: Lectura (Excel 'Detalle', CSV vía Arrow, Parquet, Arrow IPC) ---
+        try:
+            df = read_sales_file(file.stream, file.filename)
+            logging.info(f"Leído '{file.filename}': {len(df)} filas.")
+        except ValueError as read_error:
+            logging.error(f"Error de formato en '{file.filename}': {read_error}")
+            return jsonify({"error": str(read_error)}), 400
         except Exception as e:
             logging.error(f"Error al intentar leer el archivo '{file.filename}': {e}", exc_info=True)
             return jsonify({"error": f"Error general al leer el archivo: {e}"}), 400
@@ -112,22 +171,19 @@ def upload_file():
              logging.warning(f"El archivo '{file.filename}' (o la hoja 'Detalle') está vacío.")
              return jsonify({"error": "El archivo o la hoja 'Detalle' está vacía."}), 400
 
-        # --- BLOQUE 2: Procesamiento y Guardado ---
-        success, message, rows_saved = ingest_dataframe_to_db(df, f"Manual_{file.filename}")
-
-        # --- BLOQUE 3: Registrar en archivos_cargados ---
+        # --- BLOQUE 2: Procesamiento, Guardado y Registro en archivos_cargados ---
         cargado_por = "Sistema"
         if hasattr(request, 'user') and request.user:
             cargado_por = request.user.get('username', 'Sistema')
 
+        success, message, rows_saved = ingest_dataframe_to_db(
+            df, f"Manual_{file.filename}",
+            nombre_archivo=file.filename,
+            cargado_por=cargado_por,
+            hash_contenido=hash_contenido
+        )
+
         if success:
-            register_uploaded_file(
-                nombre_archivo=file.filename,
-                estado='valido',
-                filas_guardadas=rows_saved,
-                mensaje=message,
-                cargado_por=cargado_por
-            )
             summary = {
                 "archivo_recibido": file.filename,
                 "filas_leidas_originales": len(df),
@@ -135,14 +191,10 @@ def upload_file():
             }
             logging.info(f"Datos guardados con éxito. Resumen: {summary}")
             return jsonify({"message": message, "data_summary": summary}), 201
+        elif message == DUPLICATE_CONTENT_MSG:
+            # Carrera con otra carga del mismo archivo: la resolvió el índice único del hash
+            return jsonify({"error": message, "archivo_existente": find_uploaded_file_by_hash(hash_contenido)}), 409
         else:
-            register_uploaded_file(
-                nombre_archivo=file.filename,
-                estado='invalido',
-                filas_guardadas=0,
-                mensaje=message,
-                cargado_por=cargado_por
-            )
             logging.error(f"Fallo en el procesamiento del servicio: {message}")
             return jsonify({"error": message}), 400
 
@@ -152,6 +204,7 @@ def upload_file():
 
 # --- INICIO DE AGREGADO: Endpoint Ingesta Automatizada HU-010 ---
 @api_bp.route('/api/v1/trigger_ingestion', methods=['POST'])
+@limit_concurrency("ingestion")
 def trigger_ingestion():
     """
     Pipeline 'Ingesta de Datos'.
@@ -177,6 +230,7 @@ def trigger_ingestion():
 
 # --- Endpoint /predict (ACTUALIZADO para usar el predictor importado) ---
 @api_bp.route('/predict', methods=['POST'])
+@limit_concurrency("predictions")
 def predict():
     """
     Recibe id_producto y fecha_str, devuelve predicción de cantidad (MVP).
@@ -211,12 +265,44 @@ def predict():
         return jsonify({"error": f"Error interno en la predicción: {e}"}), 500
 
 
+# Ventana por defecto de /history cuando no se indica 'desde' (0 = historial completo)
+HISTORY_DEFAULT_MONTHS = int(os.environ.get("HISTORY_DEFAULT_MONTHS", 36))
+
+def _history_window(data):
+    """
+    Ventana y resolución comunes de /history y /history/batch (payload JSON).
+
+    Raises:
+        ValueError: Fechas o resolución inválidas.
+    """
+    try:
+        hasta = datetime.date.fromisoformat(data['hasta']) if data.get('hasta') else datetime.date.today()
+        if data.get('desde'):
+            desde = datetime.date.fromisoformat(data['desde'])
+        elif HISTORY_DEFAULT_MONTHS > 0:
+            desde = hasta - datetime.timedelta(days=HISTORY_DEFAULT_MONTHS * 31)
+        else:
+            desde = datetime.date(1900, 1, 1)  # Historial completo
+    except (TypeError, ValueError):
+        raise ValueError("Formato de fecha inválido en 'desde'/'hasta' (use YYYY-MM-DD)")
+
+    resolucion = data.get('resolucion') or 'day'
+    if resolucion not in HISTORY_RESOLUTIONS:
+        raise ValueError(f"'resolucion' inválida (use {', '.join(HISTORY_RESOLUTIONS)})")
+    return desde, hasta, resolucion
+
 # --- Endpoint /history (Revertido a MVP y CORREGIDO) ---
 @api_bp.route('/history', methods=['POST'])
+@etag_cached("ventas")
 def get_history():
     """
     Recibe id_producto, devuelve historial de cantidad_vendida (MVP).
-    CORREGIDO para manejar fechas correctamente.
+    Devuelve unidades vendidas por período, agregadas en SQL sobre ventas_diarias.
+    Opcional:
+    - 'desde' / 'hasta' (YYYY-MM-DD). Por defecto, los últimos HISTORY_DEFAULT_MONTHS meses.
+    - 'resolucion': 'day' (defecto), 'week' o 'month'.
+    - 'max_points': máximo de puntos a devolver; series más largas se reducen con LTTB
+      (tope HISTORY_MAX_POINTS).
     """
     try:
         data = request.get_json()
@@ -227,103 +313,144 @@ def get_history():
         if not id_producto:
             return jsonify({"error": "Falta 'id_producto'"}), 400
 
-        engine = get_db_engine()
-        if engine is None:
-            logging.error("Fallo al obtener conexión a BD en /history.")
-            return jsonify({"error": "Error interno del servidor (BD)"}), 500
-
-        # Consulta segura
-        # <-- CAMBIO: Nombre de tabla actualizado a 'ventas_detalle'
-        query = "SELECT fecha, cantidad_vendida FROM ventas_detalle WHERE id_producto = %s ORDER BY fecha ASC"
-
-        # Usar try-except específico para la consulta
         try:
-            df_hist = pd.read_sql(
-                query,
-                con=engine,
-                params=(str(id_producto),) # Asegurar que es string para el parámetro
-            )
-        except Exception as db_err:
-             logging.error(f"Error al ejecutar consulta de historial para '{id_producto}': {db_err}", exc_info=True)
-             return jsonify({"error": f"Error consultando la base de datos: {db_err}"}), 500
-
-
-        # --- CORRECCIÓN CLAVE ---
-        # Convertir la columna 'fecha' a string ANTES de convertir a dict
-        if 'fecha' in df_hist.columns:
-            # Formato YYYY-MM-DD es estándar y bueno para JSON/JS
-             df_hist['fecha'] = pd.to_datetime(df_hist['fecha']).dt.strftime('%Y-%m-%d')
-        else:
-            logging.warning(f"La consulta de historial para '{id_producto}' no devolvió la columna 'fecha'.")
-            return jsonify({"historial": []}), 200 
+            desde, hasta, resolucion = _history_window(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-        # Asegurar que cantidad_vendida sea numérica (int)
-        if 'cantidad_vendida' in df_hist.columns:
-             df_hist['cantidad_vendida'] = pd.to_numeric(df_hist['cantidad_vendida'], errors='coerce').fillna(0).astype(int)
+        max_points = data.get('max_points')
+        if max_points is not None and (not isinstance(max_points, int) or max_points < 1):
+            return jsonify({"error": "'max_points' debe ser un entero positivo"}), 400
 
-        # Convertir a lista de diccionarios (JSON serializable)
-        historial = df_hist.to_dict('records')
+        success, msg, payload = get_product_history(str(id_producto), desde, hasta, resolucion, max_points)
+        if not success:
+            logging.error(f"Error al obtener historial para '{id_producto}': {msg}")
+            return jsonify({"error": msg}), 500
 
-        return jsonify({"historial": historial}), 200
+        return jsonify(payload), 200
 
     except Exception as e:
         # Captura general por si algo más falla
         logging.error(f"[ERROR /history MVP] {e}", exc_info=True)
         return jsonify({"error": f"Error interno obteniendo historial: {e}"}), 500
 
+@api_bp.route('/history/batch', methods=['POST'])
+@etag_cached("ventas")
+def get_history_batch():
+    """
+    Historial de varios SKUs en una sola consulta y un solo viaje de red.
+    Recibe {"ids_producto": [...], "desde", "hasta", "resolucion"} (mismos valores
+    por defecto que /history) y responde JSON columnar por SKU, emitido en stream:
+    {"series": {"SKU": {"fechas": [...], "cantidades": [...]}}, ...}.
+    """
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "Payload JSON vacío"}), 400
+
+    ids_producto = data.get('ids_producto')
+    if not isinstance(ids_producto, list) or not ids_producto:
+        return jsonify({"error": "'ids_producto' debe ser una lista no vacía"}), 400
+    # Sin duplicados, conservando el orden recibido
+    ids_producto = list(dict.fromkeys(str(i).strip() for i in ids_producto if str(i).strip()))
+    if len(ids_producto) > HISTORY_BATCH_MAX_SKUS:
+        return jsonify({"error": f"Máximo {HISTORY_BATCH_MAX_SKUS} SKUs por consulta"}), 400
+
+    try:
+        desde, hasta, resolucion = _history_window(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    engine = get_db_engine()
+    if engine is None:
+        logging.error("Fallo al obtener conexión a BD en /history/batch.")
+        return jsonify({"error": "Error interno del servidor (BD)"}), 500
+
+    return Response(
+        stream_with_context(stream_history_batch(ids_producto, desde, hasta, resolucion, engine)),
+        mimetype='application/json'
+    )
+
 # --- Endpoint de Health Check (opcional pero útil) ---
 @api_bp.route('/health')
 def health_check():
     """Verifica si el servidor está vivo."""
     return {"status": "ok"}, 200
 
+# --- Endpoint interno: telemetría del pool de conexiones ---
+@api_bp.route('/api/v1/internal/db_pool', methods=['GET'])
+def db_pool_stats():
+    """
+    Latencia de checkout, ocupación del pool y churn de conexiones físicas
+    del proceso actual (cada worker de gunicorn tiene su propio pool).
+    """
+    try:
+        engine = get_db_engine()
+        if engine is None:
+            return jsonify({"error": "No se pudo conectar a la base de datos."}), 503
+        return jsonify({
+            "pid": os.getpid(),
+            "pool": pool_occupancy(engine),
+            "stats": pool_stats.snapshot()
+        }), 200
+    except Exception as e:
+        logging.error(f"Error en GET /api/v1/internal/db_pool: {e}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+
+@api_bp.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Histogramas de latencia del proceso (API, SQL, inferencia, entrenamiento) en
+    formato de texto de Prometheus. Las métricas de los modelos (MAE, RMSE, R²)
+    siguen en /api/v1/metrics.
+    """
+    return Response(render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+def _job_already_running(job_id: str):
+    """
+    409 para un segundo disparo mientras otra réplica (o este proceso) ejecuta el
+    job: incluye la ejecución en curso de job_runs para seguir su estado.
+    """
+    last_run = get_last_job_runs([job_id]).get(job_id)
+    return jsonify({
+        "error": "El trabajo ya se está ejecutando en otra instancia.",
+        "job": job_id,
+        "run": last_run if last_run and last_run["estado"] == "running" else None,
+        "status_url": f"/api/v1/pipeline/{job_id}/runs",
+    }), 409
+
 
 # --- INICIO DE NUEVO CÓDIGO (ENDPOINT DE RE-ENTRENAMIENTO) ---
 @api_bp.route('/api/v1/trigger_retraining', methods=['POST'])
+@limit_concurrency("training")
 def trigger_retraining():
     """
     Endpoint protegido (por la UI) para disparar el re-entrenamiento
-    y la recarga de modelos en vivo.
+    y la recarga de modelos en vivo. Corre bajo el lease 'training' del clúster
+    (el mismo del job 'worker_retraining'): si ya hay uno en curso, 409.
     """
     logging.info("Solicitud de re-entrenamiento recibida por la API...")
     
     try:
-        # 1. Ejecutar el pipeline de entrenamiento
-        # (Llama a la función 'train_and_evaluate' de training.py)
-        # Esta función ahora devuelve un diccionario con estado y métricas.
-        training_results = training_pipeline.train_and_evaluate()
-        
-        # Verificar si el entrenamiento falló
-        if not training_results or training_results.get("status") != "success":
-            error_msg = training_results.get("message", "Error desconocido durante el entrenamiento.")
-            logging.error(f"El pipeline de entrenamiento falló: {error_msg}")
-            return jsonify({"error": "Falló el pipeline de entrenamiento.", "details": error_msg}), 500
-
-        # 2. Recargar los modelos en la memoria de 'predict.py'
-        # (Llama a la función 'reload_artifacts' de predict.py)
-        logging.info("Entrenamiento completado. Recargando modelos en vivo...")
-        reload_success = predictor.reload_artifacts() # ¡Llamada clave!
-        
-        if not reload_success:
-            # Esto es un estado crítico: el entrenamiento funcionó pero el servidor
-            # sigue usando los modelos antiguos.
-            logging.error("¡FALLO CRÍTICO! Entrenamiento exitoso, pero no se pudieron recargar los nuevos modelos en vivo.")
-            return jsonify({
-                "error": "Entrenamiento exitoso, pero la recarga de modelos falló. Se requiere reinicio manual del servidor backend.",
-                "metrics": training_results.get("metrics", {})
-            }), 500
-        
-        logging.info("Modelos recargados en vivo con éxito.")
-        
-        # 3a. Marcar archivos como 'procesado' ahora que el modelo los usó
-        mark_files_as_processed()
-        
-        # 3b. Devolver éxito y métricas al frontend
-        return jsonify({
-            "message": "Re-entrenamiento completado y modelos recargados en vivo con éxito.",
-            "metrics": training_results.get("metrics", {}),
-            "save_status": training_results.get("save_status", [])
-        }), 200
+        lease = Lease("training")
+        if not lease.acquire():
+            return _job_already_running("worker_retraining")
+        try:
+            run_id = start_job_run("worker_retraining")
+            start = time.perf_counter()
+            try:
+                success, message, payload = retrain_and_reload()
+            except Exception as e:
+                finish_job_run(run_id, "error", f"Disparo manual: {e}", time.perf_counter() - start)
+                raise
+            finish_job_run(run_id, "success" if success else "error", f"Disparo manual: {message}",
+                           time.perf_counter() - start)
+        finally:
+            lease.release()
+        if not success:
+            return jsonify({"error": message, **payload}), 500
+        return jsonify({"message": message, **payload}), 200
 
     except Exception as e:
         # Captura de error general para el endpoint
@@ -332,11 +459,24 @@ def trigger_retraining():
 
 # --- Endpoint: Registro de Archivos Cargados ---
 @api_bp.route('/api/v1/files', methods=['GET'])
+@etag_cached("archivos")
 def list_uploaded_files():
-    """Retorna todos los archivos registrados en archivos_cargados."""
+    """
+    Lista paginada de archivos_cargados (más recientes primero).
+    Query params: estado (uno o varios, separados por coma), desde, hasta, limit, cursor.
+    Responde {"items": [...], "next_cursor": str|null, "conteos": {estado: n}}.
+    """
     try:
-        files = get_all_uploaded_files()
-        return jsonify(files), 200
+        try:
+            page_args = _keyset_args()
+        except ValueError as ve:
+            return jsonify({"error": str(ve)}), 400
+        files, next_cursor = get_all_uploaded_files(estados=_csv_arg('estado'), **page_args)
+        return jsonify({
+            "items": files,
+            "next_cursor": next_cursor,
+            "conteos": count_uploaded_files_by_status()
+        }), 200
     except Exception as e:
         logging.error(f"Error en GET /api/v1/files: {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
@@ -344,8 +484,8 @@ def list_uploaded_files():
 @api_bp.route('/api/v1/files/<int:file_id>', methods=['DELETE'])
 def delete_file_record(file_id):
     """
-    Elimina el registro del archivo de la tabla archivos_cargados.
-    NOTA: Los datos de ventas_detalle ya ingresados NO se eliminan.
+    Elimina el registro del archivo de la tabla archivos_cargados junto con
+    las filas de ventas que aportó (ver delete_uploaded_file).
     """
     try:
         success = delete_uploaded_file(file_id)
@@ -357,6 +497,47 @@ def delete_file_record(file_id):
         logging.error(f"Error en DELETE /api/v1/files/{file_id}: {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+@api_bp.route('/api/v1/files/<int:file_id>/rejections', methods=['GET'])
+def get_file_rejections(file_id):
+    """
+    Reporte de filas rechazadas en la validación de un archivo.
+    Query params:
+      - format=parquet: descarga el sidecar Parquet completo.
+      - limit (int, default 500): filas incluidas en la respuesta JSON.
+    'filas' va en orientación split: {"columns": [...], "data": [[...], ...]}.
+    """
+    try:
+        report = get_file_rejection_report(file_id)
+        if report is None:
+            return jsonify({"error": "Archivo no encontrado."}), 404
+
+        path = report.get('reporte_rechazos')
+        if not path or not os.path.exists(path):
+            return jsonify({
+                "archivo_id": file_id,
+                "nombre_archivo": report['nombre_archivo'],
+                "rechazos_por_regla": report['rechazos_por_regla'],
+                "total": 0,
+                "filas": []
+            }), 200
+
+        if request.args.get('format') == 'parquet':
+            return send_file(path, mimetype='application/vnd.apache.parquet', as_attachment=True,
+                             download_name=os.path.basename(path))
+
+        limit = request.args.get('limit', 500, type=int)
+        df_rej = pd.read_parquet(path)
+        return jsonify({
+            "archivo_id": file_id,
+            "nombre_archivo": report['nombre_archivo'],
+            "rechazos_por_regla": report['rechazos_por_regla'],
+            "total": len(df_rej),
+            "filas": frame_split(df_rej.head(limit))
+        }), 200
+    except Exception as e:
+        logging.error(f"Error en GET /api/v1/files/{file_id}/rejections: {e}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
 @api_bp.route('/api/v1/files/<int:file_id>/status', methods=['PUT'])
 def update_file_status_endpoint(file_id):
     """
@@ -389,27 +570,25 @@ def list_approved_files():
 
 # --- Endpoint 7: Obtener Historial de Métricas (HU-011) ---
 @api_bp.route('/api/v1/metrics', methods=['GET'])
+@etag_cached("metricas")
 def get_metrics_history():
     """
     Devuelve el historial de métricas de rendimiento de los modelos
-    almacenado en la base de datos (tabla model_metrics).
+    almacenado en la base de datos (tabla entrenamiento), paginado.
+    Query params: desde, hasta, limit, cursor.
     """
     try:
         engine = get_db_engine()
         if engine is None:
             return jsonify({"error": "Error interno: No hay conexión a BD"}), 500
 
-        # Obtener historial usando la función de utilidad
-        df_metrics = get_model_metrics_history(engine)
-        
-        # Si está vacío, devolver lista vacía
-        if df_metrics.empty:
-            return jsonify({"metrics": []}), 200
-            
-        # Convertir a lista de diccionarios para JSON
-        metrics_data = df_metrics.to_dict(orient='records')
-        
-        return jsonify({"metrics": metrics_data}), 200
+        try:
+            page_args = _keyset_args()
+        except ValueError as ve:
+            return jsonify({"error": str(ve)}), 400
+
+        metrics_data, next_cursor = get_model_metrics_history(engine, **page_args)
+        return jsonify({"metrics": metrics_data, "next_cursor": next_cursor}), 200
 
     except Exception as e:
         logging.error(f"Error obteniendo historial de métricas: {e}", exc_info=True)
@@ -454,15 +633,24 @@ def login():
 
 # --- INICIO DE AGREGADO: Alertas (HU-007) ---
 @api_bp.route('/api/alerts', methods=['GET'])
+@etag_cached("alertas")
 def get_alerts():
-    """Retorna la lista de alertas pendientes."""
+    """
+    Lista paginada de alertas (más recientes primero).
+    Query params: estado (por defecto PENDIENTE,EN GESTIÓN), desde, hasta, limit, cursor.
+    """
     try:
-        engine = get_db_engine_and_init()
+        engine = get_db_engine()
         if not engine:
             return jsonify({"error": "Error de conexión a BD"}), 500
-            
-        alerts = get_active_alerts(engine)
-        return jsonify(alerts), 200
+
+        try:
+            page_args = _keyset_args()
+        except ValueError as ve:
+            return jsonify({"error": str(ve)}), 400
+
+        alerts, next_cursor = get_active_alerts(engine, estados=_csv_arg('estado'), **page_args)
+        return jsonify({"items": alerts, "next_cursor": next_cursor}), 200
     except Exception as e:
         logging.error(f"Error en GET /api/alerts: {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
@@ -488,19 +676,80 @@ def update_alert(alert_id):
         logging.error(f"Error en PUT /api/alerts/<id>/status: {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+@api_bp.route('/api/inventory/upload', methods=['POST'])
+@limit_concurrency("ingestion")
+def upload_inventory():
+    """
+    Recibe un snapshot de stock (Excel, CSV o Parquet) y lo fusiona en 'inventario'
+    mediante COPY a staging + un único upsert (ver upsert_inventory_data).
+    """
+    try:
+        if 'file' not in request.files:
+            return jsonify({"error": "No se encontró el archivo"}), 400
+
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({"error": "Nombre de archivo vacío"}), 400
+
+        success, message, filas_leidas, skus = ingest_inventory_file(file.stream, file.filename)
+        if not success:
+            logging.error(f"Fallo en la carga de inventario '{file.filename}': {message}")
+            return jsonify({"error": message}), 400
+
+        summary = {
+            "archivo_recibido": file.filename,
+            "filas_leidas_originales": filas_leidas,
+            "skus_actualizados": skus
+        }
+        logging.info(f"Inventario cargado con éxito. Resumen: {summary}")
+        return jsonify({"message": message, "data_summary": summary}), 201
+    except Exception as e:
+        logging.error(f"Error en POST /api/inventory/upload: {e}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+def _run_alert_job(bulkhead, lease, run_id):
+    start = time.perf_counter()
+    try:
+        ok = run_daily_alert_analysis()
+        finish_job_run(run_id, "success" if ok else "error",
+                       "Disparo manual: análisis de alertas " + ("completado." if ok else "fallido."),
+                       time.perf_counter() - start)
+    except Exception as e:
+        logging.error(f"Error en el job de alertas en background: {e}", exc_info=True)
+        finish_job_run(run_id, "error", f"Disparo manual: {e}", time.perf_counter() - start)
+    finally:
+        lease.release()
+        bulkhead.release()
+
 @api_bp.route('/api/jobs/generate-alerts', methods=['POST'])
 def trigger_generate_alerts():
-    """Gatilla el análisis diario de alertas en background."""
+    """
+    Gatilla el análisis diario de alertas en background.
+    El hilo ocupa el bulkhead 'alerts' y el lease 'alerts' del clúster hasta
+    terminar: un segundo disparo mientras corre el primero recibe 429 (mismo
+    proceso) o 409 con la ejecución en curso (otra réplica o el planificador).
+    """
+    bulkhead = BULKHEADS["alerts"]
+    status = bulkhead.acquire(block=False)
+    if status is not None:
+        return rejection_response(bulkhead, status)
+    lease = None
     try:
-        # Asegurar inicialización de la tabla antes del hilo
-        get_db_engine_and_init()
-        
+        lease = Lease("alerts")
+        if not lease.acquire():
+            bulkhead.release()
+            return _job_already_running("worker_alerts")
+        run_id = start_job_run("worker_alerts")
         # Ejecutar en thread para retornar 202 rápido
-        thread = threading.Thread(target=run_daily_alert_analysis)
+        thread = threading.Thread(target=_run_alert_job, args=(bulkhead, lease, run_id))
         thread.start()
         
-        return jsonify({"message": "Job de alertas iniciado en background"}), 202
+        return jsonify({"message": "Job de alertas iniciado en background",
+                        "status_url": "/api/v1/pipeline/worker_alerts/runs"}), 202
     except Exception as e:
+        if lease is not None:
+            lease.release()
+        bulkhead.release()
         logging.error(f"Error en POST /api/jobs/generate-alerts: {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
@@ -509,7 +758,7 @@ def trigger_generate_alerts():
 def get_config():
     """Retorna la configuración actual del sistema."""
     try:
-        engine = get_db_engine_and_init()
+        engine = get_db_engine()
         if not engine:
             return jsonify({"error": "Error de conexión a BD"}), 500
         config = get_config_params(engine)
@@ -526,7 +775,7 @@ def update_config():
         if not data:
             return jsonify({"error": "No se enviaron datos"}), 400
         
-        engine = get_db_engine_and_init()
+        engine = get_db_engine()
         success = update_config_params(data, engine)
         if success:
             return jsonify({"message": "Configuración actualizada correctamente"}), 200
@@ -571,14 +820,23 @@ def test_email():
 
 # --- INICIO DE AGREGADO: Configuración de Alertas (HU-012) ---
 @api_bp.route('/api/v1/alerts/config', methods=['GET'])
+@etag_cached("alert_config")
 def get_alert_config_endpoint():
-    """Obtiene las configuraciones de alertas."""
+    """
+    Lista paginada de configuraciones de alertas (actualizadas más recientemente primero).
+    Query params: is_active (true/false), desde, hasta, limit, cursor.
+    """
     try:
-        skip = int(request.args.get('skip', 0))
-        limit = int(request.args.get('limit', 100))
+        try:
+            page_args = _keyset_args()
+        except ValueError as ve:
+            return jsonify({"error": str(ve)}), 400
+        is_active = request.args.get('is_active')
+        if is_active is not None:
+            is_active = is_active.lower() in ('1', 'true', 'si', 'sí')
         engine = get_db_engine()
-        configs = get_alert_configs(engine, skip, limit)
-        return jsonify(configs), 200
+        configs, next_cursor = get_alert_configs(engine, is_active=is_active, **page_args)
+        return jsonify({"items": configs, "next_cursor": next_cursor}), 200
     except Exception as e:
         logging.error(f"Error en GET /api/v1/alerts/config: {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
@@ -627,9 +885,14 @@ def reset_db_endpoint():
 
 @api_bp.route('/api/v1/users', methods=['GET'])
 def get_users_endpoint():
+    """Lista paginada de usuarios. Query params: rol, desde, hasta, limit, cursor."""
     try:
-        users = get_all_users()
-        return jsonify(users), 200
+        try:
+            page_args = _keyset_args()
+        except ValueError as ve:
+            return jsonify({"error": str(ve)}), 400
+        users, next_cursor = get_all_users(rol=request.args.get('rol'), **page_args)
+        return jsonify({"items": users, "next_cursor": next_cursor}), 200
     except Exception as e:
         logging.error(f"Error en GET /api/v1/users: {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
@@ -653,266 +916,187 @@ def update_email_endpoint(user_id):
 
 
 # ============================================================
-# PIPELINE MANAGER — Control de Workers desde la UI
+# PIPELINE MANAGER — Control de los jobs del planificador desde la UI
 # ============================================================
-
-SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts")
-SCRIPTS_DIR = os.path.normpath(SCRIPTS_DIR)
-
-WORKERS = [
-    {"id": "worker_ingestion",   "script": "worker_ingestion.sh",   "label": "Ingesta de Datos",    "log": "ingestion.log",   "default_interval": 30},
-    {"id": "worker_retraining",  "script": "worker_retraining.sh",  "label": "Reentrenamiento ML",  "log": "retraining.log",  "default_interval": 60},
-    {"id": "worker_metrics",     "script": "worker_metrics.sh",     "label": "Métricas",            "log": "metrics.log",    "default_interval": 300},
-    {"id": "worker_alerts",      "script": "worker_alerts.sh",      "label": "Alertas",             "log": "alerts.log",     "default_interval": 180},
-]
-
-def _get_pid_file(worker_id):
-    return os.path.join(SCRIPTS_DIR, "pids", f"{worker_id}.sh.pid")
-
-def _is_running(worker_id):
-    pid_file = _get_pid_file(worker_id)
-    if not os.path.exists(pid_file):
-        return False
-    try:
-        with open(pid_file) as f:
-            pid = int(f.read().strip())
-        os.kill(pid, 0)  # Signal 0: solo verifica si el proceso existe
-        return True
-    except (ProcessLookupError, ValueError, OSError):
-        # El proceso no existe, limpiar el archivo PID stale
-        try:
-            os.remove(pid_file)
-        except Exception:
-            pass
-        return False
-
-def _get_pid(worker_id):
-    pid_file = _get_pid_file(worker_id)
-    try:
-        with open(pid_file) as f:
-            return int(f.read().strip())
-    except Exception:
-        return None
+# Los jobs corren en el planificador del backend (backend/services/scheduler.py).
+# Iniciar / detener cambia su flag en configuracion_sistema; el estado de
+# ejecución y el historial salen de job_runs, válidos desde cualquier proceso.
+
+def _job_status(job, enabled, intervals, last_runs):
+    last_run = last_runs.get(job.id)
+    return {
+        "id": job.id,
+        "label": job.label,
+        "log": job.log,
+        "enabled": enabled.get(job.id, False),
+        "executing": bool(last_run and last_run["estado"] == "running"),
+        "trigger": "events" if job.event_driven else "interval",
+        "triggers": sorted(job.triggers),
+        "debounce_s": job.debounce,
+        "interval_minutes": intervals.get(job.id),
+        "next_run_in_s": SCHEDULER.seconds_to_next_run(job.id),
+        "last_run": last_run,
+    }
 
 
 @api_bp.route('/api/v1/pipeline/status', methods=['GET'])
 def pipeline_status():
-    """Retorna el estado de todos los workers del pipeline."""
-    result = []
-    for w in WORKERS:
-        running = _is_running(w["id"])
-        pid = _get_pid(w["id"]) if running else None
-        result.append({
-            "id": w["id"],
-            "label": w["label"],
-            "script": w["script"],
-            "running": running,
-            "pid": pid,
-            "log": w["log"],
-            "default_interval": w["default_interval"]
-        })
-    return jsonify(result), 200
+    """Retorna el estado de todos los jobs del pipeline."""
+    enabled = get_pipeline_enabled()
+    intervals = get_pipeline_intervals()
+    last_runs = get_last_job_runs(list(SCHEDULER.jobs))
+    return jsonify([_job_status(job, enabled, intervals, last_runs) for job in SCHEDULER.jobs.values()]), 200
+
+
+def _set_jobs_enabled(job_ids, enabled_flag):
+    """Cambia el flag de los jobs indicados. Retorna [{id, status}] según el estado previo."""
+    previous = get_pipeline_enabled()
+    changed = [jid for jid in job_ids if previous.get(jid) != enabled_flag]
+    if changed and not set_pipeline_enabled(changed, enabled_flag):
+        return None
+    SCHEDULER.wake()
+    if enabled_flag:
+        return [{"id": jid, "status": "started" if jid in changed else "already_running"} for jid in job_ids]
+    return [{"id": jid, "status": "stopped" if jid in changed else "already_stopped"} for jid in job_ids]
 
 
 @api_bp.route('/api/v1/pipeline/<worker_id>/start', methods=['POST'])
 def pipeline_start_worker(worker_id):
-    """Inicia un worker específico usando nohup (persiste más allá del proceso padre)."""
-    worker = next((w for w in WORKERS if w["id"] == worker_id), None)
-    if not worker:
+    """Activa un job: el planificador lo ejecuta de inmediato y luego ante cada evento (o intervalo)."""
+    job = SCHEDULER.jobs.get(worker_id)
+    if not job:
         return jsonify({"error": f"Worker '{worker_id}' no encontrado"}), 404
 
-    if _is_running(worker_id):
-        pid = _get_pid(worker_id)
-        return jsonify({"message": f"Worker ya está corriendo", "pid": pid}), 200
-
-    try:
-        script_path = os.path.join(SCRIPTS_DIR, worker["script"])
-        pid_file = _get_pid_file(worker_id)
-        log_file = os.path.join(SCRIPTS_DIR, "logs", worker["log"])
-
-        # Asegurar que el script sea ejecutable
-        os.chmod(script_path, 0o755)
-        os.makedirs(os.path.dirname(pid_file), exist_ok=True)
-        os.makedirs(os.path.dirname(log_file), exist_ok=True)
-
-        # Iniciar con nohup para que sobreviva el proceso padre
-        process = subprocess.Popen(
-            ["bash", script_path],
-            stdout=open(log_file, 'a'),
-            stderr=subprocess.STDOUT,
-            preexec_fn=os.setsid,  # Nuevo grupo de procesos (sobrevive recargas)
-            close_fds=True
-        )
-
-        with open(pid_file, 'w') as f:
-            f.write(str(process.pid))
-
-        logging.info(f"Pipeline: Worker '{worker_id}' iniciado con PID {process.pid}")
-        worker_label = worker['label']
-        return jsonify({"message": f"Worker '{worker_label}' iniciado", "pid": process.pid}), 200
-
-    except Exception as e:
-        logging.error(f"Error iniciando worker '{worker_id}': {e}", exc_info=True)
-        return jsonify({"error": str(e)}), 500
+    results = _set_jobs_enabled([worker_id], True)
+    if results is None:
+        return jsonify({"error": "No se pudo guardar el estado del job en la base de datos"}), 500
+    if results[0]["status"] == "already_running":
+        return jsonify({"message": "Worker ya está corriendo"}), 200
+    logging.info(f"Pipeline: Job '{worker_id}' activado")
+    return jsonify({"message": f"Worker '{job.label}' iniciado"}), 200
 
 
 @api_bp.route('/api/v1/pipeline/<worker_id>/stop', methods=['POST'])
 def pipeline_stop_worker(worker_id):
-    """Detiene un worker específico enviando SIGTERM al grupo de procesos."""
-    worker = next((w for w in WORKERS if w["id"] == worker_id), None)
-    if not worker:
+    """Detiene un job. Una ejecución ya en curso termina normalmente."""
+    job = SCHEDULER.jobs.get(worker_id)
+    if not job:
         return jsonify({"error": f"Worker '{worker_id}' no encontrado"}), 404
 
-    if not _is_running(worker_id):
+    results = _set_jobs_enabled([worker_id], False)
+    if results is None:
+        return jsonify({"error": "No se pudo guardar el estado del job en la base de datos"}), 500
+    if results[0]["status"] == "already_stopped":
         return jsonify({"message": "Worker ya estaba detenido"}), 200
+    logging.info(f"Pipeline: Job '{worker_id}' detenido")
+    return jsonify({"message": f"Worker '{job.label}' detenido"}), 200
+
 
+@api_bp.route('/api/v1/pipeline/<worker_id>/runs', methods=['GET'])
+def pipeline_job_runs(worker_id):
+    """Historial de ejecuciones de un job (job_runs), paginado por keyset."""
+    if worker_id not in SCHEDULER.jobs:
+        return jsonify({"error": f"Worker '{worker_id}' no encontrado"}), 404
     try:
-        pid = _get_pid(worker_id)
-        pid_file = _get_pid_file(worker_id)
+        page_args = _keyset_args()
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+    runs, next_cursor = get_job_runs(worker_id, **page_args)
+    return jsonify({"items": runs, "next_cursor": next_cursor}), 200
 
-        # Terminar el grupo de procesos completo
-        try:
-            os.killpg(os.getpgid(pid), signal.SIGTERM)
-        except ProcessLookupError:
-            pass  # Ya terminó
 
-        # Limpiar el archivo PID
-        if os.path.exists(pid_file):
-            os.remove(pid_file)
+@api_bp.route('/api/v1/pipeline/<worker_id>/logs', methods=['GET'])
+def pipeline_get_logs(worker_id):
+    """Retorna las últimas N líneas del log de un worker (lectura desde el final del archivo)."""
+    job = SCHEDULER.jobs.get(worker_id)
+    if not job:
+        return jsonify({"error": f"Worker '{worker_id}' no encontrado"}), 404
+
+    try:
+        lines = min(max(int(request.args.get('lines', 50)), 0), TAIL_MAX_LINES)
+    except ValueError:
+        return jsonify({"error": "'lines' debe ser un entero"}), 400
+    log_file = job.log_path
 
-        logging.info(f"Pipeline: Worker '{worker_id}' (PID {pid}) detenido")
-        worker_label = worker['label']
-        return jsonify({"message": f"Worker '{worker_label}' detenido", "pid": pid}), 200
+    if not os.path.exists(log_file):
+        return jsonify({"logs": [], "worker": worker_id, "size_bytes": 0, "offset": 0}), 200
 
+    try:
+        last_lines, offset = tail_lines(log_file, lines)
+        # 'offset' permite continuar en vivo desde aquí con /logs/stream (Last-Event-ID)
+        return jsonify({"logs": last_lines, "worker": worker_id, "size_bytes": offset, "offset": offset}), 200
     except Exception as e:
-        logging.error(f"Error deteniendo worker '{worker_id}': {e}", exc_info=True)
+        logging.error(f"Error leyendo logs de '{worker_id}': {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
 
-@api_bp.route('/api/v1/pipeline/<worker_id>/logs', methods=['GET'])
-def pipeline_get_logs(worker_id):
-    """Retorna las últimas N líneas del log de un worker."""
-    worker = next((w for w in WORKERS if w["id"] == worker_id), None)
-    if not worker:
+@api_bp.route('/api/v1/pipeline/<worker_id>/logs/stream', methods=['GET'])
+def pipeline_stream_logs(worker_id):
+    """
+    Server-Sent Events con las líneas nuevas del log de un worker.
+    ?lines=N envía antes las últimas N líneas; con Last-Event-ID (o ?offset)
+    se reanuda desde ese byte. La conexión se cierra a los LOG_STREAM_MAX_SECONDS
+    y el cliente reconecta.
+    """
+    job = SCHEDULER.jobs.get(worker_id)
+    if not job:
         return jsonify({"error": f"Worker '{worker_id}' no encontrado"}), 404
 
-    lines = int(request.args.get('lines', 50))
-    log_file = os.path.join(SCRIPTS_DIR, "logs", worker["log"])
+    log_file = job.log_path
+    resume_from = request.headers.get('Last-Event-ID') or request.args.get('offset')
+    try:
+        lines = min(max(int(request.args.get('lines', 0)), 0), TAIL_MAX_LINES)
+        offset = max(int(resume_from), 0) if resume_from is not None else None
+    except ValueError:
+        return jsonify({"error": "'lines' y 'offset' deben ser enteros"}), 400
 
-    if not os.path.exists(log_file):
-        return jsonify({"logs": [], "worker": worker_id}), 200
+    bulkhead = BULKHEADS["log_streams"]
+    status = bulkhead.acquire(block=False)
+    if status is not None:
+        return rejection_response(bulkhead, status)
 
     try:
-        with open(log_file, 'r', encoding='utf-8', errors='replace') as f:
-            all_lines = f.readlines()
-        last_lines = [l.rstrip('\n') for l in all_lines[-lines:]]
-        return jsonify({"logs": last_lines, "worker": worker_id, "total_lines": len(all_lines)}), 200
+        backlog = []
+        if offset is None:
+            if os.path.exists(log_file):
+                backlog, offset = tail_lines(log_file, lines)
+            else:
+                offset = 0
     except Exception as e:
+        bulkhead.release()
         logging.error(f"Error leyendo logs de '{worker_id}': {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+    response = Response(sse_log_stream(log_file, offset, backlog), mimetype='text/event-stream')
+    # El lugar en el bulkhead se libera al cerrar la respuesta (fin del stream o desconexión)
+    response.call_on_close(bulkhead.release)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx: no acumular los eventos
+    return response
+
 
 @api_bp.route('/api/v1/pipeline/start-all', methods=['POST'])
 def pipeline_start_all():
-    """Inicia todos los workers del pipeline."""
-    results = []
-    for w in WORKERS:
-        try:
-            if _is_running(w["id"]):
-                results.append({"id": w["id"], "status": "already_running", "pid": _get_pid(w["id"])})
-                continue
-
-            script_path = os.path.join(SCRIPTS_DIR, w["script"])
-            pid_file = _get_pid_file(w["id"])
-            log_file = os.path.join(SCRIPTS_DIR, "logs", w["log"])
-
-            os.chmod(script_path, 0o755)
-            os.makedirs(os.path.dirname(pid_file), exist_ok=True)
-            os.makedirs(os.path.dirname(log_file), exist_ok=True)
-
-            process = subprocess.Popen(
-                ["bash", script_path],
-                stdout=open(log_file, 'a'),
-                stderr=subprocess.STDOUT,
-                preexec_fn=os.setsid,
-                close_fds=True
-            )
-            with open(pid_file, 'w') as f:
-                f.write(str(process.pid))
-
-            results.append({"id": w["id"], "status": "started", "pid": process.pid})
-        except Exception as e:
-            results.append({"id": w["id"], "status": "error", "error": str(e)})
-
+    """Activa todos los jobs del pipeline."""
+    results = _set_jobs_enabled(list(SCHEDULER.jobs), True)
+    if results is None:
+        return jsonify({"error": "No se pudo guardar el estado de los jobs en la base de datos"}), 500
     return jsonify({"message": "Comando ejecutado", "results": results}), 200
 
 
 @api_bp.route('/api/v1/pipeline/stop-all', methods=['POST'])
 def pipeline_stop_all():
-    """Detiene todos los workers del pipeline."""
-    results = []
-    for w in WORKERS:
-        try:
-            if not _is_running(w["id"]):
-                results.append({"id": w["id"], "status": "already_stopped"})
-                continue
-
-            pid = _get_pid(w["id"])
-            pid_file = _get_pid_file(w["id"])
-
-            try:
-                os.killpg(os.getpgid(pid), signal.SIGTERM)
-            except ProcessLookupError:
-                pass
-
-            if os.path.exists(pid_file):
-                os.remove(pid_file)
-
-            results.append({"id": w["id"], "status": "stopped", "pid": pid})
-        except Exception as e:
-            results.append({"id": w["id"], "status": "error", "error": str(e)})
-
+    """Detiene todos los jobs del pipeline."""
+    results = _set_jobs_enabled(list(SCHEDULER.jobs), False)
+    if results is None:
+        return jsonify({"error": "No se pudo guardar el estado de los jobs en la base de datos"}), 500
     return jsonify({"message": "Comando ejecutado", "results": results}), 200
 
 
-# ── Intervalos de ejecución ───────────────────────────────────────────────────
-
-WORKER_DEFAULT_MINUTES = {
-    "worker_ingestion":  1,
-    "worker_retraining": 3,
-    "worker_metrics":    5,
-    "worker_alerts":     3,
-}
-
-def _get_interval_file(worker_id):
-    return os.path.join(SCRIPTS_DIR, "pids", f"{worker_id}.interval")
-
-def _read_interval_minutes(worker_id):
-    """Lee el intervalo guardado (minutos). Devuelve el default si no existe."""
-    path = _get_interval_file(worker_id)
-    default = WORKER_DEFAULT_MINUTES.get(worker_id, 1)
-    if not os.path.exists(path):
-        return default
-    try:
-        with open(path) as f:
-            val = int(f.read().strip())
-        return val if val >= 1 else default
-    except Exception:
-        return default
-
-def _write_interval_minutes(worker_id, minutes):
-    """Escribe el intervalo (minutos) en el archivo de config del worker."""
-    path = _get_interval_file(worker_id)
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, 'w') as f:
-        f.write(str(int(minutes)))
-
-
 @api_bp.route('/api/v1/pipeline/<worker_id>/interval', methods=['GET'])
 def pipeline_get_interval(worker_id):
-    """Retorna el intervalo de ejecución actual del worker (en minutos) desde la BD."""
-    worker = next((w for w in WORKERS if w["id"] == worker_id), None)
-    if not worker:
+    """Retorna el intervalo de ejecución actual del job (en minutos) desde la BD."""
+    if worker_id not in SCHEDULER.jobs:
         return jsonify({"error": f"Worker '{worker_id}' no encontrado"}), 404
 
     minutes = get_pipeline_interval(worker_id)
@@ -922,13 +1106,12 @@ def pipeline_get_interval(worker_id):
 @api_bp.route('/api/v1/pipeline/<worker_id>/interval', methods=['POST'])
 def pipeline_set_interval(worker_id):
     """
-    Establece la frecuencia de ejecución de un worker.
+    Establece la frecuencia de ejecución de un job.
     Body JSON: {"minutes": N}  (N entero >= 1)
-    Persiste en la BD y sincroniza el archivo .interval para los scripts bash.
-    El cambio aplica en el próximo ciclo del worker sin reiniciarlo.
+    Se persiste en la BD; aplica desde el próximo turno sin reiniciar el job.
     """
-    worker = next((w for w in WORKERS if w["id"] == worker_id), None)
-    if not worker:
+    job = SCHEDULER.jobs.get(worker_id)
+    if not job:
         return jsonify({"error": f"Worker '{worker_id}' no encontrado"}), 404
 
     data = request.get_json()
@@ -944,30 +1127,17 @@ def pipeline_set_interval(worker_id):
         return jsonify({"error": "'minutes' debe ser >= 1"}), 400
 
     try:
-        # 1. Persistir en la base de datos (fuente de verdad)
-        db_ok = set_pipeline_interval(worker_id, minutes)
-
-        # 2. Sincronizar el archivo .interval para que el bash script lo lea
-        #    (fallback en caso de que la BD no esté disponible al arrancar)
-        try:
-            _write_interval_minutes(worker_id, minutes)
-        except Exception as file_err:
-            logging.warning(f"No se pudo escribir archivo .interval de '{worker_id}': {file_err}")
-
-        worker_label = worker['label']
-        if db_ok:
-            logging.info(f"Pipeline: Intervalo de '{worker_id}' actualizado a {minutes} min (BD + archivo)")
-            return jsonify({
-                "message": f"Intervalo de '{worker_label}' actualizado a {minutes} minuto(s). Aplica en el próximo ciclo.",
-                "worker": worker_id,
-                "minutes": minutes
-            }), 200
-        else:
+        if not set_pipeline_interval(worker_id, minutes):
             return jsonify({"error": "No se pudo guardar el intervalo en la base de datos"}), 500
 
+        SCHEDULER.wake()
+        logging.info(f"Pipeline: Intervalo de '{worker_id}' actualizado a {minutes} min")
+        return jsonify({
+            "message": f"Intervalo de '{job.label}' actualizado a {minutes} minuto(s). Aplica en el próximo ciclo.",
+            "worker": worker_id,
+            "minutes": minutes
+        }), 200
+
     except Exception as e:
         logging.error(f"Error guardando intervalo de '{worker_id}': {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
-
-
-# --- FIN DE AGREGADO ---
\ No newline at end of file
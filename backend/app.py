@@ -6,6 +6,7 @@ from flask_cors import CORS
 
 # Importamos el Blueprint que contiene TODAS nuestras rutas (/upload, /predict, /history)
 from backend.api.routes import api_bp
+from backend.api.responses import init_response_layer
 
 # Configurar logging (para que se vea en la consola)
 logging.basicConfig(level=logging.INFO)
@@ -16,6 +17,7 @@ def create_app():
     """
     app = Flask(__name__)
     CORS(app) # Habilita CORS para todas las rutas
+    init_response_layer(app) # JSON con orjson + compresión gzip/brotli
 
     # Registrar el Blueprint de la API
     app.register_blueprint(api_bp, url_prefix='/')
@@ -28,24 +30,27 @@ def create_app():
         logging.info("Health check endpoint fue llamado.")
         return {"status": "ok"}, 200
 
-    # --- Sincronización de intervalos de pipeline al arrancar ---
-    # Esto garantiza que los archivos .interval reflejen los valores de la BD
-    # incluso si Render reinició el dyno (sistema de archivos efímero).
-    with app.app_context():
-        try:
-            from backend.database.db_utils import get_db_engine_and_init, get_pipeline_intervals
-            from backend.api.routes import SCRIPTS_DIR, _write_interval_minutes
-            engine = get_db_engine_and_init()
-            if engine:
-                intervals = get_pipeline_intervals(engine)
-                for worker_id, minutes in intervals.items():
-                    try:
-                        _write_interval_minutes(worker_id, minutes)
-                        logging.info(f"[Startup] Intervalo de '{worker_id}' sincronizado: {minutes} min")
-                    except Exception as sync_err:
-                        logging.warning(f"[Startup] No se pudo sincronizar intervalo de '{worker_id}': {sync_err}")
-        except Exception as e:
-            logging.warning(f"[Startup] No se pudieron sincronizar intervalos de pipeline: {e}")
+    # --- Migraciones de esquema (una vez por proceso, bajo advisory lock) ---
+    # Las rutas ya no emiten DDL: el esquema queda listo antes de atender peticiones.
+    try:
+        from backend.database.db_utils import get_db_engine_and_init
+        get_db_engine_and_init()
+    except Exception as e:
+        logging.error(f"[Startup] No se pudieron aplicar las migraciones de esquema: {e}")
+
+    # --- Planificador de jobs del pipeline (un proceso por máquina, ver scheduler.py) ---
+    try:
+        from backend.services.scheduler import start_scheduler
+        start_scheduler()
+    except Exception as e:
+        logging.error(f"[Startup] No se pudo iniciar el planificador de jobs: {e}", exc_info=True)
+
+    # --- Recarga de los modelos que publique otra réplica o worker (cada proceso) ---
+    try:
+        from backend.services.retraining_service import start_model_watcher
+        start_model_watcher()
+    except Exception as e:
+        logging.error(f"[Startup] No se pudo iniciar la recarga de modelos publicados: {e}", exc_info=True)
 
     return app
 
@@ -1,11 +1,25 @@
+import io
+import json
+import uuid
+import time
 import logging
 import os  # <--- IMPORTANTE: Añadir esta importación
 import pandas as pd
-from sqlalchemy.pool import NullPool
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, text, bindparam
 # ELIMINAR ESTA LÍNEA: from backend.config import DATABASE_URI
-from datetime import datetime
-import uuid
+from datetime import datetime, timedelta
+import threading
+from backend.database.migrations import run_migrations
+from backend.database.partitions import (
+    ensure_ventas_partitions, ensure_upcoming_partitions, refresh_partition_cache, is_missing_partition_error
+)
+from backend.database.leases import lock_in_transaction
+from backend.database.pool_stats import InstrumentedQueuePool, InstrumentedNullPool, attach_pool_listeners
+from backend.telemetry import attach_query_timing
+from backend.database.pagination import DEFAULT_PAGE_SIZE, fetch_keyset_page, date_range_conditions
+from backend.database.dialects import (
+    get_dialect, is_sqlite_uri, SQLITE_ENGINE_KWARGS, configure_sqlite_engine, create_sqlite_schema
+)
 
 # Leemos la URI directamente de las variables de entorno de Render
 DATABASE_URI = os.environ.get("DATABASE_URI")
@@ -22,6 +36,36 @@ if not DATABASE_URI:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# --- Configuración del pool de conexiones ---
+# DB_POOL_MODE=queue (por defecto) reutiliza conexiones; DB_POOL_MODE=null abre una
+# conexión nueva por checkout (hostings/poolers externos tipo PgBouncer que lo requieran).
+DB_POOL_MODE = os.environ.get("DB_POOL_MODE", "queue").lower()
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))  # segundos; < idle timeout del servidor
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true"
+
+def _engine_pool_kwargs():
+    if DB_POOL_MODE == "null":
+        return {"poolclass": InstrumentedNullPool}
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+def _dispose_engine_after_fork():
+    """
+    Tras un fork (p.ej. workers de gunicorn con --preload) el hijo no debe reutilizar
+    los sockets heredados del padre: se descarta el pool sin cerrarlos.
+    """
+    if _db_engine is not None:
+        _db_engine.dispose(close=False)
+
 # --- PATRÓN SINGLETON ---
 # Variable global para almacenar el motor y no recrearlo constantemente
 _db_engine = None
@@ -41,15 +85,20 @@ def get_db_engine():
     try:
         print("🔌 Intentando conectar a la Base de Datos (Inicialización)...")
         # pool_pre_ping=True ayuda a recuperar conexiones perdidas sin crashear
-        engine = create_engine(
-            DATABASE_URI,
-            poolclass=NullPool,  # <--- Obliga a usar una conexión fresca y segura por petición
-            # (mantén cualquier otro parámetro que tuvieras, excepto pre_ping y recycle)
-        )
+        if is_sqlite_uri(DATABASE_URI):
+            # Base embebida (benchmarks / pruebas herméticas), ver backend/database/dialects.py
+            engine = create_engine(DATABASE_URI, **_engine_pool_kwargs(), **SQLITE_ENGINE_KWARGS)
+            configure_sqlite_engine(engine)
+        else:
+            engine = create_engine(DATABASE_URI, **_engine_pool_kwargs())
+        attach_pool_listeners(engine)
+        attach_query_timing(engine)
+        logger.info(f"Pool de conexiones: modo '{DB_POOL_MODE}'"
+                    + ("" if DB_POOL_MODE == "null" else f" (size={DB_POOL_SIZE}, overflow={DB_MAX_OVERFLOW})"))
         
         # Prueba de conexión inicial
         with engine.connect() as conn:
-            print("✅ ¡Conexión a PostgreSQL exitosa!")
+            print(f"✅ ¡Conexión a {engine.dialect.name} exitosa!")
             logger.info("Conexión a la base de datos establecida con éxito.")
         
         # Guardamos el motor en la variable global
@@ -61,100 +110,175 @@ def get_db_engine():
         logger.error(f"Error al crear el motor de base de datos: {e}", exc_info=True)
         return None
 
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_dispose_engine_after_fork)
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
 def initialize_db(engine):
-    """Crea las tablas necesarias si no existen."""
+    """
+    Aplica las migraciones de esquema pendientes (ver backend/database/migrations.py).
+    Se ejecuta una sola vez por proceso; las rutas de la API no emiten DDL.
+    Con SQLite se crea directamente el esquema equivalente (sin particiones).
+    """
+    global _schema_ready
     if engine is None: return
-    try:
-        with engine.begin() as conn:
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS alertas_inventario (
-                    id VARCHAR(36) PRIMARY KEY,
-                    sku VARCHAR(255) NOT NULL,
-                    tipo_alerta VARCHAR(50) NOT NULL,
-                    mensaje TEXT,
-                    fecha_proyeccion DATE,
-                    estado VARCHAR(50) DEFAULT 'PENDIENTE',
-                    creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-            """))
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS alert_configurations (
-                    id SERIAL PRIMARY KEY,
-                    producto_id VARCHAR(255) NOT NULL UNIQUE,
-                    umbral_minimo INT NOT NULL,
-                    umbral_sobreabastecimiento INT NOT NULL,
-                    email_notificacion VARCHAR(255) NOT NULL,
-                    is_active BOOLEAN DEFAULT TRUE,
-                    updated_by VARCHAR(255),
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-            """))
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS configuracion_sistema (
-                    id SERIAL PRIMARY KEY,
-                    smtp_host VARCHAR(255) DEFAULT 'smtp.gmail.com',
-                    smtp_port INT DEFAULT 587,
-                    smtp_user VARCHAR(255) DEFAULT '',
-                    smtp_pass VARCHAR(255) DEFAULT '',
-                    email_remitente VARCHAR(255) DEFAULT 'alertas@predictivo.auto',
-                    email_destinatario_alertas VARCHAR(255) DEFAULT '',
-                    perfil_destinatario_alertas VARCHAR(255) DEFAULT '',
-                    pipeline_interval_ingestion INT DEFAULT 1,
-                    pipeline_interval_retraining INT DEFAULT 3,
-                    pipeline_interval_metrics INT DEFAULT 5,
-                    pipeline_interval_alerts INT DEFAULT 3
-                );
-            """))
-            
-            # Insert default row if empty
-            result = conn.execute(text("SELECT COUNT(*) FROM configuracion_sistema")).scalar()
-            if result == 0:
-                conn.execute(text("""
-                    INSERT INTO configuracion_sistema (smtp_host, smtp_port) VALUES ('smtp.gmail.com', 587)
-                """))
-
-            # Migración segura: añadir columnas de intervalos si no existen (para DBs ya existentes)
-            interval_columns = {
-                "pipeline_interval_ingestion":  "INT DEFAULT 1",
-                "pipeline_interval_retraining": "INT DEFAULT 3",
-                "pipeline_interval_metrics":    "INT DEFAULT 5",
-                "pipeline_interval_alerts":     "INT DEFAULT 3",
-            }
-            for col_name, col_def in interval_columns.items():
-                try:
-                    conn.execute(text(f"ALTER TABLE configuracion_sistema ADD COLUMN IF NOT EXISTS {col_name} {col_def};"))
-                except Exception as alt_e:
-                    logger.warning(f"No se pudo añadir columna {col_name}: {alt_e}")
-                
-            # Agregar columna correo_electronico a tabla usuarios si no existe
-            try:
-                conn.execute(text("ALTER TABLE usuarios ADD COLUMN IF NOT EXISTS correo_electronico VARCHAR(255);"))
-                logger.info("Verificada columna correo_electronico en tabla usuarios.")
-            except Exception as col_e:
-                logger.warning(f"No se pudo verificar/crear la columna correo_electronico: {col_e}")
-                
-            # Tabla de registro de archivos cargados
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS archivos_cargados (
-                    id SERIAL PRIMARY KEY,
-                    nombre_archivo VARCHAR(512) NOT NULL,
-                    fecha_carga TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    estado VARCHAR(20) DEFAULT 'valido',
-                    filas_guardadas INTEGER DEFAULT 0,
-                    mensaje TEXT,
-                    cargado_por VARCHAR(100)
-                );
-            """))
-
+    with _schema_lock:
+        if _schema_ready:
+            return
+        try:
+            if get_dialect(engine).supports_partitions:
+                run_migrations(engine)
+                ensure_upcoming_partitions(engine)
+            else:
+                create_sqlite_schema(engine)
+            _schema_ready = True
             logger.info("Tablas de sistema verificadas/creadas con éxito.")
-    except Exception as e:
-        logger.error(f"Error al inicializar la base de datos: {e}")
+        except Exception as e:
+            logger.error(f"Error al inicializar la base de datos: {e}")
 
 def get_db_engine_and_init():
+    """Motor + migraciones. Usar solo al arrancar (create_app, daemons, scripts)."""
     engine = get_db_engine()
     initialize_db(engine)
     return engine
 
+# --- VERSIONES DE DATOS (ETag / GET condicional) ---
+# Un contador por recurso en 'versiones_datos' que cada ruta de escritura incrementa
+# DESPUÉS de confirmar su transacción, en una transacción corta aparte (dentro de la
+# transacción de la escritura serializaría las cargas concurrentes sobre esa fila).
+# La API deriva los ETag de estos contadores; cada proceso los cachea DATA_VERSION_TTL
+# segundos, de modo que un GET condicional repetido no consulta la BD.
+DATA_VERSION_TTL = float(os.environ.get("DATA_VERSION_TTL", 2))
+_data_versions = {"versions": None, "checked_at": 0.0}
+_data_versions_lock = threading.Lock()
+
+def bump_data_versions(*recursos, engine=None):
+    """
+    Incrementa la versión de los recursos modificados e invalida la caché local.
+    No propaga errores: la escritura ya está confirmada.
+    """
+    if engine is None:
+        engine = get_db_engine()
+    try:
+        if engine is not None:
+            with engine.begin() as conn:
+                conn.execute(
+                    text("UPDATE versiones_datos SET version = version + 1 WHERE recurso IN :recursos")
+                    .bindparams(bindparam("recursos", expanding=True)),
+                    {"recursos": list(recursos)}
+                )
+    except Exception as e:
+        logger.error(f"Error incrementando versión de datos {recursos}: {e}")
+    finally:
+        with _data_versions_lock:
+            _data_versions.update(versions=None, checked_at=0.0)
+
+def get_data_versions(engine=None):
+    """
+    Versión actual de cada recurso ({recurso: version}), cacheada por proceso.
+
+    Returns:
+        dict, o None si no se pudieron leer (la API responde entonces sin ETag).
+    """
+    now = time.monotonic()
+    with _data_versions_lock:
+        if _data_versions["versions"] is not None and now - _data_versions["checked_at"] < DATA_VERSION_TTL:
+            return _data_versions["versions"]
+    if engine is None:
+        engine = get_db_engine()
+    if engine is None:
+        return None
+    try:
+        with engine.connect() as conn:
+            versions = dict(conn.execute(text("SELECT recurso, version FROM versiones_datos")).fetchall())
+    except Exception as e:
+        logger.error(f"Error leyendo versiones de datos: {e}")
+        return None
+    with _data_versions_lock:
+        _data_versions.update(versions=versions, checked_at=now)
+    return versions
+
+# --- EVENTOS DEL PIPELINE (outbox) ---
+# Los cambios de estado que alimentan etapas posteriores del pipeline dejan una
+# fila en 'eventos_pipeline' dentro de la MISMA transacción que el cambio: si
+# ésta se revierte, el evento no existe. El planificador lee las filas nuevas
+# por id y dispara solo los jobs suscritos (ver backend/services/scheduler.py).
+EVENT_FILE_UPLOADED = "file-uploaded"
+EVENT_FILE_APPROVED = "file-approved"
+EVENT_MODEL_PUBLISHED = "model-published"
+EVENT_INVENTORY_UPDATED = "inventory-updated"
+EVENT_ALERT_CONFIG_UPDATED = "alert-config-updated"
+
+def emit_pipeline_event(conn, tipo: str, payload: dict = None):
+    """Registra un evento en la transacción abierta 'conn' (propaga los errores)."""
+    conn.execute(
+        text(f"INSERT INTO eventos_pipeline (tipo, payload) VALUES (:tipo, {get_dialect(conn).json_param('payload')})"),
+        {"tipo": tipo, "payload": json.dumps(payload) if payload else None}
+    )
+
+def publish_pipeline_event(tipo: str, payload: dict = None, engine=None):
+    """
+    Registra un evento en su propia transacción, para cambios que no viven en la
+    BD (p. ej. modelos recargados en memoria). No propaga errores.
+    """
+    if engine is None:
+        engine = get_db_engine()
+    if engine is None:
+        return False
+    try:
+        with engine.begin() as conn:
+            emit_pipeline_event(conn, tipo, payload)
+        return True
+    except Exception as e:
+        logger.error(f"Error publicando evento de pipeline '{tipo}': {e}")
+        return False
+
+def get_last_pipeline_event_id(tipo: str = None, engine=None) -> int:
+    """Id del último evento registrado, o del último de 'tipo' (0 si no hay). Propaga los errores de BD."""
+    if engine is None:
+        engine = get_db_engine()
+    with engine.connect() as conn:
+        if tipo is None:
+            return conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM eventos_pipeline")).scalar()
+        return conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM eventos_pipeline WHERE tipo = :tipo"),
+                            {"tipo": tipo}).scalar()
+
+def fetch_pipeline_events(after_id: int, limit: int = 1000, also_ids=(), engine=None):
+    """
+    Eventos con id > after_id, más los de 'also_ids' (huecos que aún pueden
+    confirmarse), en orden: lista de (id, tipo). Sin eventos nuevos es una
+    lectura vacía sobre la clave primaria. Propaga los errores de BD.
+    """
+    if engine is None:
+        engine = get_db_engine()
+    if also_ids:
+        query = text(
+            "SELECT id, tipo FROM eventos_pipeline WHERE id > :after OR id IN :ids ORDER BY id LIMIT :limit"
+        ).bindparams(bindparam("ids", expanding=True))
+        params = {"after": after_id, "ids": list(also_ids), "limit": limit}
+    else:
+        query = text("SELECT id, tipo FROM eventos_pipeline WHERE id > :after ORDER BY id LIMIT :limit")
+        params = {"after": after_id, "limit": limit}
+    with engine.connect() as conn:
+        return conn.execute(query, params).fetchall()
+
+def prune_pipeline_events(days: int, engine=None):
+    """Borra los eventos con más de 'days' días. Retorna cuántos se borraron."""
+    if engine is None:
+        engine = get_db_engine()
+    if engine is None:
+        return 0
+    try:
+        with engine.begin() as conn:
+            result = conn.execute(text("DELETE FROM eventos_pipeline WHERE creado_en < :limite"),
+                                  {"limite": datetime.now() - timedelta(days=days)})
+        return result.rowcount
+    except Exception as e:
+        logger.error(f"Error depurando eventos_pipeline: {e}")
+        return 0
+
 def save_dataframe_to_db(df, table_name, engine):
     """
     Guarda un DataFrame de pandas en la tabla especificada.
@@ -172,6 +296,114 @@ def save_dataframe_to_db(df, table_name, engine):
         logger.error(f"Error al guardar datos en la BD: {e}")
         return False, f"Error al guardar en la BD: {e}"
 
+def _insert_ignore_duplicate_fingerprints(table, conn, keys, data_iter):
+    """
+    Método de inserción para DataFrame.to_sql:
+    INSERT ... ON CONFLICT (fingerprint, fecha) DO NOTHING
+    (el índice único incluye la clave de partición).
+    Devuelve el número de filas realmente insertadas.
+    """
+    rows = [dict(zip(keys, row)) for row in data_iter]
+    insert = get_dialect(conn).insert
+    stmt = insert(table.table).values(rows).on_conflict_do_nothing(index_elements=['fingerprint', 'fecha'])
+    result = conn.execute(stmt)
+    return result.rowcount
+
+def save_ventas_file(df, nombre_archivo: str, engine, cargado_por: str = "Sistema",
+                     hash_contenido: str = None, reporte_rechazos: str = None,
+                     rechazos_por_regla: dict = None):
+    """
+    Registra el archivo en 'archivos_cargados' y guarda sus filas en 'ventas_detalle'
+    en una sola transacción, marcando cada fila con el 'archivo_id' de origen.
+    Las filas cuyo 'fingerprint' ya existe se ignoran (ver ingestion_service).
+    reporte_rechazos / rechazos_por_regla: ruta del sidecar Parquet con las filas
+    descartadas en la validación y su conteo por regla.
+    Antes de la transacción se crean las particiones mensuales que falten, y el
+    rango de fechas del archivo queda en fecha_min/fecha_max. En la misma
+    transacción se suman las filas nuevas al agregado 'ventas_diarias'.
+
+    Returns:
+        Tuple: (Exito: bool, Mensaje: str, Filas_Insertadas: int, archivo_id: int | None)
+    """
+    if engine is None:
+        logger.error("No se proporcionó un motor de base de datos válido.")
+        return False, "Error interno: Motor de BD no inicializado.", 0, None
+
+    try:
+        dialect = get_dialect(engine)
+        fecha_min, fecha_max = df['fecha'].min().date(), df['fecha'].max().date()
+        if dialect.supports_partitions:
+            ensure_ventas_partitions(engine, df['fecha'].dt.to_period('M').unique())
+        else:
+            # Sin tipo DATE nativo: se guarda 'YYYY-MM-DD' para comparar como texto
+            df = df.assign(fecha=df['fecha'].dt.date)
+        # Cargas simultáneas con filas en común (watch-folder con varios hilos) toman los
+        # locks de las claves únicas en el mismo orden: esperan en vez de bloquearse mutuamente
+        df = df.sort_values(['fecha', 'fingerprint'], kind='stable')
+
+        # La caché de particiones es por proceso: si otro proceso eliminó un mes que
+        # esta carga necesita, se refresca desde el catálogo y se reintenta una vez
+        for intento in range(2):
+            try:
+                with engine.begin() as conn:
+                    archivo_id = conn.execute(text(f"""
+                        INSERT INTO archivos_cargados
+                            (nombre_archivo, estado, filas_guardadas, mensaje, cargado_por, hash_contenido,
+                             reporte_rechazos, rechazos_por_regla, fecha_min, fecha_max)
+                        VALUES
+                            (:nombre, 'valido', 0, '', :cargado_por, :hash, :reporte, {dialect.json_param('reglas')},
+                             :fecha_min, :fecha_max)
+                        RETURNING id
+                    """), {
+                        "nombre": nombre_archivo, "cargado_por": cargado_por, "hash": hash_contenido,
+                        "fecha_min": fecha_min, "fecha_max": fecha_max,
+                        "reporte": reporte_rechazos,
+                        "reglas": json.dumps(rechazos_por_regla) if rechazos_por_regla else None,
+                    }).scalar()
+
+                    df = df.assign(archivo_id=archivo_id)
+                    inserted = df.to_sql(
+                        'ventas_detalle', con=conn, if_exists='append', index=False,
+                        chunksize=dialect.insert_chunk_size, method=_insert_ignore_duplicate_fingerprints
+                    ) or 0
+                    duplicated = len(df) - inserted
+
+                    # Agregado diario: solo las filas realmente insertadas llevan este archivo_id
+                    conn.execute(text("""
+                        INSERT INTO ventas_diarias (id_producto, fecha, unidades, lineas)
+                        SELECT id_producto, fecha, SUM(cantidad_vendida), COUNT(*)
+                        FROM ventas_detalle
+                        WHERE archivo_id = :id AND fecha BETWEEN :fecha_min AND :fecha_max
+                        GROUP BY id_producto, fecha
+                        ORDER BY id_producto, fecha
+                        ON CONFLICT (id_producto, fecha) DO UPDATE
+                        SET unidades = ventas_diarias.unidades + EXCLUDED.unidades,
+                            lineas = ventas_diarias.lineas + EXCLUDED.lineas
+                    """), {"id": archivo_id, "fecha_min": fecha_min, "fecha_max": fecha_max})
+                    msg = f"Datos guardados con éxito en 'ventas_detalle' ({inserted} filas nuevas"
+                    msg += f", {duplicated} duplicadas omitidas)." if duplicated else ")."
+
+                    conn.execute(text("""
+                        UPDATE archivos_cargados
+                        SET filas_guardadas = :filas, mensaje = :mensaje
+                        WHERE id = :id
+                    """), {"filas": inserted, "mensaje": f"Procesamiento exitoso. {msg}", "id": archivo_id})
+                    emit_pipeline_event(conn, EVENT_FILE_UPLOADED, {"archivo_id": archivo_id})
+                break
+            except Exception as e:
+                if intento or not dialect.supports_partitions or not is_missing_partition_error(e):
+                    raise
+                logger.warning(f"Falta una partición para '{nombre_archivo}' ({e}). Refrescando y reintentando.")
+                refresh_partition_cache(engine)
+                ensure_ventas_partitions(engine, df['fecha'].dt.to_period('M').unique())
+
+        bump_data_versions("ventas", "archivos", engine=engine)
+        logger.info(f"Archivo #{archivo_id} '{nombre_archivo}': {inserted} filas insertadas, {duplicated} ya existían.")
+        return True, msg, inserted, archivo_id
+    except Exception as e:
+        logger.error(f"Error al guardar ventas de '{nombre_archivo}' en la BD: {e}")
+        return False, f"Error al guardar en la BD: {e}", 0, None
+
 def fetch_all_data(engine, table_name="ventas_detalle"): # <-- CAMBIO 1: Nombre de tabla actualizado
     """
     Obtiene todos los datos de una tabla.
@@ -187,6 +419,169 @@ def fetch_all_data(engine, table_name="ventas_detalle"): # <-- CAMBIO 1: Nombre
         logger.error(f"Error al leer datos de la BD: {e}")
         return None
 
+HISTORY_RESOLUTIONS = ("day", "week", "month")
+
+def get_sales_history(id_producto: str, desde, hasta, resolucion: str = "day", engine=None):
+    """
+    Unidades vendidas de un SKU por período (día, semana o mes), agregadas en SQL
+    sobre ventas_diarias (rango por PK id_producto+fecha).
+
+    Returns:
+        Lista de tuplas (inicio del período 'YYYY-MM-DD', unidades) ordenada por
+        fecha, o None si hubo error.
+    """
+    if resolucion not in HISTORY_RESOLUTIONS:
+        raise ValueError(f"Resolución inválida: '{resolucion}' (use {', '.join(HISTORY_RESOLUTIONS)})")
+    if engine is None:
+        engine = get_db_engine()
+    if engine is None:
+        return None
+    dialect = get_dialect(engine)
+    bucket = dialect.date_bucket(resolucion, "fecha")
+    query = text(f"""
+        SELECT {bucket} AS periodo, SUM(unidades) AS unidades
+        FROM ventas_diarias
+        WHERE id_producto = :id_producto
+          AND fecha BETWEEN {dialect.date_param('desde')} AND {dialect.date_param('hasta')}
+        GROUP BY 1
+        ORDER BY 1
+    """)
+    try:
+        with engine.connect() as conn:
+            rows = conn.execute(query, {"id_producto": str(id_producto), "desde": desde, "hasta": hasta})
+            # date (PostgreSQL) o texto ISO (SQLite): ambos se normalizan a 'YYYY-MM-DD'
+            return [(str(periodo)[:10], int(unidades)) for periodo, unidades in rows]
+    except Exception as e:
+        logger.error(f"Error al obtener historial de '{id_producto}': {e}", exc_info=True)
+        return None
+
+def iter_sales_history_batch(ids_producto, desde, hasta, resolucion: str = "day", engine=None):
+    """
+    Historial de varios SKUs en una sola consulta (id_producto IN ..., rango por PK),
+    leído con cursor de servidor y entregado fila a fila.
+
+    Yields:
+        Tuplas (id_producto, inicio del período 'YYYY-MM-DD', unidades), ordenadas
+        por SKU y fecha.
+
+    Raises:
+        ValueError: Resolución inválida.
+        Exception: Errores de conexión o consulta (el llamador decide cómo cortar el stream).
+    """
+    if resolucion not in HISTORY_RESOLUTIONS:
+        raise ValueError(f"Resolución inválida: '{resolucion}' (use {', '.join(HISTORY_RESOLUTIONS)})")
+    if engine is None:
+        engine = get_db_engine()
+    if engine is None:
+        raise RuntimeError("No se pudo conectar a la base de datos.")
+    dialect = get_dialect(engine)
+    bucket = dialect.date_bucket(resolucion, "fecha")
+    query = text(f"""
+        SELECT id_producto, {bucket} AS periodo, SUM(unidades) AS unidades
+        FROM ventas_diarias
+        WHERE id_producto IN :ids
+          AND fecha BETWEEN {dialect.date_param('desde')} AND {dialect.date_param('hasta')}
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+    """).bindparams(bindparam("ids", expanding=True))
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(
+            query, {"ids": [str(i) for i in ids_producto], "desde": desde, "hasta": hasta}
+        )
+        for id_producto, periodo, unidades in result:
+            yield id_producto, str(periodo)[:10], int(unidades)
+
+# --- FUNCIONES DE INVENTARIO ---
+
+def upsert_inventory_data(df, engine, fecha_snapshot=None):
+    """
+    Carga masiva de un snapshot de stock en 'inventario'.
+    1. COPY ... FROM STDIN (CSV en memoria) a 'inventario_staging' bajo un 'lote' propio.
+    2. Un solo INSERT ... ON CONFLICT DO UPDATE desde el staging (si un SKU se
+       repite en el archivo gana la última fila). Un snapshot más antiguo que el
+       ya registrado para un SKU no lo pisa.
+    3. Limpieza del lote. Todo en una transacción.
+    En SQLite (sin COPY) el mismo upsert se ejecuta con executemany.
+
+    Args:
+        df: DataFrame con id_producto, stock_actual, stock_seguridad (ya validado).
+        fecha_snapshot: Momento del snapshot (por defecto, ahora).
+
+    Returns:
+        Tuple: (Exito: bool, Mensaje: str, Filas_Afectadas: int)
+    """
+    if engine is None:
+        return False, "Error interno: Motor de BD no inicializado.", 0
+    if df.empty:
+        return False, "El archivo de inventario no contiene filas.", 0
+
+    fecha_snapshot = fecha_snapshot or datetime.now()
+    try:
+        with engine.begin() as conn:
+            if get_dialect(conn).supports_copy:
+                filas, detalle = _copy_merge_inventory(conn, df, fecha_snapshot)
+            else:
+                filas, detalle = _executemany_merge_inventory(conn, df, fecha_snapshot)
+            if filas:
+                emit_pipeline_event(conn, EVENT_INVENTORY_UPDATED, {"skus": filas})
+
+        logger.info(f"Inventario actualizado: {filas} SKUs ({detalle}, {len(df)} filas leídas).")
+        return True, f"Inventario actualizado: {filas} SKUs.", filas
+    except Exception as e:
+        logger.error(f"Error en la carga masiva de inventario: {e}", exc_info=True)
+        return False, f"Error al guardar el inventario en la BD: {e}", 0
+
+_INVENTORY_UPSERT_TAIL = """
+    ON CONFLICT (id_producto) DO UPDATE
+    SET stock_actual = EXCLUDED.stock_actual,
+        stock_seguridad = EXCLUDED.stock_seguridad,
+        ultima_actualizacion = EXCLUDED.ultima_actualizacion
+    WHERE inventario.ultima_actualizacion <= EXCLUDED.ultima_actualizacion
+"""
+
+def _copy_merge_inventory(conn, df, fecha_snapshot):
+    """PostgreSQL: COPY al staging + un único INSERT ... SELECT DISTINCT ON ... ON CONFLICT."""
+    lote = str(uuid.uuid4())
+    buffer = io.BytesIO()
+    df[['id_producto', 'stock_actual', 'stock_seguridad']].assign(
+        lote=lote, fila=range(len(df))
+    )[['lote', 'fila', 'id_producto', 'stock_actual', 'stock_seguridad']].to_csv(
+        buffer, index=False, header=False, encoding='utf-8'
+    )
+    buffer.seek(0)
+
+    # COPY por el cursor del driver (pg8000), dentro de la misma transacción
+    cursor = conn.connection.driver_connection.cursor()
+    cursor.execute(
+        "COPY inventario_staging (lote, fila, id_producto, stock_actual, stock_seguridad) "
+        "FROM STDIN WITH (FORMAT csv)",
+        stream=buffer
+    )
+    result = conn.execute(text("""
+        INSERT INTO inventario (id_producto, stock_actual, stock_seguridad, ultima_actualizacion)
+        SELECT DISTINCT ON (id_producto) id_producto, stock_actual, stock_seguridad, :fecha
+        FROM inventario_staging
+        WHERE lote = :lote
+        ORDER BY id_producto, fila DESC
+    """ + _INVENTORY_UPSERT_TAIL), {"lote": lote, "fecha": fecha_snapshot})
+    filas = result.rowcount
+    conn.execute(text("DELETE FROM inventario_staging WHERE lote = :lote"), {"lote": lote})
+    return filas, f"lote {lote}"
+
+def _executemany_merge_inventory(conn, df, fecha_snapshot):
+    """SQLite (sin COPY): deduplicado en pandas y un executemany del mismo upsert."""
+    rows = [
+        {**r, "fecha": fecha_snapshot}
+        for r in df.drop_duplicates(subset=['id_producto'], keep='last')[
+            ['id_producto', 'stock_actual', 'stock_seguridad']
+        ].to_dict('records')
+    ]
+    result = conn.execute(text("""
+        INSERT INTO inventario (id_producto, stock_actual, stock_seguridad, ultima_actualizacion)
+        VALUES (:id_producto, :stock_actual, :stock_seguridad, :fecha)
+    """ + _INVENTORY_UPSERT_TAIL), rows)
+    return result.rowcount, "executemany"
+
 # --- FUNCIONES DE MÉTRICAS ---
 
 def save_model_metric(metrics: dict, engine):
@@ -196,96 +591,157 @@ def save_model_metric(metrics: dict, engine):
         data['fecha_registro'] = datetime.now()
         # <-- CAMBIO 2: Tabla 'entrenamiento'
         pd.DataFrame([data]).to_sql('entrenamiento', con=engine, if_exists='append', index=False)
+        bump_data_versions("metricas", engine=engine)
         return True
     except Exception as e:
         logger.error(f"Error al guardar métricas: {e}")
         return False
 
-def get_model_metrics_history(engine):
-    if engine is None: return pd.DataFrame()
+def get_model_metrics_history(engine, desde=None, hasta=None, limit: int = DEFAULT_PAGE_SIZE, after=None):
+    """
+    Historial de métricas de entrenamiento, paginado por keyset (fecha_registro, id) desc.
+
+    Returns:
+        Tuple: (lista de métricas, next_cursor o None)
+    """
+    if engine is None: return [], None
     try:
-        # <-- CAMBIO 3: Tabla 'entrenamiento'
-        query = "SELECT * FROM entrenamiento ORDER BY fecha_registro DESC"
-        return pd.read_sql(query, con=engine)
+        where, params = date_range_conditions("fecha_registro", desde, hasta)
+        with engine.connect() as conn:
+            metrics, next_cursor = fetch_keyset_page(
+                conn, "SELECT id, model, mae, rmse, r2, fecha_registro FROM entrenamiento",
+                "fecha_registro", where=where, params=params, limit=limit, after=after
+            )
+        for m in metrics:
+            m['fecha_registro'] = str(m['fecha_registro'])
+        return metrics, next_cursor
     except Exception as e:
         logger.warning(f"No se pudo leer historial de métricas: {e}")
-        return pd.DataFrame()
+        return [], None
 
 # --- FUNCIONES DE ALERTAS (HU-007) ---
 
-def insert_or_update_alert(sku: str, tipo_alerta: str, mensaje: str, fecha_proyeccion: str, engine):
+def bulk_upsert_alerts(alerts, engine):
     """
-    Inserta una nueva alerta o actualiza una existente (si es del mismo tipo, SKU y sigue PENDIENTE).
-    Evita duplicar alertas PENDIENTE para el mismo SKU.
+    Inserta o actualiza en UNA sola sentencia un lote de alertas.
+    Cada alerta pendiente existente del mismo (sku, tipo_alerta) se actualiza
+    (mensaje, fecha_proyeccion, actualizado_en); el resto se inserta como PENDIENTE
+    con id generado en la BD. El árbitro es el índice único parcial
+    ux_alertas_pendientes_sku_tipo (ver migración v5). En SQLite (sin arrays)
+    el mismo upsert se ejecuta con executemany e ids generados en Python.
+
+    Args:
+        alerts: DataFrame (o lista de dicts) con columnas sku, tipo_alerta,
+                mensaje, fecha_proyeccion.
+
+    Returns:
+        Tuple: (insertadas: int, actualizadas: int) o None si falla.
     """
-    if engine is None: return False
-    
+    if engine is None: return None
+    df = pd.DataFrame(alerts, columns=['sku', 'tipo_alerta', 'mensaje', 'fecha_proyeccion'])
+    if df.empty:
+        return 0, 0
+    # Un mismo (sku, tipo) dos veces en el lote haría fallar ON CONFLICT DO UPDATE
+    df = df.drop_duplicates(subset=['sku', 'tipo_alerta'], keep='last')
+
+    skus = df['sku'].astype(str).tolist()
+    tipos = df['tipo_alerta'].astype(str).tolist()
+    mensajes = df['mensaje'].astype(str).tolist()
+    fechas = pd.to_datetime(df['fecha_proyeccion']).dt.date.tolist()
     try:
         with engine.begin() as conn:
-            # Buscar si ya existe una alerta pendiente para este SKU y tipo
-            query_check = text("""
-                SELECT id FROM alertas_inventario 
-                WHERE sku = :sku AND tipo_alerta = :tipo AND estado = 'PENDIENTE'
-            """)
-            result = conn.execute(query_check, {"sku": sku, "tipo": tipo_alerta}).fetchone()
-            
-            if result:
-                # Actualizar la alerta existente
-                query_update = text("""
-                    UPDATE alertas_inventario 
-                    SET mensaje = :mensaje, fecha_proyeccion = :fecha_proy, creado_en = CURRENT_TIMESTAMP
-                    WHERE id = :id
-                """)
-                conn.execute(query_update, {
-                    "mensaje": mensaje, 
-                    "fecha_proy": fecha_proyeccion, 
-                    "id": result[0]
-                })
-                logger.info(f"Alerta actualizada para SKU: {sku} (Tipo: {tipo_alerta})")
+            if get_dialect(conn).supports_arrays:
+                flags = conn.execute(text("""
+                    INSERT INTO alertas_inventario (id, sku, tipo_alerta, mensaje, fecha_proyeccion, estado)
+                    SELECT gen_random_uuid()::text, t.sku, t.tipo, t.mensaje, t.fecha_proy, 'PENDIENTE'
+                    FROM unnest(
+                        CAST(:skus AS VARCHAR[]), CAST(:tipos AS VARCHAR[]),
+                        CAST(:mensajes AS TEXT[]), CAST(:fechas AS DATE[])
+                    ) AS t(sku, tipo, mensaje, fecha_proy)
+                """ + _ALERT_UPSERT_TAIL + """
+                    RETURNING (xmax = 0) AS insertada
+                """), {"skus": skus, "tipos": tipos, "mensajes": mensajes, "fechas": fechas}).scalars().all()
+                insertadas = sum(1 for f in flags if f)
+                actualizadas = len(flags) - insertadas
             else:
-                # Insertar nueva alerta
-                alert_id = str(uuid.uuid4())
-                query_insert = text("""
+                # Sin arrays ni xmax: las pendientes existentes se cuentan antes del executemany
+                existentes = {tuple(r) for r in conn.execute(
+                    text("""
+                        SELECT sku, tipo_alerta FROM alertas_inventario
+                        WHERE estado = 'PENDIENTE' AND sku IN :skus
+                    """).bindparams(bindparam("skus", expanding=True)),
+                    {"skus": skus}
+                )}
+                conn.execute(text("""
                     INSERT INTO alertas_inventario (id, sku, tipo_alerta, mensaje, fecha_proyeccion, estado)
                     VALUES (:id, :sku, :tipo, :mensaje, :fecha_proy, 'PENDIENTE')
-                """)
-                conn.execute(query_insert, {
-                    "id": alert_id,
-                    "sku": sku,
-                    "tipo": tipo_alerta,
-                    "mensaje": mensaje,
-                    "fecha_proy": fecha_proyeccion
-                })
-                logger.info(f"Nueva alerta creada para SKU: {sku} (Tipo: {tipo_alerta})")
-        return True
+                """ + _ALERT_UPSERT_TAIL), [
+                    {"id": str(uuid.uuid4()), "sku": k, "tipo": t, "mensaje": m, "fecha_proy": f}
+                    for k, t, m, f in zip(skus, tipos, mensajes, fechas)
+                ])
+                actualizadas = sum(1 for key in zip(skus, tipos) if key in existentes)
+                insertadas = len(skus) - actualizadas
+        bump_data_versions("alertas", engine=engine)
+        logger.info(f"Alertas: {insertadas} nuevas, {actualizadas} actualizadas (1 sentencia).")
+        return insertadas, actualizadas
     except Exception as e:
-        logger.error(f"Error al procesar alerta para SKU {sku}: {e}", exc_info=True)
-        return False
+        logger.error(f"Error en upsert masivo de {len(df)} alertas: {e}", exc_info=True)
+        return None
+
+# creado_en no se toca: es la clave del cursor keyset de get_active_alerts y una alerta
+# refrescada que cambiara de posición se saltaría entre páginas
+_ALERT_UPSERT_TAIL = """
+    ON CONFLICT (sku, tipo_alerta) WHERE estado = 'PENDIENTE'
+    DO UPDATE SET mensaje = EXCLUDED.mensaje,
+                  fecha_proyeccion = EXCLUDED.fecha_proyeccion,
+                  actualizado_en = CURRENT_TIMESTAMP
+"""
+
+def insert_or_update_alert(sku: str, tipo_alerta: str, mensaje: str, fecha_proyeccion: str, engine):
+    """
+    Inserta una nueva alerta o actualiza una existente (si es del mismo tipo, SKU y sigue PENDIENTE).
+    Evita duplicar alertas PENDIENTE para el mismo SKU. Caso unitario de bulk_upsert_alerts.
+    """
+    result = bulk_upsert_alerts([{
+        "sku": sku, "tipo_alerta": tipo_alerta, "mensaje": mensaje, "fecha_proyeccion": fecha_proyeccion
+    }], engine)
+    return result is not None
+
+ACTIVE_ALERT_STATES = ['PENDIENTE', 'EN GESTIÓN']
+
+def get_active_alerts(engine, estados=None, desde=None, hasta=None,
+                      limit: int = DEFAULT_PAGE_SIZE, after=None):
+    """
+    Retorna las alertas en los estados indicados (por defecto PENDIENTE y EN GESTIÓN),
+    paginadas por keyset (creado_en, id) desc. creado_en es inmutable; la última
+    evaluación que refrescó la alerta queda en actualizado_en.
 
-def get_active_alerts(engine):
-    """Retorna las alertas con estado PENDIENTE."""
-    if engine is None: return []
+    Returns:
+        Tuple: (lista de alertas, next_cursor o None)
+    """
+    if engine is None: return [], None
     try:
-        query = text("""
-            SELECT id, sku, tipo_alerta, mensaje, fecha_proyeccion, estado, creado_en 
-            FROM alertas_inventario 
-            WHERE estado IN ('PENDIENTE', 'EN GESTIÓN') 
-            ORDER BY creado_en DESC
-        """)
+        where, params = date_range_conditions("creado_en", desde, hasta)
+        where.append("estado IN :estados")
+        params["estados"] = list(estados or ACTIVE_ALERT_STATES)
         with engine.connect() as conn:
-            result = conn.execute(query)
-            # Convert row objects to dict
-            alerts = [dict(row._mapping) for row in result]
-            # Convert datetime to string for JSON serialization
-            for alert in alerts:
-                if 'fecha_proyeccion' in alert and alert['fecha_proyeccion']:
-                    alert['fecha_proyeccion'] = str(alert['fecha_proyeccion'])
-                if 'creado_en' in alert and alert['creado_en']:
-                    alert['creado_en'] = str(alert['creado_en'])
-            return alerts
+            alerts, next_cursor = fetch_keyset_page(
+                conn, """
+                    SELECT id, sku, tipo_alerta, mensaje, fecha_proyeccion, estado, creado_en, actualizado_en
+                    FROM alertas_inventario
+                """, "creado_en", where=where, params=params, limit=limit, after=after,
+                expanding=("estados",)
+            )
+        # Convert datetime to string for JSON serialization
+        for alert in alerts:
+            if alert.get('fecha_proyeccion'):
+                alert['fecha_proyeccion'] = str(alert['fecha_proyeccion'])
+            alert['creado_en'] = str(alert['creado_en'])
+            alert['actualizado_en'] = str(alert['actualizado_en'])
+        return alerts, next_cursor
     except Exception as e:
         logger.error(f"Error al obtener alertas activas: {e}", exc_info=True)
-        return []
+        return [], None
 
 def update_alert_status(alert_id: str, status: str, engine):
     """Cambia el estado de una alerta (e.g., CONFIRMADA, DESCARTADA)."""
@@ -303,41 +759,47 @@ def update_alert_status(alert_id: str, status: str, engine):
         """)
         with engine.begin() as conn:
             result = conn.execute(query, {"status": status, "id": alert_id})
-            if result.rowcount > 0:
-                logger.info(f"Estado de alerta {alert_id} actualizado a {status}")
-                return True
-            else:
-                logger.warning(f"No se encontró la alerta con id {alert_id}")
-                return False
+        if result.rowcount > 0:
+            bump_data_versions("alertas", engine=engine)
+            logger.info(f"Estado de alerta {alert_id} actualizado a {status}")
+            return True
+        else:
+            logger.warning(f"No se encontró la alerta con id {alert_id}")
+            return False
     except Exception as e:
         logger.error(f"Error al actualizar estado de alerta {alert_id}: {e}", exc_info=True)
         return False
 
 # --- FUNCIONES DE CONFIGURACIÓN DE ALERTAS (HU-012) ---
 
-def get_alert_configs(engine, skip: int = 0, limit: int = 100):
+def get_alert_configs(engine, is_active=None, desde=None, hasta=None,
+                      limit: int = DEFAULT_PAGE_SIZE, after=None):
     """
-    Obtiene las configuraciones de alertas con paginación.
+    Obtiene las configuraciones de alertas paginadas por keyset (updated_at, id) desc.
+
+    Returns:
+        Tuple: (lista de configuraciones, next_cursor o None)
     """
-    if engine is None: return []
+    if engine is None: return [], None
     try:
-        query = text("""
-            SELECT id, producto_id, umbral_minimo, umbral_sobreabastecimiento,
-                   is_active, updated_by, updated_at
-            FROM alert_configurations
-            ORDER BY updated_at DESC
-            OFFSET :skip LIMIT :limit
-        """)
+        where, params = date_range_conditions("updated_at", desde, hasta)
+        if is_active is not None:
+            where.append("is_active = :is_active")
+            params["is_active"] = is_active
         with engine.connect() as conn:
-            result = conn.execute(query, {"skip": skip, "limit": limit})
-            configs = [dict(row._mapping) for row in result]
-            for config in configs:
-                if 'updated_at' in config and config['updated_at']:
-                    config['updated_at'] = str(config['updated_at'])
-            return configs
+            configs, next_cursor = fetch_keyset_page(
+                conn, """
+                    SELECT id, producto_id, umbral_minimo, umbral_sobreabastecimiento,
+                           is_active, updated_by, updated_at
+                    FROM alert_configurations
+                """, "updated_at", where=where, params=params, limit=limit, after=after
+            )
+        for config in configs:
+            config['updated_at'] = str(config['updated_at'])
+        return configs, next_cursor
     except Exception as e:
         logger.error(f"Error al obtener configuraciones de alertas: {e}", exc_info=True)
-        return []
+        return [], None
 
 def upsert_alert_config(engine, config_data: dict):
     """
@@ -368,32 +830,78 @@ def upsert_alert_config(engine, config_data: dict):
                 "is_active": config_data.get("is_active", True),
                 "updated_by": config_data.get("updated_by", "Sistema")
             })
-            return True
+            emit_pipeline_event(conn, EVENT_ALERT_CONFIG_UPDATED, {"producto_id": config_data.get("producto_id")})
+        bump_data_versions("alert_config", engine=engine)
+        return True
     except Exception as e:
         logger.error(f"Error en upsert_alert_config: {e}", exc_info=True)
         return False
 
 # --- FUNCIONES DE CONFIGURACIÓN DE SISTEMA ---
 
+# --- CACHÉ DE CONFIGURACIÓN DEL SISTEMA ---
+# configuracion_sistema se lee constantemente (envío de correos, intervalos de workers)
+# y cambia muy rara vez. Cada proceso guarda la fila en memoria durante CONFIG_CACHE_TTL
+# segundos; vencido el TTL solo consulta la columna 'version' (cada escritura la
+# incrementa) y recarga la fila completa únicamente si cambió. Las escrituras de este
+# proceso además invalidan la caché local de inmediato.
+CONFIG_CACHE_TTL = float(os.environ.get("CONFIG_CACHE_TTL", 30))
+CONFIG_PARAM_KEYS = ["smtp_host", "smtp_port", "smtp_user", "smtp_pass", "email_remitente",
+                     "email_destinatario_alertas", "perfil_destinatario_alertas"]
+_config_cache = {"version": None, "checked_at": 0.0, "row": None}
+_config_cache_lock = threading.Lock()
+
+def invalidate_config_cache():
+    """Descarta la configuración cacheada en este proceso."""
+    with _config_cache_lock:
+        _config_cache.update(version=None, checked_at=0.0, row=None)
+
+def _get_system_config_row(engine):
+    """
+    Fila de configuracion_sistema (con el correo del perfil destinatario) desde la caché.
+    Devuelve None si la tabla está vacía. Propaga los errores de BD.
+    """
+    now = time.monotonic()
+    with _config_cache_lock:
+        if _config_cache["row"] is not None and now - _config_cache["checked_at"] < CONFIG_CACHE_TTL:
+            return _config_cache["row"]
+        cached_version = _config_cache["version"]
+
+    with engine.connect() as conn:
+        version = conn.execute(text("SELECT version FROM configuracion_sistema LIMIT 1")).scalar()
+        row = None
+        if version is None or version != cached_version:
+            interval_cols = ", ".join(
+                f"cs.{col}" for col in [*PIPELINE_INTERVAL_COLUMNS.values(), *PIPELINE_ENABLED_COLUMNS.values()]
+            )
+            result = conn.execute(text(f"""
+                SELECT cs.version, cs.smtp_host, cs.smtp_port, cs.smtp_user, cs.smtp_pass, cs.email_remitente,
+                       u.correo_electronico as email_destinatario_alertas, cs.perfil_destinatario_alertas,
+                       {interval_cols}
+                FROM configuracion_sistema cs
+                LEFT JOIN usuarios u ON cs.perfil_destinatario_alertas = u.username
+                LIMIT 1
+            """)).fetchone()
+            row = dict(result._mapping) if result else None
+
+    with _config_cache_lock:
+        if row is None and version is not None and version == cached_version:
+            _config_cache["checked_at"] = now  # Sin cambios: se renueva el TTL
+        else:
+            _config_cache.update(version=row["version"] if row else None, checked_at=now, row=row)
+        return _config_cache["row"]
+
 def get_config_params(engine=None):
-    """Obtiene los parámetros de configuración de correo."""
+    """Obtiene los parámetros de configuración de correo (cacheados, ver CONFIG_CACHE_TTL)."""
     if engine is None: 
         engine = get_db_engine()
     if engine is None: return {}
     
     try:
-        query = text("""
-            SELECT cs.smtp_host, cs.smtp_port, cs.smtp_user, cs.smtp_pass, cs.email_remitente, 
-                   u.correo_electronico as email_destinatario_alertas, cs.perfil_destinatario_alertas 
-            FROM configuracion_sistema cs
-            LEFT JOIN usuarios u ON cs.perfil_destinatario_alertas = u.username
-            LIMIT 1
-        """)
-        with engine.connect() as conn:
-            result = conn.execute(query).fetchone()
-            if result:
-                return dict(result._mapping)
-            else:
+        row = _get_system_config_row(engine)
+        if row:
+            return {k: row[k] for k in CONFIG_PARAM_KEYS}
+        else:
                 return {
                     "smtp_host": "smtp.gmail.com",
                     "smtp_port": 587,
@@ -423,7 +931,8 @@ def update_config_params(data: dict, engine=None):
                     smtp_user = :smtp_user,
                     smtp_pass = :smtp_pass,
                     email_remitente = :email_remitente,
-                    perfil_destinatario_alertas = :perfil_destinatario_alertas
+                    perfil_destinatario_alertas = :perfil_destinatario_alertas,
+                    version = version + 1
             """)
             conn.execute(query, {
                 "smtp_host": data.get("smtp_host", "smtp.gmail.com"),
@@ -433,8 +942,9 @@ def update_config_params(data: dict, engine=None):
                 "email_remitente": data.get("email_remitente", "alertas@predictivo.auto"),
                 "perfil_destinatario_alertas": data.get("perfil_destinatario_alertas", "")
             })
-            logger.info("Configuración del sistema actualizada con éxito.")
-            return True
+        invalidate_config_cache()
+        logger.info("Configuración del sistema actualizada con éxito.")
+        return True
     except Exception as e:
         logger.error(f"Error al actualizar configuración: {e}", exc_info=True)
         return False
@@ -443,6 +953,7 @@ def reset_db_tables(engine=None):
     """
     Trunca las tablas de datos del sistema:
     - ventas_detalle   (histórico de ventas)
+    - ventas_diarias   (agregado diario por SKU)
     - entrenamiento    (métricas de modelos)
     - archivos_cargados (registro de archivos Excel)
     """
@@ -454,46 +965,55 @@ def reset_db_tables(engine=None):
     try:
         with engine.connect() as conn:
             logger.info("Iniciando limpieza de tablas...")
-            conn.execute(text("TRUNCATE TABLE ventas_detalle RESTART IDENTITY CASCADE;"))
+            dialect = get_dialect(conn)
+            dialect.truncate(conn, ["ventas_detalle", "ventas_diarias"])
             try:
-                conn.execute(text("TRUNCATE TABLE entrenamiento RESTART IDENTITY CASCADE;"))
+                dialect.truncate(conn, ["entrenamiento"])
             except Exception:
                 logger.info("Tabla entrenamiento no existía (se omite).")
             try:
-                conn.execute(text("TRUNCATE TABLE archivos_cargados RESTART IDENTITY CASCADE;"))
+                dialect.truncate(conn, ["archivos_cargados"])
                 logger.info("Tabla archivos_cargados limpiada.")
             except Exception:
                 logger.info("Tabla archivos_cargados no existía (se omite).")
             conn.commit()
-            logger.info("Tablas limpiadas exitosamente.")
-            return True, "Base de datos limpiada: ventas_detalle, entrenamiento y archivos_cargados vaciados."
+        bump_data_versions("ventas", "archivos", "metricas", engine=engine)
+        logger.info("Tablas limpiadas exitosamente.")
+        return True, "Base de datos limpiada: ventas_detalle, ventas_diarias, entrenamiento y archivos_cargados vaciados."
     except Exception as e:
         logger.error(f"Error crítico limpiando tablas: {e}", exc_info=True)
         return False, str(e)
 
 # --- FUNCIONES DE GESTIÓN DE USUARIOS ---
 
-def get_all_users(engine=None):
+def get_all_users(engine=None, rol=None, desde=None, hasta=None,
+                  limit: int = DEFAULT_PAGE_SIZE, after=None):
+    """
+    Usuarios paginados por keyset (created_at, id) desc.
+
+    Returns:
+        Tuple: (lista de usuarios, next_cursor o None)
+    """
     if engine is None: 
-        engine = get_db_engine_and_init()
-    if engine is None: return []
+        engine = get_db_engine()
+    if engine is None: return [], None
 
     try:
-        query = text("""
-            SELECT id, username, nombre, rol, correo_electronico, created_at
-            FROM usuarios
-            ORDER BY created_at DESC
-        """)
+        where, params = date_range_conditions("created_at", desde, hasta)
+        if rol:
+            where.append("rol = :rol")
+            params["rol"] = rol
         with engine.connect() as conn:
-            result = conn.execute(query)
-            users = [dict(row._mapping) for row in result]
-            for u in users:
-                if 'created_at' in u and u['created_at']:
-                    u['created_at'] = str(u['created_at'])
-            return users
+            users, next_cursor = fetch_keyset_page(
+                conn, "SELECT id, username, nombre, rol, correo_electronico, created_at FROM usuarios",
+                "created_at", where=where, params=params, limit=limit, after=after
+            )
+        for u in users:
+            u['created_at'] = str(u['created_at'])
+        return users, next_cursor
     except Exception as e:
         logger.error(f"Error al obtener usuarios: {e}", exc_info=True)
-        return []
+        return [], None
 
 def update_user_email(user_id: int, email: str, engine=None):
     if engine is None: 
@@ -508,10 +1028,16 @@ def update_user_email(user_id: int, email: str, engine=None):
         """)
         with engine.begin() as conn:
             result = conn.execute(query, {"email": email, "id": user_id})
-            if result.rowcount > 0:
-                logger.info(f"Correo actualizado para usuario ID {user_id}")
-                return True
-            return False
+            if result.rowcount == 0:
+                return False
+            # El correo del perfil destinatario forma parte de la configuración cacheada
+            conn.execute(text("""
+                UPDATE configuracion_sistema SET version = version + 1
+                WHERE perfil_destinatario_alertas = (SELECT username FROM usuarios WHERE id = :id)
+            """), {"id": user_id})
+        invalidate_config_cache()
+        logger.info(f"Correo actualizado para usuario ID {user_id}")
+        return True
     except Exception as e:
         logger.error(f"Error al actualizar correo de usuario {user_id}: {e}", exc_info=True)
         return False
@@ -520,21 +1046,25 @@ def update_user_email(user_id: int, email: str, engine=None):
 # --- FUNCIONES DE REGISTRO DE ARCHIVOS CARGADOS ---
 
 def register_uploaded_file(nombre_archivo: str, estado: str, filas_guardadas: int,
-                           mensaje: str = "", cargado_por: str = "Sistema", engine=None):
+                           mensaje: str = "", cargado_por: str = "Sistema", engine=None,
+                           hash_contenido: str = None, reporte_rechazos: str = None,
+                           rechazos_por_regla: dict = None):
     """
     Registra un archivo procesado en la tabla archivos_cargados.
     estado: 'valido' | 'invalido' | 'procesado'
     """
     if engine is None:
-        engine = get_db_engine_and_init()
+        engine = get_db_engine()
     if engine is None:
         return None
     try:
-        query = text("""
+        query = text(f"""
             INSERT INTO archivos_cargados
-                (nombre_archivo, estado, filas_guardadas, mensaje, cargado_por)
+                (nombre_archivo, estado, filas_guardadas, mensaje, cargado_por, hash_contenido,
+                 reporte_rechazos, rechazos_por_regla)
             VALUES
-                (:nombre, :estado, :filas, :mensaje, :cargado_por)
+                (:nombre, :estado, :filas, :mensaje, :cargado_por, :hash, :reporte,
+                 {get_dialect(engine).json_param('reglas')})
             RETURNING id
         """)
         with engine.begin() as conn:
@@ -544,59 +1074,178 @@ def register_uploaded_file(nombre_archivo: str, estado: str, filas_guardadas: in
                 "filas": filas_guardadas,
                 "mensaje": mensaje,
                 "cargado_por": cargado_por,
+                "hash": hash_contenido,
+                "reporte": reporte_rechazos,
+                "reglas": json.dumps(rechazos_por_regla) if rechazos_por_regla else None,
             })
             row = result.fetchone()
-            return row[0] if row else None
+            if row and estado == 'valido':
+                emit_pipeline_event(conn, EVENT_FILE_UPLOADED, {"archivo_id": row[0]})
+        bump_data_versions("archivos", engine=engine)
+        return row[0] if row else None
     except Exception as e:
         logger.error(f"Error registrando archivo '{nombre_archivo}': {e}", exc_info=True)
         return None
 
 
-def get_all_uploaded_files(engine=None):
-    """Retorna todos los archivos registrados, ordenados por fecha desc."""
-    if engine is None:
-        engine = get_db_engine_and_init()
+def find_uploaded_file_by_hash(hash_contenido: str, engine=None):
+    """
+    Busca un archivo ya ingerido con el mismo hash de contenido.
+    Los archivos 'invalido' no cuentan: se permite reintentar su carga.
+    Retorna el registro (dict) o None si no existe.
+    """
     if engine is None:
-        return []
+        engine = get_db_engine()
+    if engine is None or not hash_contenido:
+        return None
     try:
         query = text("""
-            SELECT id, nombre_archivo, fecha_carga, estado, filas_guardadas, mensaje, cargado_por
+            SELECT id, nombre_archivo, fecha_carga, estado
             FROM archivos_cargados
-            ORDER BY fecha_carga DESC
+            WHERE hash_contenido = :hash AND estado <> 'invalido'
+            ORDER BY fecha_carga ASC
+            LIMIT 1
         """)
         with engine.connect() as conn:
-            rows = conn.execute(query).fetchall()
-            files = []
-            for row in rows:
-                d = dict(row._mapping)
-                if d.get('fecha_carga'):
-                    d['fecha_carga'] = d['fecha_carga'].strftime('%Y-%m-%d %H:%M')
-                files.append(d)
-            return files
+            row = conn.execute(query, {"hash": hash_contenido}).fetchone()
+            if not row:
+                return None
+            d = dict(row._mapping)
+            if d.get('fecha_carga'):
+                d['fecha_carga'] = d['fecha_carga'].strftime('%Y-%m-%d %H:%M')
+            return d
+    except Exception as e:
+        logger.error(f"Error buscando archivo por hash: {e}", exc_info=True)
+        return None
+
+
+def get_all_uploaded_files(engine=None, estados=None, desde=None, hasta=None,
+                           limit: int = DEFAULT_PAGE_SIZE, after=None):
+    """
+    Retorna los archivos registrados (opcionalmente filtrados por estado y rango de
+    fecha de carga), paginados por keyset (fecha_carga, id) desc.
+
+    Returns:
+        Tuple: (lista de archivos, next_cursor o None)
+    """
+    if engine is None:
+        engine = get_db_engine()
+    if engine is None:
+        return [], None
+    try:
+        where, params = date_range_conditions("fecha_carga", desde, hasta)
+        if estados:
+            where.append("estado IN :estados")
+            params["estados"] = list(estados)
+        with engine.connect() as conn:
+            files, next_cursor = fetch_keyset_page(
+                conn, """
+                    SELECT id, nombre_archivo, fecha_carga, estado, filas_guardadas, mensaje, cargado_por,
+                           rechazos_por_regla
+                    FROM archivos_cargados
+                """, "fecha_carga", where=where, params=params, limit=limit, after=after,
+                expanding=("estados",) if estados else ()
+            )
+        for d in files:
+            d['fecha_carga'] = d['fecha_carga'].strftime('%Y-%m-%d %H:%M')
+            if isinstance(d.get('rechazos_por_regla'), str):  # SQLite: JSON como texto
+                d['rechazos_por_regla'] = json.loads(d['rechazos_por_regla'])
+        return files, next_cursor
     except Exception as e:
         logger.error(f"Error obteniendo archivos cargados: {e}", exc_info=True)
-        return []
+        return [], None
+
+
+def count_uploaded_files_by_status(engine=None):
+    """Conteo de archivos registrados por estado (para los indicadores del frontend)."""
+    if engine is None:
+        engine = get_db_engine()
+    if engine is None:
+        return {}
+    try:
+        with engine.connect() as conn:
+            rows = conn.execute(text("SELECT estado, COUNT(*) FROM archivos_cargados GROUP BY estado")).fetchall()
+        return {estado: int(n) for estado, n in rows}
+    except Exception as e:
+        logger.error(f"Error contando archivos cargados: {e}", exc_info=True)
+        return {}
+
+
+def get_file_rejection_report(file_id: int, engine=None):
+    """
+    Retorna la ruta del sidecar de filas rechazadas y el conteo por regla de un archivo.
+    Retorna None si el archivo no existe.
+    """
+    if engine is None:
+        engine = get_db_engine()
+    if engine is None:
+        return None
+    try:
+        query = text("""
+            SELECT id, nombre_archivo, reporte_rechazos, rechazos_por_regla
+            FROM archivos_cargados
+            WHERE id = :id
+        """)
+        with engine.connect() as conn:
+            row = conn.execute(query, {"id": file_id}).fetchone()
+            if not row:
+                return None
+            d = dict(row._mapping)
+            reglas = d.get('rechazos_por_regla') or {}
+            d['rechazos_por_regla'] = json.loads(reglas) if isinstance(reglas, str) else reglas
+            return d
+    except Exception as e:
+        logger.error(f"Error obteniendo reporte de rechazos del archivo {file_id}: {e}", exc_info=True)
+        return None
 
 
 def delete_uploaded_file(file_id: int, engine=None):
     """
-    Elimina el registro de un archivo de la tabla archivos_cargados.
-    NO elimina los datos de ventas_detalle ya guardados.
+    Elimina un archivo de archivos_cargados junto con las filas de ventas_detalle
+    que aportó, descontándolas de ventas_diarias, en una sola transacción.
+    Conservarlas dejaría sus huellas ocupadas: al volver a cargar el mismo
+    archivo todas sus filas se descartarían como duplicadas y no entrenaría.
     """
     if engine is None:
         engine = get_db_engine()
     if engine is None:
         return False
     try:
-        query = text("DELETE FROM archivos_cargados WHERE id = :id")
         with engine.begin() as conn:
-            result = conn.execute(query, {"id": file_id})
-            return result.rowcount > 0
+            lock_in_transaction(conn, "file_state")
+            fecha_min, fecha_max = conn.execute(text(
+                "SELECT MIN(fecha), MAX(fecha) FROM ventas_detalle WHERE archivo_id = :id"
+            ), {"id": file_id}).one()
+            if fecha_min is not None:
+                conn.execute(text("""
+                    UPDATE ventas_diarias
+                    SET unidades = ventas_diarias.unidades - a.unidades,
+                        lineas = ventas_diarias.lineas - a.lineas
+                    FROM (
+                        SELECT id_producto, fecha, SUM(cantidad_vendida) AS unidades, COUNT(*) AS lineas
+                        FROM ventas_detalle
+                        WHERE archivo_id = :id
+                        GROUP BY id_producto, fecha
+                    ) a
+                    WHERE ventas_diarias.id_producto = a.id_producto AND ventas_diarias.fecha = a.fecha
+                """), {"id": file_id})
+                conn.execute(text("""
+                    DELETE FROM ventas_diarias
+                    WHERE fecha BETWEEN :fecha_min AND :fecha_max AND lineas <= 0
+                """), {"fecha_min": fecha_min, "fecha_max": fecha_max})
+                conn.execute(text("DELETE FROM ventas_detalle WHERE archivo_id = :id"), {"id": file_id})
+            result = conn.execute(text("DELETE FROM archivos_cargados WHERE id = :id"), {"id": file_id})
+        if result.rowcount > 0:
+            bump_data_versions("ventas", "archivos", engine=engine)
+        return result.rowcount > 0
     except Exception as e:
         logger.error(f"Error eliminando archivo con id {file_id}: {e}", exc_info=True)
         return False
 
 
+# Estado nuevo de un archivo -> evento que dispara la etapa siguiente
+FILE_STATUS_EVENTS = {'valido': EVENT_FILE_UPLOADED, 'aprobado': EVENT_FILE_APPROVED}
+
 def update_file_status(file_id: int, new_status: str, engine=None):
     """
     Actualiza el estado de un archivo registrado.
@@ -617,48 +1266,93 @@ def update_file_status(file_id: int, new_status: str, engine=None):
             WHERE id = :id
         """)
         with engine.begin() as conn:
+            lock_in_transaction(conn, "file_state")
             result = conn.execute(query, {"estado": new_status, "id": file_id})
-            return result.rowcount > 0
+            if result.rowcount > 0 and new_status in FILE_STATUS_EVENTS:
+                emit_pipeline_event(conn, FILE_STATUS_EVENTS[new_status], {"archivo_id": file_id})
+        if result.rowcount > 0:
+            bump_data_versions("archivos", engine=engine)
+        return result.rowcount > 0
     except Exception as e:
         logger.error(f"Error actualizando estado del archivo {file_id}: {e}", exc_info=True)
         return False
 
 
-def mark_files_as_processed(engine=None):
+def mark_files_as_processed(engine=None, file_ids=None):
     """
     Marca los archivos con estado 'aprobado' como 'procesado'.
     Solo los archivos aprobados explícitamente participan en el entrenamiento.
     Los archivos en estado 'valido' NO se tocan.
     Se llama después de un ciclo de re-entrenamiento exitoso.
+
+    file_ids: si se indica, solo se marcan esos archivos (los que el entrenamiento
+    leyó realmente); un archivo aprobado durante el entrenamiento sigue 'aprobado'.
     """
     if engine is None:
         engine = get_db_engine()
     if engine is None:
         return False
+    if file_ids is not None and not file_ids:
+        return True
     try:
-        query = text("""
+        query = """
             UPDATE archivos_cargados
             SET estado = 'procesado'
             WHERE estado = 'aprobado'
-        """)
+        """
+        stmt, params = text(query), {}
+        if file_ids is not None:
+            stmt = text(query + " AND id IN :ids").bindparams(bindparam("ids", expanding=True))
+            params["ids"] = list(file_ids)
         with engine.begin() as conn:
-            result = conn.execute(query)
-            logger.info(f"Marcados {result.rowcount} archivos 'aprobado' -> 'procesado'.")
-            return True
+            lock_in_transaction(conn, "file_state")
+            result = conn.execute(stmt, params)
+        if result.rowcount > 0:
+            bump_data_versions("archivos", engine=engine)
+        logger.info(f"Marcados {result.rowcount} archivos 'aprobado' -> 'procesado'.")
+        return True
     except Exception as e:
         logger.error(f"Error marcando archivos como procesados: {e}", exc_info=True)
         return False
 
 
+def mark_files_invalid(file_ids, mensaje: str, engine=None):
+    """
+    Pasa a 'invalido' (con su motivo en 'mensaje') los archivos indicados que
+    sigan 'aprobado'. Retorna cuántos cambiaron.
+    """
+    if not file_ids:
+        return 0
+    if engine is None:
+        engine = get_db_engine()
+    if engine is None:
+        return 0
+    try:
+        stmt = text("""
+            UPDATE archivos_cargados
+            SET estado = 'invalido', mensaje = :mensaje
+            WHERE estado = 'aprobado' AND id IN :ids
+        """).bindparams(bindparam("ids", expanding=True))
+        with engine.begin() as conn:
+            lock_in_transaction(conn, "file_state")
+            result = conn.execute(stmt, {"mensaje": mensaje, "ids": list(file_ids)})
+        if result.rowcount > 0:
+            bump_data_versions("archivos", engine=engine)
+        return result.rowcount
+    except Exception as e:
+        logger.error(f"Error marcando archivos {list(file_ids)} como inválidos: {e}", exc_info=True)
+        return 0
+
+
 def get_approved_files(engine=None):
     """Retorna solo los archivos con estado 'aprobado' (listos para entrenamiento)."""
     if engine is None:
-        engine = get_db_engine_and_init()
+        engine = get_db_engine()
     if engine is None:
         return []
     try:
         query = text("""
-            SELECT id, nombre_archivo, fecha_carga, filas_guardadas
+            SELECT id, nombre_archivo, fecha_carga, filas_guardadas, fecha_min, fecha_max
             FROM archivos_cargados
             WHERE estado = 'aprobado'
             ORDER BY fecha_carga ASC
@@ -670,6 +1364,9 @@ def get_approved_files(engine=None):
                 d = dict(row._mapping)
                 if d.get('fecha_carga'):
                     d['fecha_carga'] = d['fecha_carga'].strftime('%Y-%m-%d %H:%M')
+                for col in ('fecha_min', 'fecha_max'):
+                    if d.get(col):
+                        d[col] = d[col].isoformat()
                 files.append(d)
             return files
     except Exception as e:
@@ -698,8 +1395,14 @@ def auto_approve_valid_files(engine=None):
             WHERE estado = 'valido'
         """)
         with engine.begin() as conn:
+            # Serializada con las demás transiciones de estado (otras réplicas, entrenamiento)
+            lock_in_transaction(conn, "file_state")
             result = conn.execute(query)
             promoted = result.rowcount
+            if promoted:
+                emit_pipeline_event(conn, EVENT_FILE_APPROVED, {"archivos": promoted})
+        if promoted:
+            bump_data_versions("archivos", engine=engine)
         logger.info(f"Pipeline Ingesta: {promoted} archivo(s) promovidos de 'valido' a 'aprobado'.")
         return promoted, f"{promoted} archivo(s) aprobado(s) automáticamente."
     except Exception as e:
@@ -722,9 +1425,17 @@ PIPELINE_INTERVAL_DEFAULTS = {
     "worker_alerts":     3,
 }
 
+# Job activado / detenido en el planificador (ver migración v10)
+PIPELINE_ENABLED_COLUMNS = {
+    "worker_ingestion":  "pipeline_enabled_ingestion",
+    "worker_retraining": "pipeline_enabled_retraining",
+    "worker_metrics":    "pipeline_enabled_metrics",
+    "worker_alerts":     "pipeline_enabled_alerts",
+}
+
 def get_pipeline_intervals(engine=None):
     """
-    Obtiene los intervalos de ejecución de todos los workers desde la BD.
+    Obtiene los intervalos de ejecución de todos los workers (caché de configuración).
     Retorna dict: {worker_id: minutos}
     """
     if engine is None:
@@ -733,16 +1444,12 @@ def get_pipeline_intervals(engine=None):
         return dict(PIPELINE_INTERVAL_DEFAULTS)
 
     try:
-        cols = ", ".join(PIPELINE_INTERVAL_COLUMNS.values())
-        query = text(f"SELECT {cols} FROM configuracion_sistema LIMIT 1")
-        with engine.connect() as conn:
-            row = conn.execute(query).fetchone()
-            if row:
-                mapping = dict(row._mapping)
-                return {
-                    wid: int(mapping.get(col, PIPELINE_INTERVAL_DEFAULTS[wid]) or PIPELINE_INTERVAL_DEFAULTS[wid])
-                    for wid, col in PIPELINE_INTERVAL_COLUMNS.items()
-                }
+        mapping = _get_system_config_row(engine)
+        if mapping:
+            return {
+                wid: int(mapping.get(col, PIPELINE_INTERVAL_DEFAULTS[wid]) or PIPELINE_INTERVAL_DEFAULTS[wid])
+                for wid, col in PIPELINE_INTERVAL_COLUMNS.items()
+            }
     except Exception as e:
         logger.error(f"Error obteniendo intervalos de pipeline: {e}", exc_info=True)
 
@@ -751,7 +1458,7 @@ def get_pipeline_intervals(engine=None):
 
 def get_pipeline_interval(worker_id: str, engine=None):
     """
-    Obtiene el intervalo (minutos) de un worker específico desde la BD.
+    Obtiene el intervalo (minutos) de un worker específico (caché de configuración).
     """
     intervals = get_pipeline_intervals(engine)
     return intervals.get(worker_id, PIPELINE_INTERVAL_DEFAULTS.get(worker_id, 1))
@@ -773,11 +1480,206 @@ def set_pipeline_interval(worker_id: str, minutes: int, engine=None):
         return False
 
     try:
-        query = text(f"UPDATE configuracion_sistema SET {col} = :minutes")
+        query = text(f"UPDATE configuracion_sistema SET {col} = :minutes, version = version + 1")
         with engine.begin() as conn:
             conn.execute(query, {"minutes": int(minutes)})
+        invalidate_config_cache()
         logger.info(f"Intervalo de '{worker_id}' actualizado a {minutes} min en BD")
         return True
     except Exception as e:
         logger.error(f"Error guardando intervalo de '{worker_id}' en BD: {e}", exc_info=True)
-        return False
\ No newline at end of file
+        return False
+
+
+def get_pipeline_enabled(engine=None):
+    """
+    Jobs activados en el planificador (caché de configuración).
+    Retorna dict: {worker_id: bool}; todos detenidos si la BD no está disponible.
+    """
+    if engine is None:
+        engine = get_db_engine()
+    if engine is not None:
+        try:
+            mapping = _get_system_config_row(engine)
+            if mapping:
+                return {wid: bool(mapping.get(col)) for wid, col in PIPELINE_ENABLED_COLUMNS.items()}
+        except Exception as e:
+            logger.error(f"Error obteniendo jobs activos del pipeline: {e}", exc_info=True)
+    return {wid: False for wid in PIPELINE_ENABLED_COLUMNS}
+
+
+def set_pipeline_enabled(worker_ids, enabled: bool, engine=None):
+    """
+    Activa o detiene uno o varios jobs del planificador.
+    Retorna True si éxito, False si falla.
+    """
+    cols = [PIPELINE_ENABLED_COLUMNS.get(wid) for wid in worker_ids]
+    if not cols or None in cols:
+        logger.error(f"Worker ID desconocido en {list(worker_ids)}")
+        return False
+
+    if engine is None:
+        engine = get_db_engine()
+    if engine is None:
+        return False
+
+    try:
+        assignments = ", ".join(f"{col} = :enabled" for col in cols)
+        with engine.begin() as conn:
+            conn.execute(text(f"UPDATE configuracion_sistema SET {assignments}, version = version + 1"),
+                         {"enabled": bool(enabled)})
+        invalidate_config_cache()
+        logger.info(f"Jobs {list(worker_ids)} {'activados' if enabled else 'detenidos'} en BD")
+        return True
+    except Exception as e:
+        logger.error(f"Error guardando estado de jobs {list(worker_ids)}: {e}", exc_info=True)
+        return False
+
+
+# --- HISTORIAL DE EJECUCIONES DEL PLANIFICADOR (job_runs) ---
+
+def start_job_run(job: str, engine=None):
+    """Registra el inicio de una ejecución. Retorna su id, o None si no se pudo registrar."""
+    if engine is None:
+        engine = get_db_engine()
+    if engine is None:
+        return None
+    try:
+        with engine.begin() as conn:
+            return conn.execute(
+                text("INSERT INTO job_runs (job, inicio, estado) VALUES (:job, :inicio, 'running') RETURNING id"),
+                {"job": job, "inicio": datetime.now()}
+            ).scalar()
+    except Exception as e:
+        logger.error(f"Error registrando inicio de '{job}' en job_runs: {e}")
+        return None
+
+
+def finish_job_run(run_id, estado: str, mensaje: str, duracion_s: float, engine=None):
+    """Cierra una ejecución con su resultado ('success', 'error')."""
+    if run_id is None:
+        return
+    if engine is None:
+        engine = get_db_engine()
+    if engine is None:
+        return
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("""
+                UPDATE job_runs SET fin = :fin, estado = :estado, mensaje = :mensaje, duracion_s = :duracion
+                WHERE id = :id
+            """), {"fin": datetime.now(), "estado": estado, "mensaje": mensaje,
+                   "duracion": duracion_s, "id": run_id})
+    except Exception as e:
+        logger.error(f"Error registrando fin de la ejecución {run_id} en job_runs: {e}")
+
+
+def record_job_skip(job: str, mensaje: str, engine=None):
+    """Registra una ejecución omitida (la anterior seguía en curso o la clase estaba ocupada)."""
+    if engine is None:
+        engine = get_db_engine()
+    if engine is None:
+        return
+    try:
+        now = datetime.now()
+        with engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO job_runs (job, inicio, fin, duracion_s, estado, mensaje)
+                VALUES (:job, :now, :now, 0, 'skipped', :mensaje)
+            """), {"job": job, "now": now, "mensaje": mensaje})
+    except Exception as e:
+        logger.error(f"Error registrando omisión de '{job}' en job_runs: {e}")
+
+
+def close_abandoned_job_runs(jobs, engine=None):
+    """
+    Marca como 'interrupted' las ejecuciones de 'jobs' que quedaron en 'running'
+    (proceso reiniciado a mitad de un job). El llamador solo pasa los jobs que
+    nadie puede estar ejecutando (su lease está libre). Retorna cuántas se cerraron.
+    """
+    if not jobs:
+        return 0
+    if engine is None:
+        engine = get_db_engine()
+    if engine is None:
+        return 0
+    try:
+        stmt = text("""
+            UPDATE job_runs SET estado = 'interrupted', fin = :fin,
+                   mensaje = 'El proceso se detuvo durante la ejecución.'
+            WHERE estado = 'running' AND job IN :jobs
+        """).bindparams(bindparam("jobs", expanding=True))
+        with engine.begin() as conn:
+            result = conn.execute(stmt, {"fin": datetime.now(), "jobs": list(jobs)})
+        return result.rowcount
+    except Exception as e:
+        logger.error(f"Error cerrando ejecuciones abandonadas en job_runs: {e}")
+        return 0
+
+
+def get_last_job_runs(jobs, engine=None):
+    """Última ejecución de cada job: {job: fila}. Vacío si la BD no está disponible."""
+    if engine is None:
+        engine = get_db_engine()
+    if engine is None:
+        return {}
+    # Una lectura por job sobre el índice (job, inicio, id): sin agregar todo el historial
+    query = text("""
+        SELECT job, inicio, fin, duracion_s, estado, mensaje FROM job_runs
+        WHERE job = :job ORDER BY inicio DESC, id DESC LIMIT 1
+    """)
+    try:
+        last_runs = {}
+        with engine.connect() as conn:
+            for job in jobs:
+                row = conn.execute(query, {"job": job}).fetchone()
+                if row is not None:
+                    last_runs[job] = {**dict(row._mapping), "inicio": str(row.inicio),
+                                      "fin": str(row.fin) if row.fin else None}
+        return last_runs
+    except Exception as e:
+        logger.warning(f"No se pudo leer la última ejecución de los jobs: {e}")
+        return {}
+
+
+def prune_job_runs(days: int, engine=None):
+    """Borra las ejecuciones con más de 'days' días. Retorna cuántas se borraron."""
+    if engine is None:
+        engine = get_db_engine()
+    if engine is None:
+        return 0
+    try:
+        with engine.begin() as conn:
+            result = conn.execute(text("DELETE FROM job_runs WHERE inicio < :limite AND estado <> 'running'"),
+                                  {"limite": datetime.now() - timedelta(days=days)})
+        return result.rowcount
+    except Exception as e:
+        logger.error(f"Error depurando job_runs: {e}")
+        return 0
+
+
+def get_job_runs(job: str, engine=None, desde=None, hasta=None, limit: int = DEFAULT_PAGE_SIZE, after=None):
+    """
+    Historial de ejecuciones de un job, paginado por keyset (inicio, id) desc.
+
+    Returns:
+        Tuple: (lista de ejecuciones, next_cursor o None)
+    """
+    if engine is None:
+        engine = get_db_engine()
+    if engine is None:
+        return [], None
+    try:
+        where, params = date_range_conditions("inicio", desde, hasta)
+        with engine.connect() as conn:
+            runs, next_cursor = fetch_keyset_page(
+                conn, "SELECT id, job, inicio, fin, duracion_s, estado, mensaje FROM job_runs",
+                "inicio", where=["job = :job", *where], params={"job": job, **params}, limit=limit, after=after
+            )
+        for run in runs:
+            run['inicio'] = str(run['inicio'])
+            run['fin'] = str(run['fin']) if run['fin'] else None
+        return runs, next_cursor
+    except Exception as e:
+        logger.warning(f"No se pudo leer el historial de '{job}': {e}")
+        return [], None
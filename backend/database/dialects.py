@@ -0,0 +1,315 @@
+"""
+Capa de dialecto de la base de datos.
+
+El backend apunta a PostgreSQL en producción, pero la capa de datos también
+puede ejecutarse sobre un archivo SQLite embebido (DATABASE_URI=sqlite:///ruta.db)
+para benchmarks y pruebas herméticas de ingesta, entrenamiento y alertas en una
+sola máquina, sin servicio de base de datos que aprovisionar.
+
+Cada dialecto declara sus capacidades y los fragmentos SQL que difieren; db_utils
+ramifica solo en las rutas masivas (COPY, unnest/arrays, TRUNCATE). Con SQLite:
+- El esquema lo crea create_sqlite_schema() (equivalente al estado final de
+  las migraciones); no hay particiones ni advisory locks.
+- DATE/TIMESTAMP se convierten a date/datetime al leer (como con pg8000).
+- La carga de inventario usa executemany en lugar de COPY + staging.
+"""
+import sqlite3
+import logging
+from datetime import date, datetime
+
+from sqlalchemy import event, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+logger = logging.getLogger(__name__)
+
+
+class PostgresDialect:
+    name = "postgresql"
+    supports_partitions = True
+    supports_copy = True
+    supports_arrays = True
+    # Filas por INSERT multi-valor de ventas_detalle (límite de parámetros del driver)
+    insert_chunk_size = 5000
+
+    insert = staticmethod(pg_insert)
+
+    def json_param(self, name: str) -> str:
+        return f"CAST(:{name} AS JSONB)"
+
+    def date_param(self, name: str) -> str:
+        return f"CAST(:{name} AS DATE)"
+
+    def date_bucket(self, resolution: str, col: str) -> str:
+        """Inicio del período ('day', 'week' lunes, 'month') que contiene la fecha 'col'."""
+        if resolution == "day":
+            return col
+        return f"CAST(date_trunc('{resolution}', {col}) AS DATE)"
+
+    def truncate(self, conn, tables):
+        conn.execute(text(f"TRUNCATE TABLE {', '.join(tables)} RESTART IDENTITY CASCADE;"))
+
+
+class SQLiteDialect(PostgresDialect):
+    name = "sqlite"
+    supports_partitions = False
+    supports_copy = False
+    supports_arrays = False
+    # SQLITE_MAX_VARIABLE_NUMBER = 32766 (6 columnas por fila)
+    insert_chunk_size = 2000
+
+    insert = staticmethod(sqlite_insert)
+
+    def json_param(self, name: str) -> str:
+        return f":{name}"
+
+    def date_param(self, name: str) -> str:
+        return f":{name}"
+
+    def date_bucket(self, resolution: str, col: str) -> str:
+        # Devuelve texto ISO (las expresiones no pasan por los convertidores declarados)
+        if resolution == "week":
+            return f"date({col}, '-' || ((CAST(strftime('%w', {col}) AS INTEGER) + 6) % 7) || ' days')"
+        if resolution == "month":
+            return f"date({col}, 'start of month')"
+        return col
+
+    def truncate(self, conn, tables):
+        for table in tables:
+            conn.execute(text(f"DELETE FROM {table}"))
+        # RESTART IDENTITY
+        conn.execute(text("DELETE FROM sqlite_sequence WHERE name IN ({})".format(
+            ", ".join(f"'{t}'" for t in tables))))
+
+
+POSTGRES = PostgresDialect()
+SQLITE = SQLiteDialect()
+
+
+def get_dialect(bind) -> PostgresDialect:
+    """Dialecto de un Engine o Connection de SQLAlchemy."""
+    return SQLITE if bind.dialect.name == "sqlite" else POSTGRES
+
+
+def is_sqlite_uri(uri: str) -> bool:
+    return bool(uri) and uri.startswith("sqlite")
+
+
+# --- SQLite: tipos y conexión ---
+
+def _convert_date(value: bytes) -> date:
+    return date.fromisoformat(value.decode()[:10])
+
+
+def _convert_timestamp(value: bytes) -> datetime:
+    return datetime.fromisoformat(value.decode())
+
+
+# Los adaptadores/convertidores por defecto de sqlite3 están obsoletos desde Python 3.12
+sqlite3.register_adapter(date, lambda d: d.isoformat())
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(" "))
+sqlite3.register_converter("DATE", _convert_date)
+sqlite3.register_converter("TIMESTAMP", _convert_timestamp)
+
+SQLITE_ENGINE_KWARGS = {
+    # Columnas DATE/TIMESTAMP declaradas -> date/datetime (native_datetime evita
+    # que SQLAlchemy vuelva a procesarlas como texto)
+    "connect_args": {"detect_types": sqlite3.PARSE_DECLTYPES, "check_same_thread": False},
+    "native_datetime": True,
+}
+
+
+def configure_sqlite_engine(engine):
+    """PRAGMAs por conexión: WAL para lectores concurrentes, claves foráneas activas."""
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _record):
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+
+# Recursos servidos con ETag por la API: una fila en versiones_datos por recurso
+# (migración v9 en PostgreSQL, SQLITE_SCHEMA en SQLite; ver bump_data_versions en db_utils)
+DATA_VERSION_RESOURCES = ("ventas", "archivos", "metricas", "alertas", "alert_config")
+
+# Estado final equivalente a las migraciones de PostgreSQL (sin particiones ni staging UNLOGGED)
+SQLITE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS usuarios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username VARCHAR(50) NOT NULL UNIQUE,
+        password_hash VARCHAR(255) NOT NULL,
+        nombre VARCHAR(100) NOT NULL,
+        rol VARCHAR(50) NOT NULL,
+        correo_electronico VARCHAR(255),
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS alertas_inventario (
+        id VARCHAR(36) PRIMARY KEY,
+        sku VARCHAR(255) NOT NULL,
+        tipo_alerta VARCHAR(50) NOT NULL,
+        mensaje TEXT,
+        fecha_proyeccion DATE,
+        estado VARCHAR(50) DEFAULT 'PENDIENTE',
+        creado_en TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        actualizado_en TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS ux_alertas_pendientes_sku_tipo
+    ON alertas_inventario (sku, tipo_alerta) WHERE estado = 'PENDIENTE'
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_alertas_creado_id ON alertas_inventario (creado_en, id)",
+    """
+    CREATE TABLE IF NOT EXISTS alert_configurations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        producto_id VARCHAR(255) NOT NULL UNIQUE,
+        umbral_minimo INT NOT NULL,
+        umbral_sobreabastecimiento INT NOT NULL,
+        email_notificacion VARCHAR(255) NOT NULL,
+        is_active BOOLEAN DEFAULT 1,
+        updated_by VARCHAR(255),
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_alert_configurations_updated_id ON alert_configurations (updated_at, id)",
+    """
+    CREATE TABLE IF NOT EXISTS configuracion_sistema (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        smtp_host VARCHAR(255) DEFAULT 'smtp.gmail.com',
+        smtp_port INT DEFAULT 587,
+        smtp_user VARCHAR(255) DEFAULT '',
+        smtp_pass VARCHAR(255) DEFAULT '',
+        email_remitente VARCHAR(255) DEFAULT 'alertas@predictivo.auto',
+        email_destinatario_alertas VARCHAR(255) DEFAULT '',
+        perfil_destinatario_alertas VARCHAR(255) DEFAULT '',
+        pipeline_interval_ingestion INT DEFAULT 1,
+        pipeline_interval_retraining INT DEFAULT 3,
+        pipeline_interval_metrics INT DEFAULT 5,
+        pipeline_interval_alerts INT DEFAULT 3,
+        version BIGINT NOT NULL DEFAULT 1,
+        pipeline_enabled_ingestion BOOLEAN NOT NULL DEFAULT 0,
+        pipeline_enabled_retraining BOOLEAN NOT NULL DEFAULT 0,
+        pipeline_enabled_metrics BOOLEAN NOT NULL DEFAULT 0,
+        pipeline_enabled_alerts BOOLEAN NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    INSERT INTO configuracion_sistema (smtp_host, smtp_port)
+    SELECT 'smtp.gmail.com', 587
+    WHERE NOT EXISTS (SELECT 1 FROM configuracion_sistema)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS archivos_cargados (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre_archivo VARCHAR(512) NOT NULL,
+        fecha_carga TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        estado VARCHAR(20) DEFAULT 'valido',
+        filas_guardadas INTEGER DEFAULT 0,
+        mensaje TEXT,
+        cargado_por VARCHAR(100),
+        hash_contenido CHAR(64),
+        reporte_rechazos VARCHAR(1024),
+        rechazos_por_regla TEXT,
+        fecha_min DATE,
+        fecha_max DATE
+    )
+    """,
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS ux_archivos_cargados_hash ON archivos_cargados (hash_contenido)
+    WHERE hash_contenido IS NOT NULL AND estado <> 'invalido'
+    """,
+    "DROP INDEX IF EXISTS idx_archivos_cargados_hash",
+    """
+    CREATE INDEX IF NOT EXISTS idx_archivos_cargados_pendientes
+    ON archivos_cargados (estado, fecha_carga) WHERE estado IN ('valido', 'aprobado')
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_archivos_cargados_fecha_id ON archivos_cargados (fecha_carga, id)",
+    """
+    CREATE TABLE IF NOT EXISTS ventas_detalle (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        id_producto VARCHAR(255) NOT NULL,
+        fecha DATE NOT NULL,
+        cantidad_vendida INT NOT NULL,
+        fecha_carga TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        fingerprint BIGINT,
+        archivo_id INTEGER REFERENCES archivos_cargados (id) ON DELETE SET NULL
+    )
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_ventas_detalle_fingerprint ON ventas_detalle (fingerprint, fecha)",
+    "CREATE INDEX IF NOT EXISTS idx_ventas_detalle_archivo ON ventas_detalle (archivo_id)",
+    """
+    CREATE INDEX IF NOT EXISTS idx_ventas_detalle_producto_fecha
+    ON ventas_detalle (id_producto, fecha, cantidad_vendida)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ventas_diarias (
+        id_producto VARCHAR(255) NOT NULL,
+        fecha DATE NOT NULL,
+        unidades BIGINT NOT NULL DEFAULT 0,
+        lineas INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (id_producto, fecha)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_ventas_diarias_fecha ON ventas_diarias (fecha)",
+    """
+    CREATE TABLE IF NOT EXISTS inventario (
+        id_producto VARCHAR(255) PRIMARY KEY,
+        stock_actual INTEGER NOT NULL,
+        stock_seguridad INTEGER NOT NULL DEFAULT 0,
+        ultima_actualizacion TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS entrenamiento (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        model TEXT,
+        mae DOUBLE PRECISION,
+        rmse DOUBLE PRECISION,
+        r2 DOUBLE PRECISION,
+        fecha_registro TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_entrenamiento_fecha_id ON entrenamiento (fecha_registro, id)",
+    """
+    CREATE TABLE IF NOT EXISTS versiones_datos (
+        recurso VARCHAR(50) PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 1
+    )
+    """,
+    "INSERT OR IGNORE INTO versiones_datos (recurso) VALUES "
+    + ", ".join(f"('{recurso}')" for recurso in DATA_VERSION_RESOURCES),
+    """
+    CREATE TABLE IF NOT EXISTS job_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job VARCHAR(50) NOT NULL,
+        inicio TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        fin TIMESTAMP,
+        duracion_s DOUBLE PRECISION,
+        estado VARCHAR(20) NOT NULL DEFAULT 'running',
+        mensaje TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_job_runs_job_inicio_id ON job_runs (job, inicio, id)",
+    """
+    CREATE TABLE IF NOT EXISTS eventos_pipeline (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tipo VARCHAR(50) NOT NULL,
+        payload TEXT,
+        creado_en TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_eventos_pipeline_tipo_id ON eventos_pipeline (tipo, id)",
+]
+
+
+def create_sqlite_schema(engine):
+    """Crea (idempotente) el esquema completo en una base SQLite."""
+    with engine.begin() as conn:
+        for ddl in SQLITE_SCHEMA:
+            conn.execute(text(ddl))
+    logger.info("Esquema SQLite verificado/creado.")
@@ -0,0 +1,103 @@
+"""
+Diagnóstico de índices a partir de las vistas pg_stat de PostgreSQL.
+
+Reporta:
+- Índices gestionados (migrations.MANAGED_INDEXES) que faltan en la base.
+- Índices sin uso (idx_scan = 0) que no respaldan PK/UNIQUE: candidatos a eliminar.
+- Tablas dominadas por seq scans con muchas filas: probable índice faltante.
+
+Las estadísticas son acumuladas desde el último pg_stat_reset(); conviene
+consultarlas tras un periodo representativo de uso.
+
+Uso:
+    python -m backend.database.index_diagnostics [--min-rows 10000]
+"""
+import sys
+import logging
+import argparse
+
+from sqlalchemy import text
+
+from backend.database.migrations import MANAGED_INDEXES
+
+logger = logging.getLogger(__name__)
+
+
+def find_missing_managed_indexes(conn):
+    existing = {row[0] for row in conn.execute(text(
+        "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema()"
+    ))}
+    return [
+        {"indice": name, "tabla": table}
+        for name, (table, _) in MANAGED_INDEXES.items()
+        if name not in existing
+    ]
+
+
+def find_unused_indexes(conn):
+    rows = conn.execute(text("""
+        SELECT s.relname AS tabla, s.indexrelname AS indice, s.idx_scan,
+               pg_size_pretty(pg_relation_size(s.indexrelid)) AS tamano
+        FROM pg_stat_user_indexes s
+        JOIN pg_index i ON i.indexrelid = s.indexrelid
+        WHERE s.idx_scan = 0
+          AND NOT i.indisunique
+          AND NOT i.indisprimary
+        ORDER BY pg_relation_size(s.indexrelid) DESC
+    """)).fetchall()
+    return [dict(r._mapping) for r in rows]
+
+
+def find_seq_scan_heavy_tables(conn, min_rows: int = 10000):
+    rows = conn.execute(text("""
+        SELECT relname AS tabla, seq_scan, seq_tup_read, COALESCE(idx_scan, 0) AS idx_scan,
+               n_live_tup AS filas
+        FROM pg_stat_user_tables
+        WHERE n_live_tup >= :min_rows
+          AND seq_scan > COALESCE(idx_scan, 0)
+        ORDER BY seq_tup_read DESC
+    """), {"min_rows": min_rows}).fetchall()
+    return [dict(r._mapping) for r in rows]
+
+
+def run_diagnostics(engine, min_rows: int = 10000) -> dict:
+    """Retorna el reporte completo como dict (reutilizable desde la API o scripts)."""
+    with engine.connect() as conn:
+        return {
+            "indices_gestionados_faltantes": find_missing_managed_indexes(conn),
+            "indices_sin_uso": find_unused_indexes(conn),
+            "tablas_con_seq_scan": find_seq_scan_heavy_tables(conn, min_rows),
+        }
+
+
+def _print_section(title, rows, empty_msg):
+    print(f"\n== {title} ==")
+    if not rows:
+        print(f"  {empty_msg}")
+        return
+    for r in rows:
+        print("  " + ", ".join(f"{k}={v}" for k, v in r.items()))
+
+
+if __name__ == "__main__":
+    from backend.database.db_utils import get_db_engine
+
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description="Diagnóstico de índices (pg_stat_user_indexes / pg_stat_user_tables).")
+    parser.add_argument("--min-rows", type=int, default=10000,
+                        help="Filas mínimas para considerar una tabla en el análisis de seq scans.")
+    args = parser.parse_args()
+
+    engine = get_db_engine()
+    if engine is None:
+        print("Error: No se pudo conectar a la base de datos.")
+        sys.exit(1)
+
+    report = run_diagnostics(engine, args.min_rows)
+    _print_section("Índices gestionados faltantes (aplicar migraciones)",
+                   report["indices_gestionados_faltantes"], "Ninguno.")
+    _print_section("Índices sin uso (idx_scan = 0, no PK/UNIQUE)",
+                   report["indices_sin_uso"], "Ninguno.")
+    _print_section(f"Tablas con más seq scans que index scans (>= {args.min_rows} filas)",
+                   report["tablas_con_seq_scan"], "Ninguna.")
+    sys.exit(1 if report["indices_gestionados_faltantes"] else 0)
@@ -0,0 +1,184 @@
+"""
+Leases de ejecución única en todo el clúster (advisory locks de PostgreSQL).
+
+Con varias réplicas del backend, los bulkheads (por proceso) y el lock de archivo
+del planificador (por máquina) no impiden que dos instancias entrenen a la vez
+sobre el mismo models/ o evalúen alertas en paralelo. Cada trabajo exclusivo
+toma un lease, un advisory lock de sesión sobre una conexión dedicada que se
+retiene mientras dura:
+
+- scheduler:  líder del planificador (solo una instancia despacha jobs).
+- training:   re-entrenamiento + recarga + marcado de archivos.
+- alerts:     evaluación de alertas.
+
+Si el proceso muere, PostgreSQL cierra su sesión y libera el lease: no quedan
+locks huérfanos que limpiar. Requiere conexiones de sesión (con PgBouncer, pool
+en modo session).
+
+Las transiciones de estado de archivos_cargados, cortas, se serializan con un
+lock de transacción (lock_in_transaction), como la creación de particiones.
+
+Con SQLite (una sola máquina) los leases son locks del proceso y
+lock_in_transaction no hace nada: SQLite ya serializa las escrituras.
+"""
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import text
+
+from backend.database.dialects import get_dialect
+from backend.telemetry import Counter, Histogram, CallbackGauge, register
+
+logger = logging.getLogger(__name__)
+
+# Claves arbitrarias (bigint), en el rango de MIGRATION_LOCK_KEY / PARTITION_LOCK_KEY
+LEASE_KEYS = {
+    "scheduler":  72_031_101,
+    "training":   72_031_102,
+    "alerts":     72_031_103,
+    "file_state": 72_031_104,
+}
+LEASE_POLL_SECONDS = 0.5
+
+LEASE_WAIT_SECONDS = register(Histogram(
+    "lease_wait_seconds", "Espera para obtener un lease o lock del clúster.", ("lease", "outcome")
+))
+LEASE_BUSY = register(Counter(
+    "lease_busy_total", "Intentos rechazados porque otra instancia retenía el lease.", ("lease",)
+))
+
+# Locks del proceso que sustituyen a los advisory locks con SQLite
+_local_locks = {name: threading.Lock() for name in LEASE_KEYS}
+_HELD = set()
+register(CallbackGauge(
+    "lease_held", "Leases retenidos por este proceso (1) o no (0).", ("lease",),
+    lambda: {(name,): int(name in _HELD) for name in LEASE_KEYS}
+))
+
+
+class Lease:
+    """Advisory lock de sesión sobre una conexión propia (o lock del proceso con SQLite)."""
+
+    def __init__(self, name: str, engine=None):
+        if engine is None:
+            from backend.database.db_utils import get_db_engine
+            engine = get_db_engine()
+        self.name = name
+        self.key = LEASE_KEYS[name]
+        self.engine = engine
+        self.held = False
+        self._conn = None
+        self._local = get_dialect(engine).name == "sqlite"
+
+    def acquire(self, wait: float = 0, observe: bool = True) -> bool:
+        """
+        Intenta tomar el lease esperando hasta 'wait' segundos. Retorna True si quedó
+        retenido. observe=False no registra métricas (sondeos como is_free).
+        """
+        start = time.perf_counter()
+        if self._local:
+            lock = _local_locks[self.name]
+            self.held = lock.acquire(timeout=wait) if wait > 0 else lock.acquire(blocking=False)
+        else:
+            self.held = self._acquire_advisory(time.monotonic() + wait)
+
+        if self.held:
+            _HELD.add(self.name)
+        if observe:
+            LEASE_WAIT_SECONDS.observe(time.perf_counter() - start, lease=self.name,
+                                       outcome="acquired" if self.held else "busy")
+            if not self.held:
+                LEASE_BUSY.inc(lease=self.name)
+        return self.held
+
+    def _acquire_advisory(self, deadline: float) -> bool:
+        conn = self.engine.connect()
+        try:
+            while True:
+                acquired = conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": self.key}).scalar()
+                conn.commit()  # Sin transacción abierta mientras se retiene el lease
+                if acquired:
+                    self._conn = conn
+                    return True
+                if time.monotonic() >= deadline:
+                    break
+                time.sleep(LEASE_POLL_SECONDS)
+        except Exception:
+            conn.close()
+            raise
+        conn.close()
+        return False
+
+    def alive(self) -> bool:
+        """Comprueba que la sesión que retiene el lease sigue viva (si cayó, el lease ya se liberó)."""
+        if not self.held or self._conn is None:
+            return self.held
+        try:
+            self._conn.execute(text("SELECT 1"))
+            self._conn.commit()
+            return True
+        except Exception as e:
+            logger.warning(f"[Lease] Se perdió la sesión del lease '{self.name}': {e}")
+            self._discard()
+            return False
+
+    def release(self):
+        if not self.held:
+            return
+        if self._local:
+            _local_locks[self.name].release()
+            self.held = False
+            _HELD.discard(self.name)
+            return
+        try:
+            self._conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": self.key})
+            self._conn.commit()
+            self._conn.close()
+            self._conn = None
+        except Exception as e:
+            # Una conexión que pudo seguir con el lock no vuelve al pool
+            logger.warning(f"[Lease] Error liberando '{self.name}': {e}")
+        finally:
+            self._discard()
+
+    def _discard(self):
+        if self._conn is not None:
+            self._conn.invalidate()
+            self._conn.close()
+            self._conn = None
+        self.held = False
+        _HELD.discard(self.name)
+
+
+@contextmanager
+def hold(name: str, wait: float = 0, engine=None):
+    """
+    with hold("training") as acquired: ...  -> 'acquired' es False si otra
+    instancia lo retiene (el bloque decide cómo responder).
+    """
+    lease = Lease(name, engine)
+    acquired = lease.acquire(wait)
+    try:
+        yield acquired
+    finally:
+        lease.release()
+
+
+def is_free(name: str, engine=None) -> bool:
+    """True si nadie retiene el lease en este momento (lo toma y lo suelta)."""
+    lease = Lease(name, engine)
+    if lease.acquire(observe=False):
+        lease.release()
+        return True
+    return False
+
+
+def lock_in_transaction(conn, name: str):
+    """Advisory lock de transacción (se libera con el COMMIT / ROLLBACK de 'conn')."""
+    if get_dialect(conn).name == "sqlite":
+        return
+    start = time.perf_counter()
+    conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": LEASE_KEYS[name]})
+    LEASE_WAIT_SECONDS.observe(time.perf_counter() - start, lease=name, outcome="acquired")
@@ -0,0 +1,612 @@
+"""
+Migraciones versionadas del esquema.
+
+Cada migración es una función registrada con @migration(version, descripcion)
+que recibe una conexión dentro de su propia transacción. La versión aplicada
+queda en la tabla 'schema_version'. run_migrations() se ejecuta una vez al
+arrancar (create_app, daemons, scripts) bajo un advisory lock de PostgreSQL,
+de modo que varios workers de gunicorn arrancando a la vez no compiten por el
+catálogo: el primero migra y el resto solo verifica la versión.
+
+Para cambiar el esquema: añadir una nueva función al final con la siguiente
+versión. Nunca editar una migración ya publicada.
+"""
+import logging
+from datetime import date
+
+from sqlalchemy import text, bindparam
+
+from backend.database import partitions
+from backend.database.dialects import DATA_VERSION_RESOURCES
+
+logger = logging.getLogger(__name__)
+
+# Clave arbitraria (bigint) del advisory lock de migraciones
+MIGRATION_LOCK_KEY = 72_031_001
+
+MIGRATIONS = []
+
+
+def migration(version: int, descripcion: str):
+    """Registra una función como migración de la versión indicada."""
+    def decorator(fn):
+        MIGRATIONS.append((version, descripcion, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return decorator
+
+
+# --- Migraciones ---
+
+@migration(1, "Esquema base consolidado (antes en initialize_db)")
+def _v1_baseline(conn):
+    # Idempotente: las bases existentes ya tienen buena parte de estas tablas.
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+            username VARCHAR(50) NOT NULL UNIQUE,
+            password_hash VARCHAR(255) NOT NULL,
+            nombre VARCHAR(100) NOT NULL,
+            rol VARCHAR(50) NOT NULL,
+            correo_electronico VARCHAR(255),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """))
+    conn.execute(text("ALTER TABLE usuarios ADD COLUMN IF NOT EXISTS correo_electronico VARCHAR(255);"))
+
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS alertas_inventario (
+            id VARCHAR(36) PRIMARY KEY,
+            sku VARCHAR(255) NOT NULL,
+            tipo_alerta VARCHAR(50) NOT NULL,
+            mensaje TEXT,
+            fecha_proyeccion DATE,
+            estado VARCHAR(50) DEFAULT 'PENDIENTE',
+            creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """))
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS alert_configurations (
+            id SERIAL PRIMARY KEY,
+            producto_id VARCHAR(255) NOT NULL UNIQUE,
+            umbral_minimo INT NOT NULL,
+            umbral_sobreabastecimiento INT NOT NULL,
+            email_notificacion VARCHAR(255) NOT NULL,
+            is_active BOOLEAN DEFAULT TRUE,
+            updated_by VARCHAR(255),
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """))
+
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS configuracion_sistema (
+            id SERIAL PRIMARY KEY,
+            smtp_host VARCHAR(255) DEFAULT 'smtp.gmail.com',
+            smtp_port INT DEFAULT 587,
+            smtp_user VARCHAR(255) DEFAULT '',
+            smtp_pass VARCHAR(255) DEFAULT '',
+            email_remitente VARCHAR(255) DEFAULT 'alertas@predictivo.auto',
+            email_destinatario_alertas VARCHAR(255) DEFAULT '',
+            perfil_destinatario_alertas VARCHAR(255) DEFAULT '',
+            pipeline_interval_ingestion INT DEFAULT 1,
+            pipeline_interval_retraining INT DEFAULT 3,
+            pipeline_interval_metrics INT DEFAULT 5,
+            pipeline_interval_alerts INT DEFAULT 3
+        );
+    """))
+    # Bases creadas antes de los intervalos de pipeline
+    for col_name, col_def in {
+        "pipeline_interval_ingestion":  "INT DEFAULT 1",
+        "pipeline_interval_retraining": "INT DEFAULT 3",
+        "pipeline_interval_metrics":    "INT DEFAULT 5",
+        "pipeline_interval_alerts":     "INT DEFAULT 3",
+    }.items():
+        conn.execute(text(f"ALTER TABLE configuracion_sistema ADD COLUMN IF NOT EXISTS {col_name} {col_def};"))
+    conn.execute(text("""
+        INSERT INTO configuracion_sistema (smtp_host, smtp_port)
+        SELECT 'smtp.gmail.com', 587
+        WHERE NOT EXISTS (SELECT 1 FROM configuracion_sistema)
+    """))
+
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS archivos_cargados (
+            id SERIAL PRIMARY KEY,
+            nombre_archivo VARCHAR(512) NOT NULL,
+            fecha_carga TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            estado VARCHAR(20) DEFAULT 'valido',
+            filas_guardadas INTEGER DEFAULT 0,
+            mensaje TEXT,
+            cargado_por VARCHAR(100)
+        );
+    """))
+    # Hash SHA-256 del contenido para rechazar archivos ya ingeridos
+    conn.execute(text("ALTER TABLE archivos_cargados ADD COLUMN IF NOT EXISTS hash_contenido CHAR(64);"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_archivos_cargados_hash ON archivos_cargados (hash_contenido);"))
+    # Reporte de filas rechazadas en la validación (sidecar Parquet) y conteo por regla
+    conn.execute(text("ALTER TABLE archivos_cargados ADD COLUMN IF NOT EXISTS reporte_rechazos VARCHAR(1024);"))
+    conn.execute(text("ALTER TABLE archivos_cargados ADD COLUMN IF NOT EXISTS rechazos_por_regla JSONB;"))
+
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS ventas_detalle (
+            id INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+            id_producto VARCHAR(255) NOT NULL,
+            fecha DATE NOT NULL,
+            cantidad_vendida INT NOT NULL,
+            fecha_carga TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """))
+    # Huella por fila: la unicidad la garantiza la BD, no un drop_duplicates en entrenamiento
+    conn.execute(text("ALTER TABLE ventas_detalle ADD COLUMN IF NOT EXISTS fingerprint BIGINT;"))
+    conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ux_ventas_detalle_fingerprint ON ventas_detalle (fingerprint);"))
+    # Linaje archivo -> filas: el entrenamiento filtra por archivos aprobados
+    conn.execute(text("""
+        ALTER TABLE ventas_detalle ADD COLUMN IF NOT EXISTS archivo_id INTEGER
+        REFERENCES archivos_cargados (id) ON DELETE SET NULL;
+    """))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_ventas_detalle_archivo ON ventas_detalle (archivo_id);"))
+
+
+# Índices secundarios gestionados: nombre -> (tabla, DDL). Es el estado esperado que
+# index_diagnostics compara con la base. Las migraciones llevan su propia copia
+# literal del DDL: cambiar un índice es una migración nueva más su entrada aquí.
+MANAGED_INDEXES = {
+    # /history: filtro por SKU ordenado por fecha; INCLUDE permite index-only scans
+    "idx_ventas_detalle_producto_fecha": ("ventas_detalle", """
+        CREATE INDEX IF NOT EXISTS idx_ventas_detalle_producto_fecha
+        ON ventas_detalle (id_producto, fecha) INCLUDE (cantidad_vendida)
+    """),
+    # bulk_upsert_alerts: árbitro de ON CONFLICT; a lo sumo una alerta pendiente por (sku, tipo)
+    "ux_alertas_pendientes_sku_tipo": ("alertas_inventario", """
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_alertas_pendientes_sku_tipo
+        ON alertas_inventario (sku, tipo_alerta) WHERE estado = 'PENDIENTE'
+    """),
+    # get_active_alerts: listado paginado por keyset (creado_en, id) con filtro de estado
+    "idx_alertas_creado_id": ("alertas_inventario", """
+        CREATE INDEX IF NOT EXISTS idx_alertas_creado_id
+        ON alertas_inventario (creado_en, id)
+    """),
+    # Pipeline de archivos: 'valido' -> 'aprobado' -> 'procesado'; los procesados son la mayoría
+    "idx_archivos_cargados_pendientes": ("archivos_cargados", """
+        CREATE INDEX IF NOT EXISTS idx_archivos_cargados_pendientes
+        ON archivos_cargados (estado, fecha_carga) WHERE estado IN ('valido', 'aprobado')
+    """),
+    # Listados paginados por keyset (ts, id): archivos, umbrales y métricas
+    "idx_archivos_cargados_fecha_id": ("archivos_cargados", """
+        CREATE INDEX IF NOT EXISTS idx_archivos_cargados_fecha_id
+        ON archivos_cargados (fecha_carga, id)
+    """),
+    "idx_alert_configurations_updated_id": ("alert_configurations", """
+        CREATE INDEX IF NOT EXISTS idx_alert_configurations_updated_id
+        ON alert_configurations (updated_at, id)
+    """),
+    "idx_entrenamiento_fecha_id": ("entrenamiento", """
+        CREATE INDEX IF NOT EXISTS idx_entrenamiento_fecha_id
+        ON entrenamiento (fecha_registro, id)
+    """),
+    # Recarga de modelos en cada proceso: último 'model-published' (MAX(id) por tipo)
+    "idx_eventos_pipeline_tipo_id": ("eventos_pipeline", """
+        CREATE INDEX IF NOT EXISTS idx_eventos_pipeline_tipo_id
+        ON eventos_pipeline (tipo, id)
+    """),
+}
+
+
+@migration(2, "Índices para /history, alertas pendientes/activas y estados de archivo")
+def _v2_hot_path_indexes(conn):
+    conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS idx_ventas_detalle_producto_fecha
+        ON ventas_detalle (id_producto, fecha) INCLUDE (cantidad_vendida)
+    """))
+    # Reemplazado por el índice único de v5
+    conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS idx_alertas_pendientes_sku_tipo
+        ON alertas_inventario (sku, tipo_alerta) WHERE estado = 'PENDIENTE'
+    """))
+    # Reemplazado por idx_alertas_creado_id en v7
+    conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS idx_alertas_activas_creado
+        ON alertas_inventario (creado_en DESC) WHERE estado IN ('PENDIENTE', 'EN GESTIÓN')
+    """))
+    conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS idx_archivos_cargados_pendientes
+        ON archivos_cargados (estado, fecha_carga) WHERE estado IN ('valido', 'aprobado')
+    """))
+    # Índice manual sugerido antes en el README: redundante con el prefijo del compuesto
+    conn.execute(text("DROP INDEX IF EXISTS idx_producto"))
+    for table in ("ventas_detalle", "alertas_inventario", "archivos_cargados"):
+        conn.execute(text(f"ANALYZE {table}"))
+
+
+@migration(3, "ventas_detalle particionada por mes (RANGE fecha) + rango de fechas por archivo")
+def _v3_partition_ventas(conn):
+    # Rango de fechas de cada archivo: el entrenamiento lo usa como cota para la poda de particiones
+    conn.execute(text("ALTER TABLE archivos_cargados ADD COLUMN IF NOT EXISTS fecha_min DATE;"))
+    conn.execute(text("ALTER TABLE archivos_cargados ADD COLUMN IF NOT EXISTS fecha_max DATE;"))
+
+    if partitions.is_partitioned(conn):
+        return
+
+    conn.execute(text("ALTER TABLE ventas_detalle RENAME TO ventas_detalle_legacy"))
+    # Liberar los nombres de objetos a nivel de esquema que reutiliza la tabla nueva
+    conn.execute(text("ALTER INDEX IF EXISTS ventas_detalle_pkey RENAME TO ventas_detalle_legacy_pkey"))
+    conn.execute(text("ALTER SEQUENCE IF EXISTS ventas_detalle_id_seq RENAME TO ventas_detalle_legacy_id_seq"))
+    # PK y UNIQUE deben incluir la clave de partición. La huella ya depende de la
+    # fecha, así que (fingerprint, fecha) es tan estricta como fingerprint sola.
+    conn.execute(text("""
+        CREATE TABLE ventas_detalle (
+            id BIGSERIAL,
+            id_producto VARCHAR(255) NOT NULL,
+            fecha DATE NOT NULL,
+            cantidad_vendida INT NOT NULL,
+            fecha_carga TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            fingerprint BIGINT,
+            archivo_id INTEGER REFERENCES archivos_cargados (id) ON DELETE SET NULL,
+            PRIMARY KEY (id, fecha)
+        ) PARTITION BY RANGE (fecha);
+    """))
+
+    bounds = conn.execute(text("SELECT MIN(fecha), MAX(fecha) FROM ventas_detalle_legacy")).fetchone()
+    current = partitions.month_start(date.today())
+    months = set(partitions.months_between(bounds[0], bounds[1]))
+    months.update(partitions.add_months(current, i) for i in range(4))
+    for month in sorted(months):
+        partitions.create_partition(conn, month)
+
+    conn.execute(text("""
+        INSERT INTO ventas_detalle (id, id_producto, fecha, cantidad_vendida, fecha_carga, fingerprint, archivo_id)
+        SELECT id, id_producto, fecha, cantidad_vendida, fecha_carga, fingerprint, archivo_id
+        FROM ventas_detalle_legacy
+    """))
+    conn.execute(text("""
+        SELECT setval(pg_get_serial_sequence('ventas_detalle', 'id'),
+                      COALESCE((SELECT MAX(id) FROM ventas_detalle), 0) + 1, false)
+    """))
+    conn.execute(text("""
+        UPDATE archivos_cargados a
+        SET fecha_min = r.fecha_min, fecha_max = r.fecha_max
+        FROM (
+            SELECT archivo_id, MIN(fecha) AS fecha_min, MAX(fecha) AS fecha_max
+            FROM ventas_detalle_legacy
+            WHERE archivo_id IS NOT NULL
+            GROUP BY archivo_id
+        ) r
+        WHERE a.id = r.archivo_id
+    """))
+    conn.execute(text("DROP TABLE ventas_detalle_legacy"))
+
+    # Índices en la tabla padre: se propagan a cada partición, presente y futura
+    conn.execute(text("CREATE UNIQUE INDEX ux_ventas_detalle_fingerprint ON ventas_detalle (fingerprint, fecha);"))
+    conn.execute(text("CREATE INDEX idx_ventas_detalle_archivo ON ventas_detalle (archivo_id);"))
+    conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS idx_ventas_detalle_producto_fecha
+        ON ventas_detalle (id_producto, fecha) INCLUDE (cantidad_vendida)
+    """))
+    conn.execute(text("ANALYZE ventas_detalle"))
+
+
+@migration(4, "Agregado diario ventas_diarias (id_producto, fecha) mantenido por la ingesta")
+def _v4_ventas_diarias(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS ventas_diarias (
+            id_producto VARCHAR(255) NOT NULL,
+            fecha DATE NOT NULL,
+            unidades BIGINT NOT NULL DEFAULT 0,
+            lineas INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (id_producto, fecha)
+        );
+    """))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_ventas_diarias_fecha ON ventas_diarias (fecha);"))
+    # Backfill desde el detalle existente
+    conn.execute(text("""
+        INSERT INTO ventas_diarias (id_producto, fecha, unidades, lineas)
+        SELECT id_producto, fecha, SUM(cantidad_vendida), COUNT(*)
+        FROM ventas_detalle
+        GROUP BY id_producto, fecha
+        ON CONFLICT (id_producto, fecha) DO NOTHING
+    """))
+    conn.execute(text("ANALYZE ventas_diarias"))
+
+
+@migration(5, "Índice único parcial de alertas pendientes por (sku, tipo_alerta)")
+def _v5_unique_pending_alerts(conn):
+    # Duplicados históricos (carreras del antiguo SELECT-then-INSERT): se conserva
+    # la pendiente más reciente y el resto pasa a DESCARTADA.
+    conn.execute(text("""
+        UPDATE alertas_inventario a
+        SET estado = 'DESCARTADA'
+        FROM (
+            SELECT id, ROW_NUMBER() OVER (
+                PARTITION BY sku, tipo_alerta ORDER BY creado_en DESC, id
+            ) AS rn
+            FROM alertas_inventario
+            WHERE estado = 'PENDIENTE'
+        ) d
+        WHERE a.id = d.id AND d.rn > 1
+    """))
+    conn.execute(text("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_alertas_pendientes_sku_tipo
+        ON alertas_inventario (sku, tipo_alerta) WHERE estado = 'PENDIENTE'
+    """))
+    conn.execute(text("DROP INDEX IF EXISTS idx_alertas_pendientes_sku_tipo"))
+
+
+@migration(6, "Inventario real (inventario) + staging UNLOGGED para cargas masivas por COPY")
+def _v6_inventario(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS inventario (
+            id_producto VARCHAR(255) PRIMARY KEY,
+            stock_actual INTEGER NOT NULL,
+            stock_seguridad INTEGER NOT NULL DEFAULT 0,
+            ultima_actualizacion TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+    """))
+    # Sin WAL: es un área de paso; cada carga usa su 'lote' y lo borra al fusionar
+    conn.execute(text("""
+        CREATE UNLOGGED TABLE IF NOT EXISTS inventario_staging (
+            lote VARCHAR(36) NOT NULL,
+            fila BIGINT NOT NULL,
+            id_producto VARCHAR(255) NOT NULL,
+            stock_actual INTEGER NOT NULL,
+            stock_seguridad INTEGER NOT NULL
+        );
+    """))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_inventario_staging_lote ON inventario_staging (lote);"))
+
+
+# Columna temporal de orden de cada listado paginado
+KEYSET_ORDER_COLUMNS = {
+    "archivos_cargados": "fecha_carga",
+    "alertas_inventario": "creado_en",
+    "alert_configurations": "updated_at",
+    "usuarios": "created_at",
+    "entrenamiento": "fecha_registro",
+}
+
+
+@migration(7, "Paginación keyset: id en entrenamiento, columnas de orden NOT NULL e índices (ts, id)")
+def _v7_keyset_pagination(conn):
+    # 'entrenamiento' la creaba to_sql en el primer entrenamiento y no tenía clave
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS entrenamiento (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            model TEXT,
+            mae DOUBLE PRECISION,
+            rmse DOUBLE PRECISION,
+            r2 DOUBLE PRECISION,
+            fecha_registro TIMESTAMP
+        );
+    """))
+    conn.execute(text("ALTER TABLE entrenamiento ADD COLUMN IF NOT EXISTS id BIGINT GENERATED BY DEFAULT AS IDENTITY;"))
+
+    # (ts, id) < (:ts, :id) es NULL si ts lo es: esas filas nunca aparecerían tras la primera página
+    for table, col in KEYSET_ORDER_COLUMNS.items():
+        conn.execute(text(f"UPDATE {table} SET {col} = CURRENT_TIMESTAMP WHERE {col} IS NULL"))
+        conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {col} SET DEFAULT CURRENT_TIMESTAMP"))
+        conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {col} SET NOT NULL"))
+
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_alertas_creado_id ON alertas_inventario (creado_en, id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_archivos_cargados_fecha_id ON archivos_cargados (fecha_carga, id)"))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS idx_alert_configurations_updated_id ON alert_configurations (updated_at, id)"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_entrenamiento_fecha_id ON entrenamiento (fecha_registro, id)"))
+    conn.execute(text("DROP INDEX IF EXISTS idx_alertas_activas_creado"))
+    for table in ("alertas_inventario", "archivos_cargados", "alert_configurations", "entrenamiento"):
+        conn.execute(text(f"ANALYZE {table}"))
+
+
+@migration(8, "Versión de configuracion_sistema para la caché de configuración por proceso")
+def _v8_config_version(conn):
+    conn.execute(text("ALTER TABLE configuracion_sistema ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 1;"))
+
+
+@migration(9, "Contadores de versión por recurso (versiones_datos) para ETag / GET condicional")
+def _v9_versiones_datos(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS versiones_datos (
+            recurso VARCHAR(50) PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 1
+        );
+    """))
+    for recurso in DATA_VERSION_RESOURCES:
+        conn.execute(text(
+            "INSERT INTO versiones_datos (recurso) VALUES (:r) ON CONFLICT (recurso) DO NOTHING"
+        ), {"r": recurso})
+
+
+
+# Flags de activación de los jobs del planificador (uno por job, junto a su intervalo)
+PIPELINE_ENABLED_COLUMNS = ("pipeline_enabled_ingestion", "pipeline_enabled_retraining",
+                            "pipeline_enabled_metrics", "pipeline_enabled_alerts")
+
+@migration(10, "Planificador en proceso: historial job_runs y flags de activación de jobs")
+def _v10_job_runs(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS job_runs (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            job VARCHAR(50) NOT NULL,
+            inicio TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            fin TIMESTAMP,
+            duracion_s DOUBLE PRECISION,
+            estado VARCHAR(20) NOT NULL DEFAULT 'running',
+            mensaje TEXT
+        );
+    """))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_job_runs_job_inicio_id ON job_runs (job, inicio, id);"))
+    for col in PIPELINE_ENABLED_COLUMNS:
+        conn.execute(text(f"ALTER TABLE configuracion_sistema ADD COLUMN IF NOT EXISTS {col} BOOLEAN NOT NULL DEFAULT FALSE;"))
+
+
+
+@migration(11, "Outbox de eventos del pipeline (eventos_pipeline)")
+def _v11_eventos_pipeline(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS eventos_pipeline (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            tipo VARCHAR(50) NOT NULL,
+            payload JSONB,
+            creado_en TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+    """))
+
+# Productos por lote del backfill de huellas (acota la memoria del DataFrame)
+FINGERPRINT_BACKFILL_BATCH = 500
+
+@migration(12, "Huella (fingerprint) de las filas de ventas_detalle cargadas antes de la deduplicación")
+def _v12_backfill_fingerprints(conn):
+    # Import diferido: ingestion_service importa db_utils, que importa este módulo
+    import pandas as pd
+    from backend.services.ingestion_service import add_row_fingerprints
+
+    productos = conn.execute(text(
+        "SELECT DISTINCT id_producto FROM ventas_detalle WHERE fingerprint IS NULL ORDER BY id_producto"
+    )).scalars().all()
+    if not productos:
+        return
+
+    conn.execute(text("""
+        CREATE TEMP TABLE huellas_backfill (id BIGINT, fecha DATE, fingerprint BIGINT) ON COMMIT DROP
+    """))
+    for i in range(0, len(productos), FINGERPRINT_BACKFILL_BATCH):
+        lote = productos[i:i + FINGERPRINT_BACKFILL_BATCH]
+        rows = conn.execute(text("""
+            SELECT id, id_producto, fecha, cantidad_vendida, fecha_carga FROM ventas_detalle
+            WHERE fingerprint IS NULL AND id_producto IN :productos
+            ORDER BY id
+        """).bindparams(bindparam("productos", expanding=True)), {"productos": lote}).fetchall()
+        # Mismos tipos que en la ingesta (str, datetime64, int64): la huella coincide con
+        # la de un reenvío futuro de esas filas. Cada carga histórica (una transacción,
+        # un mismo fecha_carga) cuenta como un archivo: las repeticiones dentro de una
+        # carga conservan huellas distintas y un archivo cargado dos veces colisiona.
+        df = pd.DataFrame(rows, columns=["id", "id_producto", "fecha", "cantidad_vendida", "fecha_carga"])
+        df["id_producto"] = df["id_producto"].astype(str)
+        df["fecha"] = pd.to_datetime(df["fecha"])
+        df["cantidad_vendida"] = df["cantidad_vendida"].astype("int64")
+        df = add_row_fingerprints(df, lote="fecha_carga")
+        conn.execute(
+            text("INSERT INTO huellas_backfill (id, fecha, fingerprint) VALUES (:id, :fecha, :fingerprint)"),
+            [{"id": int(r.id), "fecha": r.fecha.date(), "fingerprint": int(r.fingerprint)}
+             for r in df.itertuples(index=False)]
+        )
+    conn.execute(text("CREATE INDEX ON huellas_backfill (fingerprint, fecha, id)"))
+
+    # Duplicados que antes quitaba drop_duplicates: filas históricas que ya se volvieron a
+    # cargar después (su huella existe) o que repiten otra carga histórica (se conserva la
+    # de menor id). Se borran y se descuentan del agregado: la copia que queda es la de un
+    # archivo con linaje si existe. Las históricas restantes siguen sin archivo_id: cuentan
+    # en el historial y las alertas, pero no en el entrenamiento (ver load_data_from_db).
+    conn.execute(text("""
+        WITH duplicadas AS (
+            DELETE FROM ventas_detalle v
+            USING huellas_backfill h
+            WHERE v.id = h.id AND v.fecha = h.fecha
+              AND (EXISTS (SELECT 1 FROM ventas_detalle x WHERE x.fingerprint = h.fingerprint AND x.fecha = h.fecha)
+                   OR EXISTS (SELECT 1 FROM huellas_backfill o
+                              WHERE o.fingerprint = h.fingerprint AND o.fecha = h.fecha AND o.id < h.id))
+            RETURNING v.id_producto, v.fecha, v.cantidad_vendida
+        )
+        UPDATE ventas_diarias d
+        SET unidades = d.unidades - r.unidades, lineas = d.lineas - r.lineas
+        FROM (
+            SELECT id_producto, fecha, SUM(cantidad_vendida) AS unidades, COUNT(*) AS lineas
+            FROM duplicadas GROUP BY id_producto, fecha
+        ) r
+        WHERE d.id_producto = r.id_producto AND d.fecha = r.fecha
+    """))
+    conn.execute(text("DELETE FROM ventas_diarias WHERE lineas <= 0"))
+    conn.execute(text("""
+        UPDATE ventas_detalle v SET fingerprint = h.fingerprint
+        FROM huellas_backfill h
+        WHERE v.id = h.id AND v.fecha = h.fecha AND v.fingerprint IS NULL
+    """))
+
+
+@migration(13, "Hash de contenido único entre archivos no inválidos (cargas simultáneas del mismo archivo)")
+def _v13_unique_file_hash(conn):
+    # Duplicados previos: el archivo más antiguo conserva el hash
+    conn.execute(text("""
+        UPDATE archivos_cargados a
+        SET hash_contenido = NULL
+        FROM (
+            SELECT id, ROW_NUMBER() OVER (PARTITION BY hash_contenido ORDER BY fecha_carga, id) AS rn
+            FROM archivos_cargados
+            WHERE hash_contenido IS NOT NULL AND estado <> 'invalido'
+        ) d
+        WHERE a.id = d.id AND d.rn > 1
+    """))
+    # Los 'invalido' quedan fuera: se permite reintentar su carga (find_uploaded_file_by_hash)
+    conn.execute(text("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_archivos_cargados_hash ON archivos_cargados (hash_contenido)
+        WHERE hash_contenido IS NOT NULL AND estado <> 'invalido'
+    """))
+    conn.execute(text("DROP INDEX IF EXISTS idx_archivos_cargados_hash"))
+
+
+@migration(14, "Índice (tipo, id) del outbox para el último evento de un tipo (recarga de modelos)")
+def _v14_eventos_pipeline_tipo(conn):
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_eventos_pipeline_tipo_id ON eventos_pipeline (tipo, id)"))
+
+
+@migration(15, "actualizado_en en alertas_inventario: creado_en deja de cambiar (cursor keyset estable)")
+def _v15_alertas_actualizado_en(conn):
+    conn.execute(text("ALTER TABLE alertas_inventario ADD COLUMN IF NOT EXISTS actualizado_en TIMESTAMP"))
+    conn.execute(text("UPDATE alertas_inventario SET actualizado_en = creado_en WHERE actualizado_en IS NULL"))
+    conn.execute(text("ALTER TABLE alertas_inventario ALTER COLUMN actualizado_en SET DEFAULT CURRENT_TIMESTAMP"))
+    conn.execute(text("ALTER TABLE alertas_inventario ALTER COLUMN actualizado_en SET NOT NULL"))
+
+# --- Ejecución ---
+
+def _ensure_version_table(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            descripcion VARCHAR(255),
+            aplicado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """))
+
+
+def get_schema_version(conn) -> int:
+    return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+
+
+def run_migrations(engine) -> int:
+    """
+    Aplica en orden las migraciones pendientes, cada una en su transacción.
+    Devuelve la versión final del esquema. Si una migración falla se
+    interrumpe el proceso (las anteriores quedan aplicadas) y se relanza.
+    """
+    with engine.connect() as conn:
+        # El advisory lock es de sesión: se toma fuera de las transacciones de cada paso
+        conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": MIGRATION_LOCK_KEY})
+        conn.commit()
+        try:
+            with conn.begin():
+                _ensure_version_table(conn)
+                current = get_schema_version(conn)
+
+            pending = [m for m in MIGRATIONS if m[0] > current]
+            if not pending:
+                logger.info(f"Esquema al día (versión {current}).")
+                return current
+
+            for version, descripcion, fn in pending:
+                logger.info(f"Aplicando migración v{version}: {descripcion}")
+                with conn.begin():
+                    fn(conn)
+                    conn.execute(
+                        text("INSERT INTO schema_version (version, descripcion) VALUES (:v, :d)"),
+                        {"v": version, "d": descripcion}
+                    )
+                current = version
+            logger.info(f"Migraciones aplicadas. Esquema en versión {current}.")
+            return current
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": MIGRATION_LOCK_KEY})
+            conn.commit()
+
+
+if __name__ == "__main__":
+    from backend.database.db_utils import get_db_engine
+    logging.basicConfig(level=logging.INFO)
+    run_migrations(get_db_engine())
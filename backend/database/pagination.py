@@ -0,0 +1,99 @@
+"""
+Paginación por keyset (cursor) para los listados de la API.
+
+En lugar de OFFSET/LIMIT (que recorre y descarta todas las filas anteriores,
+con un costo que crece con la profundidad), cada página continúa desde la
+última fila vista: WHERE (ts, id) < (:ts, :id) ORDER BY ts DESC, id DESC.
+Con un índice sobre (ts, id) el costo por página es constante.
+
+El cursor es opaco para el cliente: base64-url de un JSON [ts_iso, id].
+"""
+import os
+import json
+import base64
+from datetime import datetime, timedelta
+from typing import Optional, Tuple, List
+
+from sqlalchemy import text, bindparam
+
+DEFAULT_PAGE_SIZE = int(os.environ.get("API_PAGE_SIZE", 50))
+MAX_PAGE_SIZE = int(os.environ.get("API_MAX_PAGE_SIZE", 500))
+
+
+def clamp_limit(limit: Optional[int]) -> int:
+    if not limit or limit < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def encode_cursor(ts, row_id) -> str:
+    raw = json.dumps([ts.isoformat(), row_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, object]:
+    """
+    Raises:
+        ValueError: Cursor mal formado.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        ts, row_id = json.loads(raw)
+        return datetime.fromisoformat(ts), row_id
+    except Exception:
+        raise ValueError("Cursor de paginación inválido.")
+
+
+def fetch_keyset_page(conn, select_sql: str, ts_col: str, id_col: str = "id",
+                      where: Optional[List[str]] = None, params: Optional[dict] = None,
+                      limit: int = DEFAULT_PAGE_SIZE, after: Optional[tuple] = None,
+                      expanding: Tuple[str, ...] = ()):
+    """
+    Ejecuta 'select_sql' (sin WHERE/ORDER BY) paginado por (ts_col, id_col) descendente.
+    Ambas columnas deben estar en el SELECT con ese mismo nombre.
+
+    Args:
+        where: Condiciones adicionales (se combinan con AND).
+        after: (ts, id) decodificado del cursor recibido, o None para la primera página.
+        expanding: Parámetros lista usados como 'col IN :param' (portable, sin arrays).
+
+    Returns:
+        Tuple: (filas como dicts, next_cursor o None si no hay más)
+    """
+    where = list(where or [])
+    params = dict(params or {})
+    if after is not None:
+        where.append(f"({ts_col}, {id_col}) < (:_after_ts, :_after_id)")
+        params.update(_after_ts=after[0], _after_id=after[1])
+    sql = select_sql
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    # Una fila de más para saber si existe una página siguiente
+    sql += f" ORDER BY {ts_col} DESC, {id_col} DESC LIMIT :_limit"
+    params['_limit'] = limit + 1
+
+    stmt = text(sql).bindparams(*[bindparam(name, expanding=True) for name in expanding])
+    rows = [dict(r._mapping) for r in conn.execute(stmt, params)]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][ts_col], rows[-1][id_col])
+    return rows, next_cursor
+
+
+def date_range_conditions(ts_col: str, desde=None, hasta=None):
+    """
+    Filtro por rango de fechas (ambos extremos inclusive, a nivel de día) sobre una
+    columna TIMESTAMP, expresado como rango semiabierto para aprovechar el índice.
+
+    Returns:
+        Tuple: (lista de condiciones, parámetros)
+    """
+    where, params = [], {}
+    if desde is not None:
+        where.append(f"{ts_col} >= :_desde")
+        params['_desde'] = desde
+    if hasta is not None:
+        where.append(f"{ts_col} < :_hasta_excl")
+        params['_hasta_excl'] = hasta + timedelta(days=1)
+    return where, params
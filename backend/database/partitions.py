@@ -0,0 +1,215 @@
+"""
+Particionado mensual de ventas_detalle (PARTITION BY RANGE (fecha)).
+
+Una partición por mes: ventas_detalle_pYYYYMM = [YYYY-MM-01, mes siguiente).
+Las particiones se crean bajo demanda antes de cada carga (ensure_ventas_partitions)
+y por adelantado al arrancar (ensure_upcoming_partitions). Las consultas que
+filtran por fecha dejan que PostgreSQL descarte las particiones fuera de rango,
+y eliminar/archivar meses antiguos es un DETACH/DROP instantáneo.
+
+La caché de meses creados es por proceso: si otro proceso elimina un mes
+(--drop-before), la carga que falla por falta de partición refresca la caché
+desde pg_inherits y reintenta (ver save_ventas_file).
+"""
+import re
+import logging
+import threading
+from datetime import date
+from typing import Iterable, List, Optional
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "ventas_detalle"
+PARTITION_PREFIX = f"{PARENT_TABLE}_p"
+_PARTITION_NAME_RE = re.compile(rf"^{PARTITION_PREFIX}(\d{{4}})(\d{{2}})$")
+# Las particiones archivadas (DETACH) se renombran: el nombre del mes queda libre
+ARCHIVED_SUFFIX = "_archived"
+
+# Advisory lock (por transacción) para serializar la creación concurrente de particiones
+PARTITION_LOCK_KEY = 72_031_002
+
+# Caché por proceso de los meses con partición ya creada
+_known_months = set()
+_known_loaded = False
+_cache_lock = threading.Lock()
+
+
+def month_start(d) -> date:
+    return date(d.year, d.month, 1)
+
+
+def next_month(d: date) -> date:
+    return date(d.year + (d.month == 12), d.month % 12 + 1, 1)
+
+
+def add_months(d: date, n: int) -> date:
+    for _ in range(n):
+        d = next_month(d)
+    return d
+
+
+def partition_name(month: date) -> str:
+    return f"{PARTITION_PREFIX}{month:%Y%m}"
+
+
+def create_partition(conn, month: date):
+    """Crea (si no existe) la partición del mes. Las fechas son objetos date, no entrada de usuario."""
+    month = month_start(month)
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+    ))
+
+
+def list_partition_months(conn) -> List[date]:
+    rows = conn.execute(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:parent AS regclass)
+    """), {"parent": PARENT_TABLE}).fetchall()
+    months = []
+    for (name,) in rows:
+        m = _PARTITION_NAME_RE.match(name)
+        if m:
+            months.append(date(int(m.group(1)), int(m.group(2)), 1))
+    return sorted(months)
+
+
+def ensure_ventas_partitions(engine, months: Iterable) -> int:
+    """
+    Garantiza que existan las particiones de los meses indicados (fechas de
+    cualquier día del mes). Usa la caché por proceso para no tocar el catálogo
+    en el caso común y crea las faltantes en una transacción corta propia
+    (antes de la transacción de carga, para que un rollback no deje la caché
+    desincronizada). Devuelve cuántas particiones se crearon.
+    """
+    global _known_loaded
+    wanted = {month_start(m) for m in months}
+    with _cache_lock:
+        if not _known_loaded:
+            with engine.connect() as conn:
+                _known_months.update(list_partition_months(conn))
+            _known_loaded = True
+        missing = sorted(wanted - _known_months)
+    if not missing:
+        return 0
+
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": PARTITION_LOCK_KEY})
+        for month in missing:
+            create_partition(conn, month)
+    with _cache_lock:
+        _known_months.update(missing)
+    logger.info(f"Particiones creadas en {PARENT_TABLE}: {[partition_name(m) for m in missing]}")
+    return len(missing)
+
+
+def refresh_partition_cache(engine):
+    """Vuelve a leer de pg_inherits los meses con partición (otro proceso pudo eliminar alguno)."""
+    global _known_loaded
+    with engine.connect() as conn:
+        months = list_partition_months(conn)
+    with _cache_lock:
+        _known_months.clear()
+        _known_months.update(months)
+        _known_loaded = True
+
+
+def is_missing_partition_error(exc: Exception) -> bool:
+    """True si una inserción falló porque ninguna partición admite la fila."""
+    return "no partition of relation" in str(exc)
+
+
+def ensure_upcoming_partitions(engine, months_ahead: int = 3) -> int:
+    """Crea por adelantado las particiones del mes actual y los siguientes."""
+    current = month_start(date.today())
+    return ensure_ventas_partitions(engine, [add_months(current, i) for i in range(months_ahead + 1)])
+
+
+def drop_partitions_before(engine, cutoff, archive: bool = False) -> List[str]:
+    """
+    Elimina (o solo desacopla si archive=True) las particiones de los meses
+    anteriores al mes de 'cutoff'. Con archive=True la tabla del mes queda
+    como tabla independiente <partición>_archived (p.ej. para pg_dump) y deja
+    de consultarse; el mes puede volver a crearse si llegan ventas suyas.
+    En la misma transacción se borran esos días de 'ventas_diarias', para que
+    /history y las alertas no sigan sumando ventas que ya no están en el detalle.
+
+    Returns:
+        list[str]: Nombres de las particiones afectadas.
+    """
+    cutoff = month_start(cutoff)
+    affected = []
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": PARTITION_LOCK_KEY})
+        for month in list_partition_months(conn):
+            if month >= cutoff:
+                continue
+            name = partition_name(month)
+            conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+            if archive:
+                conn.execute(text(f"ALTER TABLE {name} RENAME TO {name}{ARCHIVED_SUFFIX}"))
+            else:
+                conn.execute(text(f"DROP TABLE {name}"))
+            affected.append(name)
+        if affected:
+            conn.execute(text("DELETE FROM ventas_diarias WHERE fecha < :cutoff"), {"cutoff": cutoff})
+    if affected:
+        # Import diferido: db_utils importa este módulo
+        from backend.database.db_utils import bump_data_versions
+        bump_data_versions("ventas", engine=engine)  # Invalida los ETag de /history
+    with _cache_lock:
+        _known_months.difference_update(
+            {date(int(n[-6:-2]), int(n[-2:]), 1) for n in affected}
+        )
+    logger.info(f"Particiones {'archivadas' if archive else 'eliminadas'} antes de {cutoff}: {affected}")
+    return affected
+
+
+def is_partitioned(conn) -> bool:
+    relkind = conn.execute(text(
+        "SELECT relkind FROM pg_class WHERE oid = to_regclass(:t)"
+    ), {"t": PARENT_TABLE}).scalar()
+    return relkind == 'p'
+
+
+def months_between(first: Optional[date], last: Optional[date]) -> List[date]:
+    if first is None or last is None:
+        return []
+    months, m = [], month_start(first)
+    while m <= month_start(last):
+        months.append(m)
+        m = next_month(m)
+    return months
+
+
+if __name__ == "__main__":
+    import sys
+    import argparse
+    from datetime import datetime
+    from backend.database.db_utils import get_db_engine
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Gestión de particiones mensuales de ventas_detalle.")
+    parser.add_argument("--list", action="store_true", help="Lista los meses particionados.")
+    parser.add_argument("--ahead", type=int, default=None, help="Crea las particiones de los próximos N meses.")
+    parser.add_argument("--drop-before", metavar="YYYY-MM", help="Elimina las particiones anteriores a ese mes.")
+    parser.add_argument("--archive", action="store_true", help="Con --drop-before: solo DETACH, conserva las tablas.")
+    args = parser.parse_args()
+
+    engine = get_db_engine()
+    if engine is None:
+        print("Error: No se pudo conectar a la base de datos.")
+        sys.exit(1)
+
+    if args.ahead is not None:
+        ensure_upcoming_partitions(engine, args.ahead)
+    if args.drop_before:
+        drop_partitions_before(engine, datetime.strptime(args.drop_before, "%Y-%m").date(), archive=args.archive)
+    if args.list:
+        with engine.connect() as conn:
+            for month in list_partition_months(conn):
+                print(partition_name(month))
@@ -0,0 +1,128 @@
+"""
+Telemetría del pool de conexiones a la base de datos.
+
+Mide la latencia de checkout (lo que espera el código por una conexión:
+cola del pool + handshake TCP/auth si hay que abrir una nueva), la
+ocupación del pool y el churn de conexiones físicas (aperturas, cierres,
+invalidaciones). Expuesto vía GET /api/v1/internal/db_pool.
+"""
+import time
+import threading
+from collections import deque
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool, NullPool
+
+# Ventana de muestras recientes para los percentiles de latencia de checkout
+LATENCY_WINDOW = 1024
+
+
+class PoolStats:
+    """Contadores thread-safe alimentados por los eventos del pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.checkouts = 0
+        self.checkins = 0
+        self.checkout_errors = 0
+        self.connects = 0          # conexiones físicas abiertas
+        self.closes = 0            # conexiones físicas cerradas
+        self.invalidations = 0
+        self.checkout_ms_total = 0.0
+        self.checkout_ms_max = 0.0
+        self._recent_ms = deque(maxlen=LATENCY_WINDOW)
+
+    def record_checkout(self, elapsed_ms: float, ok: bool = True):
+        with self._lock:
+            if not ok:
+                self.checkout_errors += 1
+                return
+            self.checkouts += 1
+            self.checkout_ms_total += elapsed_ms
+            self.checkout_ms_max = max(self.checkout_ms_max, elapsed_ms)
+            self._recent_ms.append(elapsed_ms)
+
+    def incr(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            recent = sorted(self._recent_ms)
+            checkouts = self.checkouts
+            data = {
+                "uptime_s": round(time.time() - self.started_at, 1),
+                "checkouts": checkouts,
+                "checkins": self.checkins,
+                "checkout_errors": self.checkout_errors,
+                "connections_opened": self.connects,
+                "connections_closed": self.closes,
+                "invalidations": self.invalidations,
+                # Churn: conexiones físicas abiertas por checkout (NullPool ~ 1.0, pool sano ~ 0)
+                "churn_ratio": round(self.connects / checkouts, 4) if checkouts else 0.0,
+                "checkout_ms": {
+                    "avg": round(self.checkout_ms_total / checkouts, 3) if checkouts else 0.0,
+                    "max": round(self.checkout_ms_max, 3),
+                    "p50": round(_percentile(recent, 0.50), 3),
+                    "p95": round(_percentile(recent, 0.95), 3),
+                    "p99": round(_percentile(recent, 0.99), 3),
+                },
+            }
+        return data
+
+
+def _percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+pool_stats = PoolStats()
+
+
+class _TimedCheckoutMixin:
+    """Mide cuánto tarda Pool.connect(): espera en la cola + apertura física si aplica."""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            conn = super().connect()
+        except Exception:
+            pool_stats.record_checkout(0.0, ok=False)
+            raise
+        pool_stats.record_checkout((time.perf_counter() - start) * 1000.0)
+        return conn
+
+
+class InstrumentedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class InstrumentedNullPool(_TimedCheckoutMixin, NullPool):
+    pass
+
+
+def attach_pool_listeners(engine):
+    """Registra los eventos de pool que alimentan los contadores de churn."""
+    event.listen(engine, "connect", lambda dbapi_conn, rec: pool_stats.incr("connects"))
+    event.listen(engine, "close", lambda dbapi_conn, rec: pool_stats.incr("closes"))
+    event.listen(engine, "invalidate", lambda dbapi_conn, rec, exc: pool_stats.incr("invalidations"))
+    event.listen(engine, "checkin", lambda dbapi_conn, rec: pool_stats.incr("checkins"))
+
+
+def pool_occupancy(engine) -> dict:
+    """Ocupación instantánea del pool (solo QueuePool expone tamaños)."""
+    pool = engine.pool
+    data = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        data.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "max_overflow": pool._max_overflow,
+            "timeout_s": pool.timeout(),
+        })
+    return data
@@ -6,6 +6,7 @@ import logging
 from tensorflow.keras.models import load_model
 import tensorflow as tf
 import xgboost as xgb # --- NUEVO: Importar XGBoost
+from backend.telemetry import MODEL_INFERENCE_SECONDS
 
 # --- 1. Constantes y Carga de Artefactos ---
 
@@ -20,6 +21,22 @@ XGB_MODEL_PATH = os.path.join(MODELS_DIR, "xgboost_model.joblib") # --- NUEVO: R
 # Caché global para mantener los artefactos en memoria
 # Usamos un diccionario para poder verificar si está vacío o no.
 artifacts_cache = {}
+# Firma de los archivos de models/ que se cargaron (None si la última carga falló)
+loaded_signature = None
+
+def artifacts_signature():
+    """
+    Firma (mtime, tamaño) de los artefactos en disco: cambia cuando un
+    entrenamiento, de este u otro proceso, los reescribe en models/.
+    """
+    firma = []
+    for path in (ENCODER_PATH, SCALER_PATH, XGB_MODEL_PATH, MLP_MODEL_PATH):
+        try:
+            st = os.stat(path)
+            firma.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            firma.append(None)
+    return tuple(firma)
 
 def load_artifacts_into_memory():
     """
@@ -29,9 +46,11 @@ def load_artifacts_into_memory():
     Returns:
         bool: True si la carga fue exitosa, False si falló.
     """
-    global artifacts_cache # Indicar que estamos modificando la variable global
+    global artifacts_cache, loaded_signature # Indicar que estamos modificando la variable global
     
     artifacts_temp = {} # Diccionario temporal
+    # Antes de leer: si el disco cambia durante la carga, la próxima comprobación recarga
+    firma = artifacts_signature()
     try:
         # Limpiar logs de TensorFlow antes de cargar el modelo
         os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
@@ -62,15 +81,18 @@ def load_artifacts_into_memory():
         logging.info("Artefactos de ML (Encoder, Scaler, MLP, XGBoost) cargados/recargados con éxito.")
         
         artifacts_cache = artifacts_temp
+        loaded_signature = firma
         return True
 
     except FileNotFoundError as e:
         logging.error(f"Error crítico al cargar artefactos: {e}. Asegúrate de ejecutar el pipeline de entrenamiento.")
         artifacts_cache = {} # Limpiar caché en caso de fallo
+        loaded_signature = None
         return False
     except Exception as e:
         logging.error(f"Error inesperado al cargar artefactos: {e}", exc_info=True)
         artifacts_cache = {}
+        loaded_signature = None
         return False
 
 def reload_artifacts():
@@ -81,6 +103,15 @@ def reload_artifacts():
     logging.info("Solicitud de recarga de artefactos recibida...")
     return load_artifacts_into_memory()
 
+def reload_if_changed():
+    """
+    Recarga los artefactos solo si los de models/ difieren de los cargados
+    (el proceso que entrenó ya los recargó). Retorna True si quedan al día.
+    """
+    if loaded_signature is not None and artifacts_signature() == loaded_signature:
+        return True
+    return reload_artifacts()
+
 # --- Carga inicial de artefactos ---
 # Se ejecuta UNA SOLA VEZ cuando el backend (app.py) importa este archivo.
 if not load_artifacts_into_memory():
@@ -168,7 +199,8 @@ def make_single_prediction(id_producto, fecha_str):
         if model_mlp:
             try:
                 # Keras/MLP devuelve una matriz [[valor]], extraemos el float
-                pred_mlp = model_mlp.predict(df_scaled, verbose=0)[0][0]
+                with MODEL_INFERENCE_SECONDS.time(model="mlp", mode="single"):
+                    pred_mlp = model_mlp.predict(df_scaled, verbose=0)[0][0]
                 preds.append(pred_mlp)
             except Exception as e:
                 logging.error(f"Error prediciendo con MLP: {e}")
@@ -177,7 +209,8 @@ def make_single_prediction(id_producto, fecha_str):
         if model_xgb:
             try:
                 # XGBoost devuelve un array [valor], extraemos el float
-                pred_xgb = model_xgb.predict(df_scaled)[0]
+                with MODEL_INFERENCE_SECONDS.time(model="xgboost", mode="single"):
+                    pred_xgb = model_xgb.predict(df_scaled)[0]
                 preds.append(pred_xgb)
             except Exception as e:
                 logging.error(f"Error prediciendo con XGBoost: {e}")
@@ -202,6 +235,72 @@ def make_single_prediction(id_producto, fecha_str):
         logging.error(f"Error inesperado durante la predicción: {e}", exc_info=True)
         return None
 
+def make_batch_predictions(ids_producto, fechas):
+    """
+    Versión vectorizada de make_single_prediction para N pares (producto, fecha):
+    un solo scaler.transform y un solo predict por modelo para todo el lote.
+
+    Args:
+        ids_producto: Secuencia de SKUs.
+        fechas: Secuencia de fechas (str YYYY-MM-DD, date o Timestamp), misma longitud.
+
+    Returns:
+        np.ndarray | None: Predicción entera (techo, >= 0) por par; NaN para
+        productos desconocidos. None si no hay artefactos cargados.
+    """
+    if not artifacts_cache:
+        logging.error("Artefactos no están cargados en memoria. Abortando predicción.")
+        return None
+
+    encoder = artifacts_cache.get('encoder')
+    scaler = artifacts_cache.get('scaler')
+    model_mlp = artifacts_cache.get('mlp')
+    model_xgb = artifacts_cache.get('xgboost')
+    if not encoder or not scaler or (not model_mlp and not model_xgb):
+        logging.error("Faltan artefactos esenciales (encoder, scaler o modelos) en la caché. Abortando predicción.")
+        return None
+
+    ids = pd.Series(ids_producto, dtype=str).reset_index(drop=True)
+    fechas = pd.to_datetime(pd.Series(fechas)).reset_index(drop=True)
+    result = np.full(len(ids), np.nan)
+
+    known = ids.isin(encoder.classes_).to_numpy()
+    if not known.any():
+        return result
+
+    fechas_known = fechas[known]
+    # Mismos nombres y orden de columnas que en training.py
+    df_pred = pd.DataFrame({
+        'id_producto_encoded': encoder.transform(ids[known]),
+        'mes': fechas_known.dt.month.to_numpy(),
+        'anio': fechas_known.dt.year.to_numpy(),
+        'dia_semana': fechas_known.dt.dayofweek.to_numpy(),
+        'dia': fechas_known.dt.day.to_numpy(),
+    }, columns=['id_producto_encoded', 'mes', 'anio', 'dia_semana', 'dia'])
+    df_scaled = scaler.transform(df_pred)
+
+    preds = []
+    if model_mlp:
+        try:
+            with MODEL_INFERENCE_SECONDS.time(model="mlp", mode="batch"):
+                preds.append(model_mlp.predict(df_scaled, verbose=0, batch_size=4096).reshape(-1))
+        except Exception as e:
+            logging.error(f"Error prediciendo lote con MLP: {e}")
+    if model_xgb:
+        try:
+            with MODEL_INFERENCE_SECONDS.time(model="xgboost", mode="batch"):
+                preds.append(np.asarray(model_xgb.predict(df_scaled)).reshape(-1))
+        except Exception as e:
+            logging.error(f"Error prediciendo lote con XGBoost: {e}")
+    if not preds:
+        logging.error("Falló la predicción por lotes: no se pudo obtener resultado de ningún modelo.")
+        return None
+
+    # Ensamble, no negativo y techo (mismo criterio conservador que la predicción unitaria)
+    result[known] = np.ceil(np.maximum(np.mean(preds, axis=0), 0))
+    logging.info(f"Predicción por lotes: {int(known.sum())} pares predichos, {int((~known).sum())} con producto desconocido.")
+    return result
+
 # --- Bloque de prueba (Opcional) ---
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
@@ -23,8 +23,10 @@ def clean_data(df):
     """
     Realiza la limpieza básica para los datos de 'ventas_detalle'.
     - Asegura que la fecha sea datetime.
-    - Elimina duplicados.
     - Asegura que cantidad_vendida sea positiva.
+    Los duplicados ya no se eliminan aquí: la ingesta los descarta con el
+    índice único 'fingerprint' de ventas_detalle (las filas anteriores a la
+    huella la reciben en la migración v12).
     """
     try:
         # Intenta convertir la columna 'fecha', maneja diferentes formatos si es necesario
@@ -40,7 +42,6 @@ def clean_data(df):
         # Considerar lanzar un error más específico o devolver df vacío
         raise ValueError("Error procesando las fechas en la base de datos.") from e
 
-    df = df.drop_duplicates()
     # Asegura que cantidad_vendida sea numérico, maneja errores y nulos, luego convierte a int
     df['cantidad_vendida'] = pd.to_numeric(df['cantidad_vendida'], errors='coerce').fillna(0).astype(int)
     # Mantener solo ventas positivas
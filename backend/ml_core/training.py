@@ -15,7 +15,11 @@ from tensorflow.keras.optimizers import Adam
 from tensorflow.keras.callbacks import EarlyStopping
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import MinMaxScaler, LabelEncoder
-from backend.database.db_utils import get_db_engine, save_model_metric, get_approved_files
+from sqlalchemy import text, bindparam
+from backend.database.db_utils import get_db_engine, save_model_metric, get_approved_files, mark_files_invalid
+from backend.database.dialects import get_dialect
+from backend.telemetry import TRAINING_STAGE_SECONDS
+import time
 import json # Útil para logs estructurados
 
 # --- Constantes (Revertidas a MVP) ---
@@ -29,61 +33,70 @@ ENCODER_PATH = os.path.join(MODELS_DIR, "label_encoder_producto.joblib")
 def load_data_from_db():
     """
     Carga datos frescos desde la BD para re-entrenamiento (HU-006).
-    IMPORTANTE: Solo usa datos de archivos con estado 'aprobado' en archivos_cargados.
+    IMPORTANTE: Solo usa filas de archivos con estado 'aprobado' en archivos_cargados,
+    seleccionadas por su archivo_id (linaje escrito en la ingesta, con índice).
     Los archivos 'valido' (no aprobados) son ignorados.
+    Los aprobados sin filas vinculadas (cargados antes de registrar archivo_id)
+    pasan a 'invalido' con su motivo y no cuentan como usados. Una fila repetida
+    en varios archivos pertenece al primero que la cargó (ver add_row_fingerprints):
+    entra solo si ese archivo está aprobado.
+
+    Returns:
+        Tuple: (DataFrame, lista de ids de archivos aprobados leídos)
     """
     engine = get_db_engine()
     if not engine:
         logging.error("No se pudo conectar a la BD.")
-        return pd.DataFrame()
+        return pd.DataFrame(), []
 
     # Verificar que existan archivos aprobados
     approved = get_approved_files(engine)
     if not approved:
         logging.warning("No hay archivos 'aprobados' en archivos_cargados. El reentrenamiento necesita que el usuario apruebe archivos en la vista Ingesta de Datos.")
-        return pd.DataFrame()
+        return pd.DataFrame(), []
 
+    approved_ids = [f['id'] for f in approved]
     approved_names = [f['nombre_archivo'] for f in approved]
     logging.info(f"Archivos aprobados para entrenamiento ({len(approved_names)}): {approved_names}")
 
-    # Consulta optimizada: solo columnas necesarias de ventas_detalle
-    # (los datos ya fueron ingresados al momento de la carga, filtramos por archivos aprobados
-    # usando una subconsulta contra archivos_cargados)
-    query = """
-        SELECT vd.id_producto, vd.fecha, vd.cantidad_vendida
+    # Cotas de fecha de los archivos aprobados: permiten a PostgreSQL podar las
+    # particiones mensuales de ventas_detalle que no contienen ninguno de ellos.
+    fechas_min = [f['fecha_min'] for f in approved if f.get('fecha_min')]
+    fechas_max = [f['fecha_max'] for f in approved if f.get('fecha_max')]
+    params = {"ids": approved_ids}
+    rango_fechas = ""
+    # Archivos anteriores al registro de fecha_min/fecha_max: sin cota (se leen todas las particiones)
+    if len(fechas_min) == len(approved) and len(fechas_max) == len(approved):
+        params["desde"], params["hasta"] = min(fechas_min), max(fechas_max)
+        dialect = get_dialect(engine)
+        rango_fechas = f"AND vd.fecha BETWEEN {dialect.date_param('desde')} AND {dialect.date_param('hasta')}"
+
+    # Consulta por índice: solo columnas necesarias de las filas de los archivos aprobados
+    query = text(f"""
+        SELECT vd.archivo_id, vd.id_producto, vd.fecha, vd.cantidad_vendida
         FROM ventas_detalle vd
-        WHERE EXISTS (
-            SELECT 1 FROM archivos_cargados ac
-            WHERE ac.estado = 'aprobado'
-              AND ac.nombre_archivo = vd.source_file
-        )
+        WHERE vd.archivo_id IN :ids
+          {rango_fechas}
         ORDER BY vd.fecha ASC
-    """
+    """).bindparams(bindparam("ids", expanding=True))
     try:
-        df = pd.read_sql(query, engine)
-        if df.empty:
-            # Fallback: ventas_detalle no tiene columna source_file todavía.
-            # Usamos todos los datos de los archivos aprobados (comportamiento transitorio).
-            logging.warning("No se pudo filtrar por source_file (columna no existe aún). "
-                           "Usando TODOS los datos de ventas_detalle como fallback temporal.")
-            df = pd.read_sql(
-                "SELECT id_producto, fecha, cantidad_vendida FROM ventas_detalle ORDER BY fecha ASC",
-                engine
-            )
-        logging.info(f"Datos cargados de BD: {len(df)} registros.")
-        return df
+        df = pd.read_sql(query, engine, params=params)
     except Exception as e:
-        logging.warning(f"Consulta con filtro falló ({e}), usando fallback sin filtro.")
-        try:
-            df = pd.read_sql(
-                "SELECT id_producto, fecha, cantidad_vendida FROM ventas_detalle ORDER BY fecha ASC",
-                engine
-            )
-            logging.info(f"Datos cargados de BD (fallback): {len(df)} registros.")
-            return df
-        except Exception as e2:
-            logging.error(f"Error SQL al cargar datos: {e2}")
-            return pd.DataFrame()
+        logging.error(f"Error SQL al cargar datos: {e}")
+        return pd.DataFrame(), []
+
+    # Un archivo con filas_guardadas = 0 (todas duplicadas) no aporta filas pero sí se consume
+    linked = set(df['archivo_id'].unique()) | {f['id'] for f in approved if not f.get('filas_guardadas')}
+    sin_filas = [i for i in approved_ids if i not in linked]
+    if sin_filas:
+        # Si se devolvieran como usados quedarían 'aprobado' para siempre y cada
+        # aprobación volvería a disparar un entrenamiento sin sus datos
+        logging.warning(f"Archivos aprobados sin filas vinculadas en ventas_detalle: {sin_filas}. "
+                        "Se marcan 'invalido' y no entran al entrenamiento.")
+        mark_files_invalid(sin_filas, "Sin filas vinculadas en ventas_detalle (cargado antes del linaje "
+                                      "por archivo_id): no se usa en el entrenamiento.", engine)
+    logging.info(f"Datos cargados de BD: {len(df)} registros.")
+    return df.drop(columns=['archivo_id']), [i for i in approved_ids if i in linked]
 
 def preprocess_for_training(df):
     """
@@ -230,14 +243,16 @@ def train_and_evaluate():
     logging.info("--- INICIANDO PIPELINE DE ENTRENAMIENTO (lógica MVP) ---")
 
     # 1. Cargar Datos (Desde BD)
-    df = load_data_from_db()
+    with TRAINING_STAGE_SECONDS.time(stage="load_data"):
+        df, archivos_usados = load_data_from_db()
     if df.empty:
-        return {"status": "error", "message": "La base de datos está vacía o no se pudo leer."}
+        return {"status": "error", "message": "No hay datos de archivos aprobados o no se pudo leer la base de datos."}
 
     # 2. Preprocesar y OBTENER transformadores (Para guardarlos)
     try:
         # Desempaquetamos los 6 valores que devuelve la nueva función
-        X_train, X_test, y_train, y_test, label_encoder, scaler = preprocess_for_training(df)
+        with TRAINING_STAGE_SECONDS.time(stage="preprocess"):
+            X_train, X_test, y_train, y_test, label_encoder, scaler = preprocess_for_training(df)
     except Exception as e:
         return {"status": "error", "message": f"Error en preprocesamiento: {e}"}
 
@@ -248,12 +263,14 @@ def train_and_evaluate():
         return {"status": "error", "message": error_msg}
 
     # 2. Entrenar XGBoost (T1)
-    model_xgb = train_xgboost(X_train, y_train)
+    with TRAINING_STAGE_SECONDS.time(stage="train_xgboost"):
+        model_xgb = train_xgboost(X_train, y_train)
     if model_xgb is None:
         logging.warning("Fallo el entrenamiento de XGBoost. No se guardará este modelo.")
 
     # X_train ya es numpy array, y_train es Series (tiene .values)
-    model_mlp = train_mlp(X_train, y_train.values)
+    with TRAINING_STAGE_SECONDS.time(stage="train_mlp"):
+        model_mlp = train_mlp(X_train, y_train.values)
     if model_mlp is None:
          logging.warning("Fallo el entrenamiento del MLP. No se guardará este modelo.")
     
@@ -265,6 +282,7 @@ def train_and_evaluate():
 
 
     logging.info("\n--- EVALUACIÓN DE MODELOS (MVP) EN DATOS DE PRUEBA ---")
+    inicio_evaluacion = time.perf_counter()
 
     # --- CAMBIO: Capturar métricas y estado ---
     all_metrics = [] # Lista para guardar los diccionarios de métricas
@@ -310,6 +328,8 @@ def train_and_evaluate():
         # Si solo hay MLP, ese es el final
         final_metrics_to_save = metrics_mlp
 
+    TRAINING_STAGE_SECONDS.observe(time.perf_counter() - inicio_evaluacion, stage="evaluate")
+
     # --- GUARDAR EN BD (HU-011) ---
     if final_metrics_to_save:
         try:
@@ -323,6 +343,7 @@ def train_and_evaluate():
 
     # 6. Guardar (T4)
     logging.info("\nGuardando modelos MVP entrenados (si el entrenamiento fue exitoso)...")
+    inicio_guardado = time.perf_counter()
 
     save_status = [] # Lista para guardar el estado del guardado
 
@@ -375,6 +396,7 @@ def train_and_evaluate():
     # ------------------------------------------------------
 
 
+    TRAINING_STAGE_SECONDS.observe(time.perf_counter() - inicio_guardado, stage="save")
     logging.info("--- PIPELINE DE ENTRENAMIENTO (MVP) COMPLETADO ---")
     
     # --- CAMBIO: Devolver el reporte final ---
@@ -382,7 +404,8 @@ def train_and_evaluate():
         "status": "success",
         "message": "Entrenamiento completado.",
         "save_status": save_status,
-        "metrics": all_metrics
+        "metrics": all_metrics,
+        "archivos_usados": archivos_usados
     }
 
 # --- Bloque de prueba (Modificado para imprimir el JSON) ---
@@ -2,52 +2,56 @@ import logging
 import datetime
 import pandas as pd
 from sqlalchemy import text
-from backend.database.db_utils import get_db_engine, insert_or_update_alert
-from backend.ml_core.predict import make_single_prediction
+from backend.database.db_utils import get_db_engine, bulk_upsert_alerts
+from backend.ml_core.predict import make_batch_predictions
 from backend.services.email_service import send_alerts_summary
 import os
 
 logger = logging.getLogger(__name__)
 
-def get_active_skus_with_mock_stock(engine):
+# Ventana de historial para el promedio de ventas (sobre el agregado ventas_diarias).
+ALERT_HISTORY_DAYS = int(os.environ.get("ALERT_HISTORY_DAYS", 180))
+
+def get_skus_with_stock(engine):
     """
-    Obtiene los SKUs activos de ventas_detalle.
-    Como no hay tabla de inventario real, mockea el stock actual y el de seguridad.
-    También obtiene el promedio histórico de ventas diarias.
+    Obtiene, en una sola consulta, cada SKU de 'inventario' con su stock real,
+    su promedio de ventas en los últimos ALERT_HISTORY_DAYS días (ventas_diarias)
+    y su configuración de alertas activa, si existe.
+
+    Returns:
+        pd.DataFrame: sku, stock_actual, stock_seguridad, promedio_historico,
+        umbral_minimo, umbral_sobreabastecimiento, email_notificacion
+        (vacío si no hay inventario o hubo error).
     """
-    if engine is None: return []
-    
-    # Obtenemos SKUs distintos y su promedio de ventas histórico
+    if engine is None: return pd.DataFrame()
+
+    # SUM(unidades)/SUM(lineas) = AVG(cantidad_vendida) del detalle, sin leerlo
     query = text("""
-        SELECT id_producto, AVG(cantidad_vendida) as prom_ventas
-        FROM ventas_detalle
-        GROUP BY id_producto
+        SELECT i.id_producto AS sku,
+               i.stock_actual,
+               i.stock_seguridad,
+               COALESCE(v.prom_ventas, 0) AS promedio_historico,
+               c.umbral_minimo,
+               c.umbral_sobreabastecimiento,
+               c.email_notificacion
+        FROM inventario i
+        LEFT JOIN (
+            SELECT id_producto, CAST(SUM(unidades) AS DOUBLE PRECISION) / NULLIF(SUM(lineas), 0) AS prom_ventas
+            FROM ventas_diarias
+            WHERE fecha >= :desde
+            GROUP BY id_producto
+        ) v ON v.id_producto = i.id_producto
+        LEFT JOIN alert_configurations c
+               ON c.producto_id = i.id_producto AND c.is_active
     """)
+    desde = datetime.date.today() - datetime.timedelta(days=ALERT_HISTORY_DAYS)
     try:
         with engine.connect() as conn:
-            result = conn.execute(query)
-            skus_data = []
-            for row in result:
-                # Mockeando datos de inventario
-                promedio = float(row[1]) if row[1] is not None else 10.0
-                
-                # Para que se generen algunas alertas de quiebre y otras de sobrestock,
-                # usamos un stock basado en el promedio.
-                import random
-                mock_stock = int(promedio * random.choice([0.5, 2.0, 50.0])) # Algunos muy bajos, otros normales, otros muy altos
-                
-                skus_data.append({
-                    "sku": str(row[0]),
-                    "stock_actual": mock_stock,
-                    "stock_seguridad": int(promedio * 0.5), # Stock de seguridad del 50% de la venta promedio
-                    "promedio_historico": promedio
-                })
-            return skus_data
+            return pd.read_sql(query, conn, params={"desde": desde})
     except Exception as e:
-        logger.error(f"Error obteniendo SKUs activos: {e}")
-        return []
+        logger.error(f"Error obteniendo stock de inventario: {e}")
+        return pd.DataFrame()
 
-from backend.database.db_utils import get_alert_configs
 import numpy as np
 
 class AlertEvaluator:
@@ -59,80 +63,64 @@ class AlertEvaluator:
         self.engine = engine
 
     def evaluate(self):
-        skus_data = get_active_skus_with_mock_stock(self.engine)
-        if not skus_data:
-            logger.warning("No se encontraron SKUs activos para analizar.")
+        df_merged = get_skus_with_stock(self.engine)
+        if df_merged.empty:
+            logger.warning("No se encontraron SKUs en inventario para analizar.")
             return []
 
-        # Obtener configuraciones personalizadas
-        configs = get_alert_configs(self.engine, limit=100000)
-        df_configs = pd.DataFrame(configs) if configs else pd.DataFrame(columns=['producto_id', 'umbral_minimo', 'umbral_sobreabastecimiento', 'email_notificacion', 'is_active'])
-        if not df_configs.empty:
-            df_configs = df_configs[df_configs['is_active'] == True]
-
-        # Limitar para no tardar demasiado si hay miles de SKUs (para MVP y rapidez)
-        df_skus = pd.DataFrame(skus_data[:50])
-
-        # Join con configuraciones
-        if not df_configs.empty:
-            df_merged = df_skus.merge(df_configs, left_on='sku', right_on='producto_id', how='left')
-        else:
-            df_merged = df_skus.copy()
-            df_merged['umbral_minimo'] = np.nan
-            df_merged['umbral_sobreabastecimiento'] = np.nan
-            df_merged['email_notificacion'] = None
-
         # Rellenar con defaults si no hay config
         df_merged['umbral_minimo'] = df_merged['umbral_minimo'].fillna(df_merged['stock_seguridad']).astype(int)
         df_merged['umbral_sobreabastecimiento'] = df_merged['umbral_sobreabastecimiento'].fillna(df_merged['promedio_historico'] * 30).astype(int)
 
         hoy = datetime.date.today()
-        demanda_48h_list = []
-        
-        # Obtener predicciones
-        for sku in df_merged['sku']:
-            d48 = 0
-            for d in range(1, 3):
-                fecha_proy = hoy + datetime.timedelta(days=d)
-                pred = make_single_prediction(sku, fecha_proy.strftime("%Y-%m-%d"))
-                d48 += pred if pred is not None else 0
-            demanda_48h_list.append(d48)
-
-        df_merged['demanda_48h'] = demanda_48h_list
+
+        # Demanda de las próximas 48h: un solo lote de predicciones (SKU x [hoy+1, hoy+2])
+        horizonte = [hoy + datetime.timedelta(days=d) for d in range(1, 3)]
+        skus = df_merged['sku'].to_numpy()
+        preds = make_batch_predictions(np.repeat(skus, len(horizonte)), np.tile(horizonte, len(skus)))
+        if preds is None:
+            preds = np.zeros(len(skus) * len(horizonte))
+        # Producto desconocido -> 0, como en la predicción unitaria
+        df_merged['demanda_48h'] = np.nan_to_num(preds).reshape(len(skus), len(horizonte)).sum(axis=1).astype(int)
         df_merged['stock_proyectado'] = df_merged['stock_actual'] - df_merged['demanda_48h']
 
         # Vectorización estricta para evaluación de umbrales
         mask_quiebre = df_merged['stock_proyectado'] <= df_merged['umbral_minimo']
-        mask_sobrestock = df_merged['stock_actual'] > df_merged['umbral_sobreabastecimiento']
-
-        alertas_generadas = []
-
-        # Iterar solo sobre los casos positivos
-        for _, row in df_merged[mask_quiebre].iterrows():
-            email_notif = row.get('email_notificacion')
-            if pd.isna(email_notif): email_notif = None
-            
-            mensaje = f"Riesgo de quiebre. Stock: {row['stock_actual']}. Demanda esperada: {row['demanda_48h']}. Proyectado: {row['stock_proyectado']}. Umbral: {row['umbral_minimo']}."
-            fecha_str = (hoy + datetime.timedelta(days=2)).strftime("%Y-%m-%d")
-            insert_or_update_alert(row['sku'], 'QUIEBRE', mensaje, fecha_str, self.engine)
-            alertas_generadas.append({
-                "sku": row['sku'], "tipo": "QUIEBRE", "mensaje": mensaje, 
-                "fecha_proyeccion": fecha_str, "email_notificacion": email_notif
-            })
-
-        for _, row in df_merged[mask_sobrestock & ~mask_quiebre].iterrows():
-            email_notif = row.get('email_notificacion')
-            if pd.isna(email_notif): email_notif = None
-            
-            mensaje = f"Sobrestock detectado. Stock: {row['stock_actual']}. Demanda esperada: {row['demanda_48h']}. Proyectado: {row['stock_proyectado']}. Umbral máximo: {row['umbral_sobreabastecimiento']}."
-            fecha_str = hoy.strftime("%Y-%m-%d")
-            insert_or_update_alert(row['sku'], 'SOBRESTOCK', mensaje, fecha_str, self.engine)
-            alertas_generadas.append({
-                "sku": row['sku'], "tipo": "SOBRESTOCK", "mensaje": mensaje, 
-                "fecha_proyeccion": fecha_str, "email_notificacion": email_notif
-            })
-
-        return alertas_generadas
+        mask_sobrestock = (df_merged['stock_actual'] > df_merged['umbral_sobreabastecimiento']) & ~mask_quiebre
+
+        stock = df_merged['stock_actual'].astype(str)
+        demanda = df_merged['demanda_48h'].astype(str)
+        proyectado = df_merged['stock_proyectado'].astype(str)
+
+        quiebres = pd.DataFrame({
+            'sku': df_merged['sku'],
+            'tipo_alerta': 'QUIEBRE',
+            'mensaje': "Riesgo de quiebre. Stock: " + stock + ". Demanda esperada: " + demanda
+                       + ". Proyectado: " + proyectado + ". Umbral: " + df_merged['umbral_minimo'].astype(str) + ".",
+            'fecha_proyeccion': (hoy + datetime.timedelta(days=2)).strftime("%Y-%m-%d"),
+            'email_notificacion': df_merged['email_notificacion'],
+        })[mask_quiebre]
+        sobrestocks = pd.DataFrame({
+            'sku': df_merged['sku'],
+            'tipo_alerta': 'SOBRESTOCK',
+            'mensaje': "Sobrestock detectado. Stock: " + stock + ". Demanda esperada: " + demanda
+                       + ". Proyectado: " + proyectado + ". Umbral máximo: "
+                       + df_merged['umbral_sobreabastecimiento'].astype(str) + ".",
+            'fecha_proyeccion': hoy.strftime("%Y-%m-%d"),
+            'email_notificacion': df_merged['email_notificacion'],
+        })[mask_sobrestock]
+
+        df_alertas = pd.concat([quiebres, sobrestocks], ignore_index=True)
+        if df_alertas.empty:
+            return []
+
+        # Una sola sentencia para todo el lote (INSERT ... ON CONFLICT sobre pendientes)
+        bulk_upsert_alerts(df_alertas, self.engine)
+
+        df_alertas['email_notificacion'] = df_alertas['email_notificacion'].astype(object).where(
+            df_alertas['email_notificacion'].notna(), None
+        )
+        return df_alertas.rename(columns={'tipo_alerta': 'tipo'}).to_dict('records')
 
 def run_daily_alert_analysis():
     """
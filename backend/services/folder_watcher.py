@@ -0,0 +1,221 @@
+"""
+Daemon de ingesta por carpeta (watch-folder).
+
+Vigila la carpeta de entrada donde el ERP deja sus exportes nocturnos y los
+ingesta a medida que llegan, sin pasar por el navegador:
+
+    data_fuente/entrada     -> el ERP deposita aquí los archivos
+    data_fuente/en_proceso  -> archivo reclamado por un worker (rename atómico)
+    data_fuente/procesados  -> ingesta exitosa (o contenido ya cargado antes)
+    data_fuente/fallidos    -> archivo inválido o error de ingesta
+
+Uso:
+    python -m backend.services.folder_watcher           # modo daemon
+    python -m backend.services.folder_watcher --once    # una sola pasada (cron)
+"""
+import os
+import time
+import signal
+import socket
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from backend.database.db_utils import get_db_engine_and_init
+from backend.services.ingestion_service import process_file_from_disk, SUPPORTED_EXTENSIONS
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# --- Configuración (variables de entorno) ---
+PROJECT_ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+DATA_DIR = os.environ.get("INGESTION_DATA_DIR", os.path.join(PROJECT_ROOT, "data_fuente"))
+POLL_SECONDS = float(os.environ.get("INGESTION_POLL_SECONDS", 5))
+MAX_WORKERS = int(os.environ.get("INGESTION_WORKERS", 4))
+# Un archivo en 'en_proceso' más antiguo que esto se considera abandonado (worker caído)
+STALE_CLAIM_SECONDS = int(os.environ.get("INGESTION_STALE_SECONDS", 3600))
+
+# Espera entre pasadas de --once mientras el pool está lleno
+DRAIN_POLL_SECONDS = 1.0
+
+CARGADO_POR = "Watcher"
+
+
+class FolderIngestionDaemon:
+    """
+    Sondea la carpeta de entrada con os.scandir (una llamada al sistema por
+    pasada, sin leer contenidos) y reparte los archivos estables entre un
+    pool de hilos. Varios daemons pueden compartir el mismo disco: el
+    reclamo por rename es atómico, solo uno gana cada archivo.
+    """
+
+    def __init__(self, data_dir: str = DATA_DIR, max_workers: int = MAX_WORKERS,
+                 poll_seconds: float = POLL_SECONDS):
+        self.inbox = os.path.join(data_dir, "entrada")
+        self.claimed = os.path.join(data_dir, "en_proceso")
+        self.done = os.path.join(data_dir, "procesados")
+        self.failed = os.path.join(data_dir, "fallidos")
+        for folder in (self.inbox, self.claimed, self.done, self.failed):
+            os.makedirs(folder, exist_ok=True)
+
+        self.max_workers = max_workers
+        self.poll_seconds = poll_seconds
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingesta")
+        self.stop_event = threading.Event()
+        self.engine = None
+
+        # Último (tamaño, mtime) visto por archivo: solo se reclama si no cambió entre
+        # dos pasadas, para no leer un exporte que el ERP aún está escribiendo.
+        self._last_seen: Dict[str, Tuple[int, float]] = {}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    # --- Detección y reclamo ---
+
+    def _stable_candidates(self):
+        seen = {}
+        candidates = []
+        with os.scandir(self.inbox) as entries:
+            for entry in entries:
+                if not entry.is_file() or entry.name.startswith(('.', '~$')):
+                    continue
+                if not entry.name.lower().endswith(SUPPORTED_EXTENSIONS):
+                    continue
+                st = entry.stat()
+                signature = (st.st_size, st.st_mtime)
+                seen[entry.name] = signature
+                if self._last_seen.get(entry.name) == signature:
+                    candidates.append(entry.name)
+        self._last_seen = seen
+        return candidates
+
+    def _claim(self, filename: str) -> Optional[str]:
+        """Mueve el archivo a 'en_proceso'. Devuelve la nueva ruta o None si otro lo ganó."""
+        src = os.path.join(self.inbox, filename)
+        dst = os.path.join(self.claimed, filename)
+        if os.path.exists(dst):
+            return None
+        try:
+            os.rename(src, dst)
+        except FileNotFoundError:
+            return None
+        # El rename conserva el mtime original; lo renovamos para detectar reclamos abandonados
+        os.utime(dst, None)
+        self._last_seen.pop(filename, None)
+        return dst
+
+    def requeue_stale_claims(self):
+        """Devuelve a 'entrada' los archivos reclamados por un worker que ya no existe."""
+        now = time.time()
+        with os.scandir(self.claimed) as entries:
+            for entry in entries:
+                if entry.is_file() and now - entry.stat().st_mtime > STALE_CLAIM_SECONDS:
+                    try:
+                        os.rename(entry.path, os.path.join(self.inbox, entry.name))
+                        logger.warning(f"Reclamo abandonado de '{entry.name}': devuelto a entrada.")
+                    except OSError as e:
+                        logger.error(f"No se pudo reencolar '{entry.name}': {e}")
+
+    # --- Procesamiento ---
+
+    def _archive(self, path: str, target_dir: str):
+        name = os.path.basename(path)
+        dst = os.path.join(target_dir, name)
+        if os.path.exists(dst):
+            stem, ext = os.path.splitext(name)
+            dst = os.path.join(target_dir, f"{stem}_{datetime.now():%Y%m%d%H%M%S}{ext}")
+        os.replace(path, dst)
+
+    def _process(self, path: str):
+        filename = os.path.basename(path)
+        try:
+            ok = process_file_from_disk(
+                path, self.engine, nombre_archivo=filename,
+                cargado_por=f"{CARGADO_POR}@{socket.gethostname()}"
+            )
+        except Exception as e:
+            logger.critical(f"Error no controlado ingiriendo '{filename}': {e}", exc_info=True)
+            ok = False
+        try:
+            self._archive(path, self.done if ok else self.failed)
+            logger.info(f"'{filename}' -> {'procesados' if ok else 'fallidos'}")
+        except OSError as e:
+            logger.error(f"No se pudo mover '{filename}' tras la ingesta: {e}")
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def scan_once(self) -> int:
+        """Una pasada: reclama archivos estables hasta llenar el pool. Devuelve cuántos se encolaron."""
+        submitted = 0
+        for filename in self._stable_candidates():
+            with self._lock:
+                if self._in_flight >= self.max_workers * 2:
+                    break
+            path = self._claim(filename)
+            if path is None:
+                continue
+            with self._lock:
+                self._in_flight += 1
+            self.executor.submit(self._process, path)
+            submitted += 1
+        if submitted:
+            logger.info(f"{submitted} archivo(s) reclamado(s) para ingesta.")
+        return submitted
+
+    def drain(self):
+        """
+        Modo --once: repite pasadas hasta que no quede nada estable en la entrada
+        ni ingestas en curso (scan_once solo reclama hasta llenar el pool).
+        """
+        while not self.stop_event.is_set():
+            submitted = self.scan_once()
+            with self._lock:
+                in_flight = self._in_flight
+            if not submitted and not in_flight:
+                return
+            self.stop_event.wait(min(self.poll_seconds, DRAIN_POLL_SECONDS))
+
+    def run(self, once: bool = False):
+        self.engine = get_db_engine_and_init()
+        if self.engine is None:
+            logger.error("No se pudo conectar a la BD. El daemon de ingesta no puede iniciar.")
+            return False
+
+        self.requeue_stale_claims()
+        logger.info(f"Vigilando '{self.inbox}' cada {self.poll_seconds}s con {self.max_workers} worker(s).")
+        try:
+            if once:
+                # Dos pasadas separadas por el intervalo para aplicar el chequeo de estabilidad
+                self._stable_candidates()
+                time.sleep(self.poll_seconds)
+                self.drain()
+            else:
+                while not self.stop_event.is_set():
+                    self.scan_once()
+                    self.stop_event.wait(self.poll_seconds)
+        finally:
+            self.executor.shutdown(wait=True)
+            logger.info("Daemon de ingesta detenido.")
+        return True
+
+    def stop(self, *_):
+        logger.info("Señal de parada recibida; terminando ingestas en curso...")
+        self.stop_event.set()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Daemon de ingesta por carpeta (watch-folder).")
+    parser.add_argument("--once", action="store_true", help="Procesa lo pendiente y termina.")
+    args = parser.parse_args()
+
+    daemon = FolderIngestionDaemon()
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    daemon.run(once=args.once)
@@ -0,0 +1,115 @@
+import os
+import json
+import logging
+import datetime
+import itertools
+import numpy as np
+from typing import Tuple, Optional, Iterator, List
+
+from backend.database.db_utils import get_db_engine, get_sales_history, iter_sales_history_batch
+
+logger = logging.getLogger(__name__)
+
+# Tope de puntos por serie aunque el cliente pida más (un gráfico no muestra más que su ancho en px)
+HISTORY_MAX_POINTS = int(os.environ.get("HISTORY_MAX_POINTS", 2000))
+# SKUs por llamada a /history/batch
+HISTORY_BATCH_MAX_SKUS = int(os.environ.get("HISTORY_BATCH_MAX_SKUS", 200))
+# LTTB necesita al menos el primer punto, el último y uno intermedio
+MIN_POINTS = 3
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: elige 'n_out' puntos de la serie (x creciente)
+    conservando su forma visual (picos y valles), a diferencia de un promedio por
+    ventanas que los aplana. Siempre incluye el primer y el último punto.
+
+    Returns:
+        np.ndarray: Índices (crecientes) de los puntos seleccionados.
+    """
+    n = len(x)
+    if n_out >= n or n_out < MIN_POINTS:
+        return np.arange(n)
+
+    x = x.astype(float)
+    y = y.astype(float)
+    # n - 2 puntos interiores repartidos en n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    indices = np.empty(n_out, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # Tercer vértice: promedio del bucket siguiente (o el último punto)
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+            cx, cy = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        else:
+            cx, cy = x[-1], y[-1]
+        # Área (x2) del triángulo (punto elegido anterior, candidato, promedio siguiente)
+        areas = np.abs((x[a] - cx) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (cy - y[a]))
+        a = start + int(areas.argmax())
+        indices[i + 1] = a
+    return indices
+
+def get_product_history(id_producto: str, desde: datetime.date, hasta: datetime.date,
+                        resolucion: str = "day", max_points: Optional[int] = None,
+                        engine=None) -> Tuple[bool, str, Optional[dict]]:
+    """
+    Historial de ventas de un SKU para graficar: agregado en SQL a la resolución
+    pedida y, si supera 'max_points' (tope HISTORY_MAX_POINTS), reducido con LTTB.
+
+    Returns:
+        Tuple: (Exito, Mensaje, {"historial": [{fecha, cantidad_vendida}],
+                "resolucion", "puntos_totales", "downsampled"} o None)
+    """
+    if engine is None:
+        engine = get_db_engine()
+        if engine is None:
+            return False, "Error crítico: No se pudo conectar a la base de datos.", None
+
+    rows = get_sales_history(id_producto, desde, hasta, resolucion, engine)
+    if rows is None:
+        return False, "Error consultando la base de datos.", None
+
+    limite = min(max_points or HISTORY_MAX_POINTS, HISTORY_MAX_POINTS)
+    total = len(rows)
+    if total > limite:
+        x = np.fromiter((datetime.date.fromisoformat(f).toordinal() for f, _ in rows), dtype=np.int64, count=total)
+        y = np.fromiter((u for _, u in rows), dtype=np.int64, count=total)
+        rows = [rows[i] for i in lttb_indices(x, y, max(limite, MIN_POINTS))]
+        logger.info(f"Historial '{id_producto}' ({resolucion}): {total} -> {len(rows)} puntos (LTTB).")
+
+    return True, "Success", {
+        "historial": [{"fecha": f, "cantidad_vendida": u} for f, u in rows],
+        "resolucion": resolucion,
+        "puntos_totales": total,
+        "downsampled": len(rows) < total,
+    }
+
+def stream_history_batch(ids_producto: List[str], desde: datetime.date, hasta: datetime.date,
+                         resolucion: str = "day", engine=None) -> Iterator[str]:
+    """
+    Historial de varios SKUs (una sola consulta) como JSON columnar emitido por
+    fragmentos, un SKU a la vez, sin materializar el resultado completo:
+
+        {"resolucion": ..., "desde": ..., "hasta": ...,
+         "series": {"SKU-1": {"fechas": [...], "cantidades": [...]}, ...}}
+
+    Los SKUs sin ventas en la ventana no aparecen en 'series'. Si la consulta falla
+    a mitad del stream se cierra el documento con una clave "error".
+    """
+    yield json.dumps({"resolucion": resolucion, "desde": desde.isoformat(),
+                      "hasta": hasta.isoformat()})[:-1] + ', "series": {'
+    separador = ""
+    try:
+        filas = iter_sales_history_batch(ids_producto, desde, hasta, resolucion, engine)
+        for sku, grupo in itertools.groupby(filas, key=lambda fila: fila[0]):
+            _, fechas, cantidades = zip(*grupo)
+            yield f'{separador}{json.dumps(sku)}: {json.dumps({"fechas": fechas, "cantidades": cantidades})}'
+            separador = ", "
+    except Exception as e:
+        logger.error(f"Error en historial por lotes ({len(ids_producto)} SKUs): {e}", exc_info=True)
+        yield '}, "error": ' + json.dumps("Error consultando la base de datos.") + "}"
+        return
+    yield "}}"
@@ -1,11 +1,21 @@
 import os
+import uuid
+import hashlib
 import logging
+import numpy as np
 import pandas as pd
-from typing import Tuple, Optional
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.feather as pa_feather
+import pyarrow.parquet as pa_parquet
+from datetime import datetime
+from typing import Tuple, Optional, Union, BinaryIO
 from sqlalchemy.engine.base import Engine
 
 # Importamos las utilidades de base de datos existentes
-from backend.database.db_utils import get_db_engine, save_dataframe_to_db
+from backend.database.db_utils import (
+    get_db_engine, save_ventas_file, register_uploaded_file, find_uploaded_file_by_hash
+)
 
 # Configuración de Logging Estructurado
 logging.basicConfig(
@@ -25,17 +35,194 @@ COLUMN_MAPPING = {
     'Cantidad': 'cantidad_vendida'
 }
 
-def validate_and_transform_df(df: pd.DataFrame, source_name: str) -> Tuple[Optional[pd.DataFrame], str]:
+# Formatos de archivo aceptados en la ingesta (manual y watch-folder)
+# Excel se lee con openpyxl, que no abre el formato binario antiguo (.xls)
+EXCEL_EXTENSIONS = ('.xlsx',)
+CSV_EXTENSIONS = ('.csv',)
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+ARROW_EXTENSIONS = ('.arrow', '.feather', '.ipc')
+SUPPORTED_EXTENSIONS = EXCEL_EXTENSIONS + CSV_EXTENSIONS + PARQUET_EXTENSIONS + ARROW_EXTENSIONS
+
+# Tipos explícitos para el parser CSV de Arrow: SKU siempre texto (códigos con ceros a la izquierda)
+CSV_COLUMN_TYPES = {
+    'SKU': pa.string(),
+    'Fecha Venta': pa.timestamp('s'),
+    'Cantidad': pa.int64(),
+}
+# Fechas día-primero además de ISO 8601 (Arrow y la relectura como texto usan los mismos)
+CSV_DATE_FORMATS = ('%d/%m/%Y', '%d-%m-%Y')
+
+# Reglas de rechazo de filas (ver validate_and_transform_df) y carpeta de sus reportes
+REJECTION_RULES = ['fecha_invalida', 'cantidad_no_numerica', 'cantidad_no_positiva']
+PROJECT_ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+REJECTIONS_DIR = os.environ.get("INGESTION_REJECTIONS_DIR", os.path.join(PROJECT_ROOT, "data_fuente", "rechazos"))
+
+# Deduplicación por contenido
+HASH_CHUNK_SIZE = 1024 * 1024  # 1 MB por lectura: el archivo nunca se carga entero para hashear
+FINGERPRINT_COLUMNS = ['id_producto', 'fecha', 'cantidad_vendida']
+DUPLICATE_CONTENT_MSG = "El archivo ya fue cargado (mismo contenido) por otra carga simultánea."
+
+def compute_file_hash(source: Union[str, BinaryIO]) -> str:
+    """
+    Calcula el SHA-256 del contenido de un archivo leyendo por bloques.
+
+    Args:
+        source: Ruta en disco o stream binario (p.ej. FileStorage.stream de Flask).
+                Si es un stream, se restaura su posición al terminar.
+
+    Returns:
+        str: Hash hexadecimal (64 caracteres).
+    """
+    sha = hashlib.sha256()
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    start = source.tell()
+    for chunk in iter(lambda: source.read(HASH_CHUNK_SIZE), b''):
+        sha.update(chunk)
+    source.seek(start)
+    return sha.hexdigest()
+
+def add_row_fingerprints(df: pd.DataFrame, lote: Optional[str] = None) -> pd.DataFrame:
+    """
+    Añade la columna 'fingerprint' (BIGINT) que identifica cada fila de venta.
+
+    La huella combina (id_producto, fecha, cantidad_vendida) con el número de
+    ocurrencia de esa combinación dentro del archivo, de modo que:
+    - Dos líneas idénticas de un mismo archivo (ventas legítimas repetidas) se conservan.
+    - Las mismas líneas reenviadas en otro archivo (exportes solapados) colisionan
+      y el índice único de ventas_detalle las descarta. Esas filas quedan con el
+      archivo_id del primer archivo que las cargó: entrenan cuando ese archivo
+      está aprobado, no cuando lo está el que las repitió.
+    Cálculo 100% vectorizado (hash_pandas_object), sin bucles por fila.
+
+    Args:
+        lote: Columna que separa archivos distintos dentro de df (la ocurrencia
+              se cuenta por archivo); None si df es un único archivo.
+    """
+    grupos = FINGERPRINT_COLUMNS if lote is None else [lote] + FINGERPRINT_COLUMNS
+    ocurrencia = df.groupby(grupos, sort=False, dropna=False).cumcount()
+    claves = df[FINGERPRINT_COLUMNS].assign(ocurrencia=ocurrencia)
+    hashes = pd.util.hash_pandas_object(claves, index=False).to_numpy()
+    # uint64 -> int64 para que quepa en una columna BIGINT de PostgreSQL
+    df['fingerprint'] = hashes.view(np.int64)
+    return df
+
+def _check_required_columns(available, filename: str):
+    missing = REQUIRED_COLUMNS - set(available)
+    if missing:
+        raise ValueError(f"Faltan columnas requeridas en '{filename}': {missing}")
+
+def _read_csv_arrow(source: Union[str, BinaryIO], filename: str) -> pd.DataFrame:
+    """
+    CSV con el lector multihilo de Arrow, leyendo solo las columnas requeridas.
+    Si una celda no encaja en el tipo declarado (p.ej. 'Cantidad' con texto),
+    se relee todo como texto y la limpieza queda a cargo de validate_and_transform_df;
+    'Fecha Venta' se convierte igual que con Arrow (_parse_csv_dates), de modo que
+    una celda inválida no cambia la lectura día/mes del resto del archivo.
+    """
+    start = None if isinstance(source, (str, os.PathLike)) else source.tell()
+    read_options = pa_csv.ReadOptions(use_threads=True)
+
+    def _read(column_types):
+        if start is not None:
+            source.seek(start)
+        convert_options = pa_csv.ConvertOptions(
+            include_columns=list(REQUIRED_COLUMNS),
+            column_types=column_types,
+            timestamp_parsers=[pa_csv.ISO8601, *CSV_DATE_FORMATS],
+        )
+        return pa_csv.read_csv(source, read_options=read_options, convert_options=convert_options)
+
+    try:
+        table = _read(CSV_COLUMN_TYPES)
+    except KeyError:
+        # Arrow lanza ArrowKeyError si falta alguna columna de include_columns: releemos solo la cabecera
+        if start is not None:
+            source.seek(start)
+        header = pa_csv.open_csv(source, read_options=read_options).schema.names
+        _check_required_columns(header, filename)
+        raise
+    except pa.ArrowInvalid as e:
+        logger.warning(f"'{filename}': tipos CSV inconsistentes ({e}). Releyendo como texto.")
+        df = _read({col: pa.string() for col in REQUIRED_COLUMNS}).to_pandas()
+        df['Fecha Venta'] = _parse_csv_dates(df['Fecha Venta'])
+        return df
+    return table.to_pandas()
+
+def _parse_csv_dates(fechas: pd.Series) -> pd.Series:
+    """Texto -> datetime con los formatos del parser de Arrow (NaT si ninguno encaja)."""
+    parsed = pd.to_datetime(fechas, format='ISO8601', errors='coerce')
+    for fmt in CSV_DATE_FORMATS:
+        parsed = parsed.fillna(pd.to_datetime(fechas, format=fmt, errors='coerce'))
+    return parsed
+
+def read_sales_file(source: Union[str, BinaryIO], filename: str) -> pd.DataFrame:
+    """
+    Lee un archivo de ventas en cualquiera de los formatos soportados y devuelve
+    el DataFrame crudo (columnas originales: SKU, Fecha Venta, Cantidad).
+
+    - Excel: hoja 'Detalle' (openpyxl).
+    - CSV: parser multihilo de Arrow con tipos explícitos.
+    - Parquet / Arrow IPC (Feather v2): se leen solo las columnas requeridas,
+      conservando los tipos columnares sin re-parsear texto.
+
+    Args:
+        source: Ruta en disco o stream binario con posibilidad de seek.
+        filename: Nombre original (determina el formato por su extensión).
+
+    Raises:
+        ValueError: Formato no soportado, hoja/columnas faltantes o archivo ilegible.
+    """
+    ext = os.path.splitext(filename.lower())[1]
+    if ext not in SUPPORTED_EXTENSIONS:
+        raise ValueError(f"Formato de archivo no soportado (solo {', '.join(SUPPORTED_EXTENSIONS)})")
+
+    try:
+        if ext in EXCEL_EXTENSIONS:
+            try:
+                return pd.read_excel(source, sheet_name='Detalle', engine='openpyxl')
+            except ValueError:
+                raise ValueError("El archivo Excel no contiene una hoja llamada 'Detalle'.")
+
+        if ext in CSV_EXTENSIONS:
+            return _read_csv_arrow(source, filename)
+
+        if ext in PARQUET_EXTENSIONS:
+            parquet_file = pa_parquet.ParquetFile(source)
+            _check_required_columns(parquet_file.schema_arrow.names, filename)
+            return parquet_file.read(columns=list(REQUIRED_COLUMNS), use_threads=True).to_pandas()
+
+        # Arrow IPC / Feather v2
+        table = pa_feather.read_table(source, memory_map=isinstance(source, (str, os.PathLike)))
+        _check_required_columns(table.schema.names, filename)
+        return table.select(list(REQUIRED_COLUMNS)).to_pandas()
+
+    except ValueError:
+        raise
+    except (pa.ArrowException, OSError, KeyError) as e:
+        raise ValueError(f"No se pudo leer '{filename}': {e}")
+
+def validate_and_transform_df(df: pd.DataFrame, source_name: str) -> Tuple[Optional[pd.DataFrame], str, Optional[pd.DataFrame]]:
     """
     Realiza la validación de esquema y transformaciones ETL (Limpieza).
     Esta función es PURA: Recibe DataFrame -> Devuelve DataFrame limpio.
+
+    Cada regla de REJECTION_RULES produce una máscara booleana vectorizada;
+    las filas que incumplen alguna se devuelven aparte (valores originales,
+    número de fila en el archivo, motivo principal y una columna booleana por regla) para
+    el reporte de rechazos. Sin bucles por fila.
     
     Args:
         df: DataFrame crudo (leído de Excel o CSV).
         source_name: Nombre del archivo para contexto en los logs.
         
     Returns:
-        Tuple: (DataFrame Procesado o None, Mensaje de Error o 'Success')
+        Tuple: (DataFrame Procesado o None, Mensaje de Error o 'Success',
+                DataFrame de filas rechazadas o None si no hubo rechazos)
     """
     # 1. Validación de Esquema (Columnas requeridas)
     actual_cols = set(df.columns)
@@ -43,101 +230,194 @@ def validate_and_transform_df(df: pd.DataFrame, source_name: str) -> Tuple[Optio
         missing = REQUIRED_COLUMNS - actual_cols
         error_msg = f"Faltan columnas requeridas en '{source_name}': {missing}"
         logger.error(error_msg)
-        return None, error_msg
+        return None, error_msg, None
 
     try:
         # 2. Selección y Renombrado de Columnas
-        df_processed = df[list(REQUIRED_COLUMNS)].copy()
-        df_processed.rename(columns=COLUMN_MAPPING, inplace=True)
+        df_raw = df[list(REQUIRED_COLUMNS)]
+        df_processed = df_raw.rename(columns=COLUMN_MAPPING)
 
         # 3. Transformación de Tipos de Datos
-        # Fecha: Coerce errores a NaT (Not a Time)
-        df_processed['fecha'] = pd.to_datetime(df_processed['fecha'], errors='coerce')
-        
-        # Cantidad: Coerce a numérico, llena nulos con 0, convierte a entero
-        df_processed['cantidad_vendida'] = pd.to_numeric(
-            df_processed['cantidad_vendida'], errors='coerce'
-        ).fillna(0).astype(int)
+        # Fecha: Coerce errores a NaT (Not a Time). La columna destino es DATE:
+        # descartamos la hora para que la huella sea estable
+        df_processed['fecha'] = pd.to_datetime(df_processed['fecha'], errors='coerce').dt.normalize()
+
+        # Cantidad: Coerce a numérico (NaN si no es un número)
+        cantidad = pd.to_numeric(df_processed['cantidad_vendida'], errors='coerce')
         
         # SKU: Asegurar string y eliminar espacios en blanco alrededor
         df_processed['id_producto'] = df_processed['id_producto'].astype(str).str.strip()
 
-        # 4. Limpieza de Datos (Filtrado)
-        initial_rows = len(df_processed)
-        
-        # Eliminar filas con fechas inválidas
-        df_processed.dropna(subset=['fecha'], inplace=True)
-        
-        # Eliminar filas con cantidades <= 0 (Devoluciones o errores)
-        df_processed = df_processed[df_processed['cantidad_vendida'] > 0]
+        # 4. Máscaras de rechazo por regla (orden = prioridad del 'motivo')
+        masks = {
+            'fecha_invalida': df_processed['fecha'].isna().to_numpy(),
+            'cantidad_no_numerica': cantidad.isna().to_numpy(),
+            # Sobre el valor truncado que se guarda (astype(int)): 0.5 se rechaza en vez de guardarse como 0
+            'cantidad_no_positiva': (cantidad.floordiv(1) <= 0).to_numpy(),  # NaN <= 0 es False
+        }
+        rejected = np.logical_or.reduce(list(masks.values()))
+
+        df_rejected = None
+        if rejected.any():
+            df_rejected = df_raw[rejected].astype(str)
+            # Fila tal como la ve el usuario en la hoja / CSV: la cabecera es la fila 1
+            df_rejected.insert(0, 'fila', np.flatnonzero(rejected) + 2)
+            df_rejected['motivo'] = np.select(
+                [m[rejected] for m in masks.values()], list(masks.keys()), default=''
+            )
+            for rule, mask in masks.items():
+                df_rejected[rule] = mask[rejected]
+            df_rejected.reset_index(drop=True, inplace=True)
+
+        # 5. Limpieza de Datos (Filtrado)
+        # Se descartan fechas inválidas y cantidades no numéricas o <= 0 (Devoluciones o errores)
+        df_processed = df_processed[~rejected].assign(cantidad_vendida=cantidad[~rejected].astype(int))
         
         clean_rows = len(df_processed)
-        dropped_rows = initial_rows - clean_rows
+        dropped_rows = int(rejected.sum())
         
         if clean_rows == 0:
-            return None, "El archivo no contiene registros válidos después de la limpieza (fechas incorrectas o cantidades <= 0)."
+            return None, "El archivo no contiene registros válidos después de la limpieza (fechas incorrectas o cantidades <= 0).", df_rejected
             
         logger.info(f"Procesado '{source_name}': {clean_rows} filas válidas, {dropped_rows} descartadas.")
-        return df_processed, "Success"
+        return df_processed, "Success", df_rejected
 
     except Exception as e:
         error_msg = f"Error de transformación de datos en '{source_name}': {str(e)}"
         logger.error(error_msg, exc_info=True)
-        return None, error_msg
+        return None, error_msg, None
+
+def summarize_rejections(df_rejected: Optional[pd.DataFrame]) -> dict:
+    """Conteo de filas rechazadas por regla (una fila puede incumplir varias)."""
+    if df_rejected is None or df_rejected.empty:
+        return {}
+    return {rule: int(n) for rule, n in df_rejected[REJECTION_RULES].sum().items()}
 
-def ingest_dataframe_to_db(df: pd.DataFrame, source_name: str, engine: Optional[Engine] = None) -> Tuple[bool, str, int]:
+def write_rejection_report(df_rejected: Optional[pd.DataFrame], nombre_archivo: str,
+                           hash_contenido: Optional[str] = None) -> Optional[str]:
+    """
+    Escribe las filas rechazadas en un sidecar Parquet (zstd) dentro de REJECTIONS_DIR.
+    Un fallo al escribir el reporte no debe impedir la ingesta: se registra y se devuelve None.
+
+    Returns:
+        str | None: Ruta del archivo escrito.
+    """
+    if df_rejected is None or df_rejected.empty:
+        return None
+    try:
+        os.makedirs(REJECTIONS_DIR, exist_ok=True)
+        stem = os.path.splitext(os.path.basename(nombre_archivo))[0]
+        tag = (hash_contenido or uuid.uuid4().hex)[:12]
+        path = os.path.join(REJECTIONS_DIR, f"{datetime.now():%Y%m%d%H%M%S}_{tag}_{stem}.parquet")
+        df_rejected.to_parquet(path, index=False, compression='zstd')
+        logger.info(f"Reporte de rechazos de '{nombre_archivo}': {len(df_rejected)} filas -> {path}")
+        return path
+    except Exception as e:
+        logger.error(f"No se pudo escribir el reporte de rechazos de '{nombre_archivo}': {e}", exc_info=True)
+        return None
+
+def ingest_dataframe_to_db(df: pd.DataFrame, source_name: str, engine: Optional[Engine] = None,
+                           nombre_archivo: Optional[str] = None, cargado_por: str = "Sistema",
+                           hash_contenido: Optional[str] = None) -> Tuple[bool, str, int]:
     """
     Orquestador para Carga Manual (API) y Automática.
     Toma un DataFrame crudo, lo valida/transforma y lo guarda en BD.
+    El archivo queda registrado en archivos_cargados: 'valido' en la misma
+    transacción que sus filas (con su archivo_id), o 'invalido' si falla.
     
     Args:
         df: DataFrame crudo.
-        source_name: Nombre del archivo origen.
+        source_name: Nombre del archivo origen (contexto para logs).
         engine: Motor SQLAlchemy opcional (inyección de dependencias).
+        nombre_archivo: Nombre con el que se registra el archivo (por defecto source_name).
+        cargado_por: Usuario o proceso que carga el archivo.
+        hash_contenido: SHA-256 del archivo (ver compute_file_hash).
         
     Returns:
         Tuple: (Exito: bool, Mensaje: str, Filas_Guardadas: int)
     """
-    # 1. Transformación
-    df_clean, msg = validate_and_transform_df(df, source_name)
-    if df_clean is None:
-        return False, msg, 0
+    nombre_archivo = nombre_archivo or source_name
 
-    # 2. Obtener conexión a BD si no se proveyó
+    # 1. Obtener conexión a BD si no se proveyó
     if engine is None:
         engine = get_db_engine()
         if engine is None:
             return False, "Error crítico: No se pudo conectar a la base de datos.", 0
 
-    # 3. Guardado (Carga)
+    # 2. Transformación + reporte de filas rechazadas
+    df_clean, msg, df_rejected = validate_and_transform_df(df, source_name)
+    reporte_rechazos = write_rejection_report(df_rejected, nombre_archivo, hash_contenido)
+    rechazos_por_regla = summarize_rejections(df_rejected)
+    if df_clean is None:
+        register_uploaded_file(nombre_archivo, 'invalido', 0, msg, cargado_por, engine, hash_contenido,
+                               reporte_rechazos, rechazos_por_regla)
+        return False, msg, 0
+
+    # 3. Huellas por fila (deduplicación contra lo ya cargado)
+    df_clean = add_row_fingerprints(df_clean)
+
+    # 4. Guardado (Carga) + registro del archivo con linaje
     try:
         # <-- CAMBIO: Nombre de tabla actualizado a 'ventas_detalle'
-        success, db_msg = save_dataframe_to_db(df_clean, "ventas_detalle", engine)
+        success, db_msg, rows_inserted, _ = save_ventas_file(
+            df_clean, nombre_archivo, engine, cargado_por=cargado_por, hash_contenido=hash_contenido,
+            reporte_rechazos=reporte_rechazos, rechazos_por_regla=rechazos_por_regla
+        )
         if success:
-            return True, f"Procesamiento exitoso. {db_msg}", len(df_clean)
-        else:
-            return False, f"Fallo al guardar en BD: {db_msg}", 0
+            if rechazos_por_regla:
+                db_msg += f" Filas rechazadas: {len(df_rejected)}."
+            return True, f"Procesamiento exitoso. {db_msg}", rows_inserted
+        existente = find_uploaded_file_by_hash(hash_contenido, engine)
+        if existente:
+            # Otra carga simultánea del mismo contenido ganó el índice único del hash
+            logger.warning(f"'{nombre_archivo}' omitido: mismo contenido que el archivo #{existente['id']}.")
+            return False, DUPLICATE_CONTENT_MSG, 0
+        error_msg = f"Fallo al guardar en BD: {db_msg}"
+        register_uploaded_file(nombre_archivo, 'invalido', 0, error_msg, cargado_por, engine, hash_contenido,
+                               reporte_rechazos, rechazos_por_regla)
+        return False, error_msg, 0
     except Exception as e:
         logger.critical(f"Excepción no controlada guardando '{source_name}': {e}", exc_info=True)
         return False, f"Error interno: {str(e)}", 0
 
-def process_excel_file_from_disk(file_path: str, engine=None) -> bool:
+def process_file_from_disk(file_path: str, engine=None, nombre_archivo: Optional[str] = None,
+                          cargado_por: str = "Sistema") -> bool:
     """
-    Lee un archivo Excel del disco y lo ingesta en ventas_detalle.
-    Usado para carga batch desde carpetas en disco (uso futuro/externo).
-    El registro en archivos_cargados es responsabilidad del llamador.
+    Lee un archivo de ventas del disco (cualquier formato de read_sales_file)
+    y lo ingesta en ventas_detalle.
+    Usado para carga batch desde carpetas en disco (ver folder_watcher).
+    El registro en archivos_cargados lo realiza ingest_dataframe_to_db.
+
+    Returns:
+        bool: True si el contenido quedó en la BD (incluye archivos ya cargados
+              antes con el mismo hash), False si la ingesta falló.
     """
-    filename = os.path.basename(file_path)
+    filename = nombre_archivo or os.path.basename(file_path)
     logger.info(f"Iniciando procesamiento de archivo en disco: {filename}")
+    hash_contenido = None
 
     try:
-        df_raw = pd.read_excel(file_path, sheet_name='Detalle', engine='openpyxl')
+        hash_contenido = compute_file_hash(file_path)
+        existente = find_uploaded_file_by_hash(hash_contenido, engine)
+        if existente:
+            logger.warning(f"'{filename}' omitido: mismo contenido que el archivo #{existente['id']} "
+                           f"('{existente['nombre_archivo']}', {existente['estado']}).")
+            return True
+
+        df_raw = read_sales_file(file_path, filename)
 
         if df_raw.empty:
-            logger.warning(f"El archivo '{filename}' está vacío o la hoja 'Detalle' no tiene datos.")
+            logger.warning(f"El archivo '{filename}' está vacío.")
+            register_uploaded_file(filename, 'invalido', 0, "El archivo (o la hoja 'Detalle') está vacío.",
+                                   cargado_por, engine, hash_contenido)
             return False
 
-        success, msg, _ = ingest_dataframe_to_db(df_raw, filename, engine)
+        success, msg, _ = ingest_dataframe_to_db(
+            df_raw, filename, engine,
+            nombre_archivo=filename, cargado_por=cargado_por, hash_contenido=hash_contenido
+        )
+        if msg == DUPLICATE_CONTENT_MSG:
+            return True
 
         if not success:
             logger.error(f"Fallo en la ingesta de '{filename}': {msg}")
@@ -145,8 +425,12 @@ def process_excel_file_from_disk(file_path: str, engine=None) -> bool:
         return success
 
     except ValueError as ve:
-        logger.error(f"Error de formato en '{filename}': Posiblemente falta la hoja 'Detalle'. Detalle: {ve}")
+        logger.error(f"Error de formato en '{filename}': {ve}")
+        register_uploaded_file(filename, 'invalido', 0, str(ve), cargado_por, engine, hash_contenido)
         return False
     except Exception as e:
         logger.critical(f"Error de sistema leyendo '{filename}': {e}", exc_info=True)
-        return False
\ No newline at end of file
+        return False
+
+# Alias histórico: el procesamiento en disco ya no se limita a Excel
+process_excel_file_from_disk = process_file_from_disk
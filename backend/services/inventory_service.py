@@ -0,0 +1,111 @@
+import os
+import logging
+import pandas as pd
+from typing import Tuple, Optional, Union, BinaryIO
+from sqlalchemy.engine.base import Engine
+
+from backend.database.db_utils import get_db_engine, upsert_inventory_data
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Columnas del snapshot de stock (stock_seguridad es opcional: 0 si falta)
+INVENTORY_REQUIRED_COLUMNS = {'id_producto', 'stock_actual'}
+
+# Encabezados alternativos habituales en los exportes del almacén
+INVENTORY_COLUMN_ALIASES = {
+    'SKU': 'id_producto',
+    'Stock Actual': 'stock_actual',
+    'Stock': 'stock_actual',
+    'Stock Seguridad': 'stock_seguridad',
+}
+
+INVENTORY_EXTENSIONS = ('.xlsx', '.csv', '.parquet')  # openpyxl no abre .xls
+
+def read_inventory_file(source: Union[str, BinaryIO], filename: str) -> pd.DataFrame:
+    """
+    Lee un snapshot de inventario (Excel primera hoja, CSV o Parquet).
+
+    Raises:
+        ValueError: Formato no soportado o archivo ilegible.
+    """
+    ext = os.path.splitext(filename.lower())[1]
+    if ext not in INVENTORY_EXTENSIONS:
+        raise ValueError(f"Formato de archivo no soportado (solo {', '.join(INVENTORY_EXTENSIONS)})")
+    try:
+        if ext == '.xlsx':
+            return pd.read_excel(source, sheet_name=0, engine='openpyxl', dtype={'id_producto': str, 'SKU': str})
+        if ext == '.csv':
+            # Motor pyarrow: parser multihilo; SKU siempre como texto
+            return pd.read_csv(source, engine='pyarrow', dtype={'id_producto': str, 'SKU': str})
+        return pd.read_parquet(source)
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError(f"No se pudo leer '{filename}': {e}")
+
+def validate_inventory_df(df: pd.DataFrame, source_name: str) -> Tuple[Optional[pd.DataFrame], str]:
+    """
+    Normaliza y valida el snapshot de stock (vectorizado).
+    Descarta filas sin SKU o con stock no numérico / negativo.
+
+    Returns:
+        Tuple: (DataFrame limpio o None, Mensaje de Error o 'Success')
+    """
+    df = df.rename(columns=INVENTORY_COLUMN_ALIASES)
+    missing = INVENTORY_REQUIRED_COLUMNS - set(df.columns)
+    if missing:
+        error_msg = f"Faltan columnas requeridas en '{source_name}': {missing}"
+        logger.error(error_msg)
+        return None, error_msg
+
+    if 'stock_seguridad' not in df.columns:
+        df = df.assign(stock_seguridad=0)
+
+    df_clean = pd.DataFrame({
+        'id_producto': df['id_producto'].astype(str).str.strip(),
+        'stock_actual': pd.to_numeric(df['stock_actual'], errors='coerce'),
+        'stock_seguridad': pd.to_numeric(df['stock_seguridad'], errors='coerce').fillna(0),
+    })
+    valid = (
+        df['id_producto'].notna()
+        & (df_clean['id_producto'] != '')
+        & df_clean['stock_actual'].notna()
+        & (df_clean['stock_actual'] >= 0)
+        & (df_clean['stock_seguridad'] >= 0)
+    )
+    df_clean = df_clean[valid].astype({'stock_actual': int, 'stock_seguridad': int})
+
+    if df_clean.empty:
+        return None, "El archivo no contiene registros de stock válidos."
+    logger.info(f"Inventario '{source_name}': {len(df_clean)} filas válidas, {int((~valid).sum())} descartadas.")
+    return df_clean, "Success"
+
+def ingest_inventory_file(source: Union[str, BinaryIO], filename: str,
+                          engine: Optional[Engine] = None) -> Tuple[bool, str, int, int]:
+    """
+    Orquestador de la carga de stock: lectura -> validación -> upsert masivo.
+
+    Returns:
+        Tuple: (Exito: bool, Mensaje: str, Filas_Leidas: int, SKUs_Actualizados: int)
+    """
+    if engine is None:
+        engine = get_db_engine()
+        if engine is None:
+            return False, "Error crítico: No se pudo conectar a la base de datos.", 0, 0
+
+    try:
+        df_raw = read_inventory_file(source, filename)
+    except ValueError as e:
+        logger.error(f"Error leyendo inventario '{filename}': {e}")
+        return False, str(e), 0, 0
+
+    df_clean, msg = validate_inventory_df(df_raw, filename)
+    if df_clean is None:
+        return False, msg, len(df_raw), 0
+
+    success, db_msg, filas = upsert_inventory_data(df_clean, engine)
+    return success, db_msg, len(df_raw), filas
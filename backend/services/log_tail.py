@@ -0,0 +1,137 @@
+"""
+Lectura de los logs de los workers del pipeline sin recorrer el archivo completo.
+
+- tail_lines(): últimas N líneas leyendo bloques hacia atrás desde el final
+  (el coste depende de N, no del tamaño acumulado del log).
+- follow() / sse_log_stream(): líneas nuevas a medida que se escriben, como
+  Server-Sent Events. El 'id' de cada evento es el offset en bytes tras la
+  línea, de modo que EventSource reanuda con Last-Event-ID sin duplicados.
+
+El planificador rota los logs de los jobs por tamaño (RotatingFileHandler:
+renombra a .1 y abre un archivo nuevo); follow() detecta el archivo nuevo por
+su inodo (o un truncado) y vuelve a leer desde el inicio.
+"""
+import os
+import time
+
+TAIL_BLOCK_SIZE = 8192
+TAIL_MAX_LINES = int(os.environ.get("LOG_TAIL_MAX_LINES", 2000))
+LOG_STREAM_POLL_SECONDS = float(os.environ.get("LOG_STREAM_POLL_SECONDS", 0.5))
+LOG_STREAM_HEARTBEAT_SECONDS = float(os.environ.get("LOG_STREAM_HEARTBEAT_SECONDS", 15))
+# Cada stream ocupa un hilo del servidor: se cierra pasado este tiempo y el cliente reconecta
+LOG_STREAM_MAX_SECONDS = float(os.environ.get("LOG_STREAM_MAX_SECONDS", 300))
+LOG_STREAM_RETRY_MS = 3000
+_READ_CHUNK = 64 * 1024
+
+
+def _decode(raw: bytes) -> str:
+    return raw.decode('utf-8', errors='replace').rstrip('\r')
+
+
+def tail_lines(path: str, n: int, block_size: int = TAIL_BLOCK_SIZE):
+    """
+    Returns:
+        (lineas, offset): las últimas n líneas (sin salto de línea) y el tamaño del
+        archivo al leerlo, punto de partida para follow().
+    """
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        if n <= 0:
+            return [], end
+
+        pos = end
+        data = b""
+        # n+1 saltos garantizan n líneas completas aunque el primer bloque empiece a mitad de línea
+        while pos > 0 and data.count(b"\n") <= n:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+
+    lines = data.split(b"\n")
+    if lines and lines[-1] == b"":
+        lines.pop()
+    return [_decode(line) for line in lines[-n:]], end
+
+
+def follow(path: str, offset: int, poll_interval: float = LOG_STREAM_POLL_SECONDS,
+           max_seconds: float = LOG_STREAM_MAX_SECONDS):
+    """
+    Generador de eventos del log a partir de 'offset' (bytes):
+        ("line", offset_tras_la_linea, texto) por cada línea completa nueva,
+        ("rotated", 0, None) si el archivo se truncó o se reemplazó,
+        ("idle", offset, None) en cada sondeo sin datos nuevos.
+    Termina al cumplirse max_seconds.
+    """
+    deadline = time.monotonic() + max_seconds
+    f = None
+    inode = None
+    pending = b""
+    try:
+        while time.monotonic() < deadline:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                st = None
+
+            if st is not None and (f is None or st.st_ino != inode or st.st_size < offset):
+                if f is not None:
+                    f.close()
+                    offset, pending = 0, b""
+                    yield ("rotated", 0, None)
+                elif st.st_size < offset:
+                    offset = 0  # Last-Event-ID de un log que ya rotó
+                f = open(path, 'rb')
+                inode = st.st_ino
+
+            if f is None or st is None or st.st_size == offset:
+                yield ("idle", offset, None)
+                time.sleep(poll_interval)
+                continue
+
+            f.seek(offset)
+            chunk = f.read(min(st.st_size - offset, _READ_CHUNK))
+            # Inicio de la primera línea sin publicar (la parcial pendiente, si la hay)
+            line_end = offset - len(pending)
+            offset += len(chunk)
+            pending += chunk
+            *complete, pending = pending.split(b"\n")
+            for raw in complete:
+                line_end += len(raw) + 1
+                yield ("line", line_end, _decode(raw))
+    finally:
+        if f is not None:
+            f.close()
+
+
+def _sse(data: str, event: str = None, event_id=None) -> str:
+    parts = []
+    if event:
+        parts.append(f"event: {event}")
+    if event_id is not None:
+        parts.append(f"id: {event_id}")
+    parts.append(f"data: {data}")
+    return "\n".join(parts) + "\n\n"
+
+
+def sse_log_stream(path: str, offset: int, backlog=()):
+    """
+    Cuerpo text/event-stream: primero las líneas de 'backlog' (ya leídas con
+    tail_lines, sin id), luego las nuevas. Comentarios ': keepalive' mantienen
+    viva la conexión a través de proxies.
+    """
+    yield f"retry: {LOG_STREAM_RETRY_MS}\n\n"
+    for line in backlog:
+        yield _sse(line)
+    last_sent = time.monotonic()
+    for kind, position, line in follow(path, offset):
+        if kind == "line":
+            yield _sse(line, event_id=position)
+        elif kind == "rotated":
+            yield _sse("", event="rotated", event_id=0)
+        elif time.monotonic() - last_sent >= LOG_STREAM_HEARTBEAT_SECONDS:
+            yield ": keepalive\n\n"
+        else:
+            continue
+        last_sent = time.monotonic()
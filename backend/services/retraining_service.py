@@ -0,0 +1,99 @@
+"""
+Re-entrenamiento completo: entrenar, recargar los modelos en vivo, marcar los
+archivos usados y publicar el evento 'model-published'. Lo comparten el
+endpoint /api/v1/trigger_retraining y el job 'worker_retraining' del planificador.
+
+El entrenamiento corre en un solo proceso del clúster (lease 'training'); el
+resto de réplicas y workers de gunicorn recargan los modelos al ver el evento
+'model-published' en el outbox (start_model_watcher). models/ debe ser un
+almacenamiento compartido entre todas las réplicas.
+"""
+import os
+import time
+import logging
+import threading
+
+import backend.ml_core.predict as predictor
+import backend.ml_core.training as training_pipeline
+from backend.database.db_utils import (
+    mark_files_as_processed, publish_pipeline_event, get_last_pipeline_event_id, EVENT_MODEL_PUBLISHED
+)
+
+logger = logging.getLogger(__name__)
+
+# Frecuencia con que cada proceso busca modelos publicados por otro (0 desactiva)
+MODEL_RELOAD_POLL_SECONDS = float(os.environ.get("MODEL_RELOAD_POLL_SECONDS", 10))
+_watcher = None
+
+
+def retrain_and_reload():
+    """
+    El llamador retiene el lease 'training' (backend/database/leases.py): dos
+    réplicas no deben entrenar a la vez sobre el mismo models/.
+
+    Returns:
+        Tuple: (bool éxito, str mensaje, dict con metrics / save_status / details)
+    """
+    # 1. Ejecutar el pipeline de entrenamiento
+    training_results = training_pipeline.train_and_evaluate()
+
+    if not training_results or training_results.get("status") != "success":
+        error_msg = (training_results or {}).get("message", "Error desconocido durante el entrenamiento.")
+        logger.error(f"El pipeline de entrenamiento falló: {error_msg}")
+        return False, "Falló el pipeline de entrenamiento.", {"details": error_msg}
+
+    # 2. Recargar los modelos en la memoria de 'predict.py'
+    logger.info("Entrenamiento completado. Recargando modelos en vivo...")
+    if not predictor.reload_artifacts():
+        # Estado crítico: el entrenamiento funcionó pero el servidor sigue con los modelos antiguos
+        logger.error("¡FALLO CRÍTICO! Entrenamiento exitoso, pero no se pudieron recargar los nuevos modelos en vivo.")
+        return False, ("Entrenamiento exitoso, pero la recarga de modelos falló. "
+                       "Se requiere reinicio manual del servidor backend."), {
+            "metrics": training_results.get("metrics", {})
+        }
+
+    logger.info("Modelos recargados en vivo con éxito.")
+
+    # 3. Marcar como 'procesado' solo los archivos que el modelo leyó
+    archivos_usados = training_results.get("archivos_usados", [])
+    mark_files_as_processed(file_ids=archivos_usados)
+
+    # 4. Las predicciones cambiaron: las etapas suscritas (alertas, métricas) se re-ejecutan
+    publish_pipeline_event(EVENT_MODEL_PUBLISHED, {"archivos": len(archivos_usados)})
+
+    return True, "Re-entrenamiento completado y modelos recargados en vivo con éxito.", {
+        "metrics": training_results.get("metrics", {}),
+        "save_status": training_results.get("save_status", [])
+    }
+
+
+def _watch_published_models():
+    # Los 'model-published' se emiten bajo el lease 'training', uno tras otro:
+    # el MAX(id) de ese tipo solo crece y basta compararlo con el último visto
+    last_id = None
+    while True:
+        try:
+            latest = get_last_pipeline_event_id(tipo=EVENT_MODEL_PUBLISHED)
+            # En la primera lectura se cubre lo publicado entre la carga inicial y el arranque
+            if latest and (last_id is None or latest > last_id):
+                if not predictor.reload_if_changed():
+                    logger.error("[ModelWatcher] No se pudieron recargar los modelos publicados.")
+            last_id = latest
+        except Exception as e:
+            logger.warning(f"[ModelWatcher] Error consultando modelos publicados: {e}")
+        time.sleep(MODEL_RELOAD_POLL_SECONDS)
+
+
+def start_model_watcher() -> bool:
+    """
+    Arranca (una vez por proceso) el hilo que recarga los modelos cuando otra
+    réplica o worker publica unos nuevos. Retorna True si quedó activo.
+    """
+    global _watcher
+    if MODEL_RELOAD_POLL_SECONDS <= 0:
+        logger.info("[ModelWatcher] Deshabilitado por MODEL_RELOAD_POLL_SECONDS.")
+        return False
+    if _watcher is None:
+        _watcher = threading.Thread(target=_watch_published_models, name="model-watcher", daemon=True)
+        _watcher.start()
+    return True
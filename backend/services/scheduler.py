@@ -0,0 +1,408 @@
+"""
+Planificador de los jobs del pipeline dentro del proceso del backend.
+
+Reemplaza a los scripts worker_*.sh (sleep + curl en bucle). Cada job:
+- se activa / detiene desde /api/v1/pipeline/* (flags pipeline_enabled_* de
+  configuracion_sistema);
+- con PIPELINE_TRIGGER_MODE=events (por defecto) corre solo cuando llega uno de
+  los eventos a los que está suscrito (outbox 'eventos_pipeline', ver db_utils),
+  con debounce: espera PIPELINE_DEBOUNCE_<JOB> segundos sin eventos nuevos (como
+  máximo PIPELINE_DEBOUNCE_MAX_FACTOR veces eso desde el primero), de modo que
+  una ráfaga de aprobaciones produce un solo re-entrenamiento. Los eventos que
+  llegan durante una ejecución provocan una más al terminar. Al activarse (o al
+  arrancar el backend) corre una vez para ponerse al día. Los ids del outbox se
+  asignan al insertar pero las transacciones confirman en otro orden: un id
+  saltado queda como hueco y se vuelve a buscar durante
+  PIPELINE_EVENTS_GAP_SECONDS, por si su transacción confirma más tarde;
+- con PIPELINE_TRIGGER_MODE=interval corre cada pipeline_interval_* minutos,
+  más un desfase aleatorio de hasta SCHEDULER_JITTER (fracción del intervalo), y
+  nunca se solapa consigo mismo: si al vencer su turno la ejecución anterior
+  sigue en curso, el turno se omite (skip-if-running);
+- corre en un pool de SCHEDULER_MAX_WORKERS hilos y dentro del bulkhead de su
+  clase, así que tampoco coincide con un disparo manual del mismo trabajo;
+- deja cada ejecución en job_runs (inicio, fin, duración, estado, mensaje) y
+  una línea en su log (PIPELINE_LOG_DIR/<job>.log, rotado por tamaño).
+
+Un solo proceso por máquina compite por el planificador (lock sobre
+SCHEDULER_LOCK_FILE) y, entre máquinas, solo despacha el que retiene el lease
+'scheduler' (ver backend/database/leases.py); los demás quedan en espera y lo
+toman si el líder cae. Los workers que no despachan solo cambian los flags en la
+BD y el líder los ve al vencer CONFIG_CACHE_TTL. El re-entrenamiento y las
+alertas corren además bajo su propio lease, compartido con los disparos manuales
+de la API de cualquier réplica.
+"""
+import os
+import time
+import fcntl
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import RotatingFileHandler
+
+from backend.api.admission import BULKHEADS
+from backend.database.leases import Lease, is_free
+from backend.database.db_utils import (
+    get_db_engine, get_pipeline_intervals, get_pipeline_enabled, get_model_metrics_history,
+    auto_approve_valid_files, start_job_run, finish_job_run, record_job_skip,
+    close_abandoned_job_runs, prune_job_runs,
+    get_last_pipeline_event_id, fetch_pipeline_events, prune_pipeline_events,
+    EVENT_FILE_UPLOADED, EVENT_FILE_APPROVED, EVENT_MODEL_PUBLISHED, EVENT_INVENTORY_UPDATED,
+    EVENT_ALERT_CONFIG_UPDATED
+)
+from backend.services.alert_service import run_daily_alert_analysis
+from backend.services.retraining_service import retrain_and_reload
+from backend.telemetry import Counter, Histogram, register
+
+logger = logging.getLogger(__name__)
+
+_PROJECT_ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "true").lower() == "true"
+PIPELINE_TRIGGER_MODE = os.environ.get("PIPELINE_TRIGGER_MODE", "events").lower()
+PIPELINE_DEBOUNCE_MAX_FACTOR = float(os.environ.get("PIPELINE_DEBOUNCE_MAX_FACTOR", 5))
+SCHEDULER_MAX_WORKERS = int(os.environ.get("SCHEDULER_MAX_WORKERS", 2))
+SCHEDULER_JITTER = float(os.environ.get("SCHEDULER_JITTER", 0.1))
+SCHEDULER_TICK_SECONDS = float(os.environ.get("SCHEDULER_TICK_SECONDS", 5))
+SCHEDULER_LOCK_FILE = os.environ.get("SCHEDULER_LOCK_FILE", os.path.join(_PROJECT_ROOT, "scripts", "pids", "scheduler.lock"))
+JOB_RUNS_RETENTION_DAYS = int(os.environ.get("JOB_RUNS_RETENTION_DAYS", 30))
+PIPELINE_EVENTS_RETENTION_DAYS = int(os.environ.get("PIPELINE_EVENTS_RETENTION_DAYS", 7))
+# Tiempo que se espera a que confirme la transacción de un id saltado (o que se
+# dé por revertida); debe cubrir la transacción más larga que emite eventos
+PIPELINE_EVENTS_GAP_SECONDS = float(os.environ.get("PIPELINE_EVENTS_GAP_SECONDS", 300))
+_MAX_TRACKED_GAP = 1000  # Saltos mayores (p. ej. secuencia reiniciada) no se siguen id a id
+PIPELINE_LOG_DIR = os.environ.get("PIPELINE_LOG_DIR", os.path.join(_PROJECT_ROOT, "scripts", "logs"))
+WORKER_LOG_MAX_BYTES = int(os.environ.get("WORKER_LOG_MAX_BYTES", 5 * 1024 * 1024))
+WORKER_LOG_BACKUPS = int(os.environ.get("WORKER_LOG_BACKUPS", 3))
+
+JOB_RUNS = register(Counter(
+    "scheduler_job_runs_total", "Ejecuciones de los jobs del planificador por resultado.", ("job", "estado")
+))
+JOB_DURATION_SECONDS = register(Histogram(
+    "scheduler_job_duration_seconds", "Duración de las ejecuciones de los jobs del planificador.", ("job",)
+))
+PIPELINE_EVENTS = register(Counter(
+    "pipeline_events_total", "Eventos del pipeline leídos del outbox por el planificador.", ("tipo",)
+))
+
+
+# --- Trabajos: cada uno retorna (bool éxito, str mensaje) ---
+
+def _run_ingestion():
+    promoted, message = auto_approve_valid_files()
+    return True, message
+
+
+def _run_retraining():
+    success, message, _ = retrain_and_reload()
+    return success, message
+
+
+def _run_metrics():
+    metrics, _ = get_model_metrics_history(get_db_engine(), limit=1)
+    if not metrics:
+        return True, "Sin métricas registradas."
+    last = metrics[0]
+    return True, f"Última métrica: {last['model']} (MAE {last['mae']}, R2 {last['r2']}) del {last['fecha_registro']}."
+
+
+def _run_alerts():
+    if run_daily_alert_analysis():
+        return True, "Análisis de alertas completado."
+    return False, "No se pudo ejecutar el análisis de alertas."
+
+
+class ScheduledJob:
+    """Un job del pipeline y su estado dentro del planificador."""
+
+    def __init__(self, job_id: str, label: str, log: str, func, bulkhead=None, lease=None,
+                 triggers=(), debounce: float = 0):
+        self.id = job_id
+        self.label = label
+        self.log = log
+        self.func = func
+        self.bulkhead = bulkhead
+        self.lease = lease          # Nombre del lease del clúster (None: sin exclusión entre réplicas)
+        self.triggers = frozenset(triggers)
+        name = job_id.split("_", 1)[-1].upper()
+        self.debounce = float(os.environ.get(f"PIPELINE_DEBOUNCE_{name}", debounce))
+        self.running = False
+        self.armed = False          # Activo en este planificador (se desarma al detenerlo)
+        self.next_run = None        # time.monotonic() del próximo turno; None si no hay uno previsto
+        self.pending_since = None   # Primer evento aún no atendido (modo events)
+        self.last_event = None      # Último evento recibido (modo events)
+        self.logger = logging.getLogger(f"pipeline.{job_id}")
+
+    @property
+    def log_path(self) -> str:
+        return os.path.join(PIPELINE_LOG_DIR, self.log)
+
+    @property
+    def event_driven(self) -> bool:
+        return PIPELINE_TRIGGER_MODE == "events" and bool(self.triggers)
+
+    def disarm(self):
+        self.armed = False
+        self.next_run = self.pending_since = self.last_event = None
+
+
+JOBS = [
+    ScheduledJob("worker_ingestion", "Ingesta de Datos", "ingestion.log", _run_ingestion, BULKHEADS["ingestion"],
+                 triggers=(EVENT_FILE_UPLOADED,), debounce=5),
+    ScheduledJob("worker_retraining", "Reentrenamiento ML", "retraining.log", _run_retraining, BULKHEADS["training"], "training",
+                 triggers=(EVENT_FILE_APPROVED,), debounce=60),
+    ScheduledJob("worker_metrics", "Métricas", "metrics.log", _run_metrics,
+                 triggers=(EVENT_MODEL_PUBLISHED,), debounce=5),
+    ScheduledJob("worker_alerts", "Alertas", "alerts.log", _run_alerts, BULKHEADS["alerts"], "alerts",
+                 triggers=(EVENT_MODEL_PUBLISHED, EVENT_INVENTORY_UPDATED, EVENT_ALERT_CONFIG_UPDATED), debounce=30),
+]
+
+
+class Scheduler:
+    """Hilo despachador + pool acotado de ejecución."""
+
+    def __init__(self, jobs, max_workers: int):
+        self.jobs = {job.id: job for job in jobs}
+        self.max_workers = max_workers
+        self.active = False
+        self._executor = None
+        self._thread = None
+        self._wake = threading.Event()
+        self._lock_handle = None
+        self._last_prune = 0.0
+        self._last_event_id = None
+        self._event_gaps = {}       # id saltado -> time.monotonic() en que se detectó
+        self._leader = None
+
+    def start(self) -> bool:
+        """Arranca el despachador si este proceso obtiene el lock de la máquina."""
+        if self.active:
+            return True
+        os.makedirs(os.path.dirname(SCHEDULER_LOCK_FILE), exist_ok=True)
+        handle = open(SCHEDULER_LOCK_FILE, 'w')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            logger.info("[Scheduler] Otro proceso de esta máquina ya ejecuta el planificador.")
+            return False
+        self._lock_handle = handle  # El lock vive mientras el archivo siga abierto
+
+        os.makedirs(PIPELINE_LOG_DIR, exist_ok=True)
+        for job in self.jobs.values():
+            handler = RotatingFileHandler(job.log_path, maxBytes=WORKER_LOG_MAX_BYTES,
+                                          backupCount=WORKER_LOG_BACKUPS, encoding='utf-8')
+            handler.setFormatter(logging.Formatter("[%(asctime)s] %(message)s"))
+            job.logger.addHandler(handler)
+            job.logger.setLevel(logging.INFO)
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pipeline-job")
+        self._thread = threading.Thread(target=self._loop, name="pipeline-scheduler", daemon=True)
+        self.active = True
+        self._thread.start()
+        logger.info(f"[Scheduler] Planificador activo ({self.max_workers} hilos, {len(self.jobs)} jobs).")
+        return True
+
+    @property
+    def is_leader(self) -> bool:
+        return self._leader is not None and self._leader.held
+
+    def wake(self):
+        """Fuerza un ciclo inmediato (tras activar / detener un job o cambiar su intervalo)."""
+        self._wake.set()
+
+    def seconds_to_next_run(self, job_id: str):
+        job = self.jobs[job_id]
+        if not self.is_leader or job.next_run is None:
+            return None
+        return max(0, round(job.next_run - time.monotonic()))
+
+    def _loop(self):
+        while True:
+            self._wake.clear()
+            try:
+                self._tick()
+            except Exception as e:
+                logger.error(f"[Scheduler] Error en el ciclo del planificador: {e}", exc_info=True)
+            self._wake.wait(SCHEDULER_TICK_SECONDS)
+
+    def _ensure_leader(self) -> bool:
+        """Retiene (o intenta tomar) el lease 'scheduler'. Solo el líder despacha jobs."""
+        if self._leader is not None and self._leader.alive():
+            return True
+        if self._leader is not None:
+            logger.warning("[Scheduler] Se perdió el liderazgo del planificador.")
+            for job in self.jobs.values():
+                job.disarm()
+        self._leader = Lease("scheduler")
+        # Los reintentos de las réplicas en espera no cuentan como contención
+        if not self._leader.acquire(observe=False):
+            return False
+
+        logger.info("[Scheduler] Este proceso es el líder del planificador.")
+        try:
+            # Lo anterior lo cubre la ejecución de puesta al día de cada job activo
+            self._last_event_id = get_last_pipeline_event_id()
+        except Exception as e:
+            logger.warning(f"[Scheduler] No se pudo leer el outbox de eventos: {e}")
+            self._last_event_id = None
+        self._event_gaps.clear()
+        # Las ejecuciones en 'running' del líder anterior quedaron abandonadas, salvo
+        # las que otra réplica sigue ejecutando bajo su lease (disparos manuales)
+        orphaned = [job.id for job in self.jobs.values() if job.lease is None or is_free(job.lease)]
+        abandoned = close_abandoned_job_runs(orphaned)
+        if abandoned:
+            logger.warning(f"[Scheduler] {abandoned} ejecución(es) previas quedaron interrumpidas.")
+        return True
+
+    def _tick(self):
+        if not self._ensure_leader():
+            return
+        enabled = get_pipeline_enabled()
+        intervals = get_pipeline_intervals()
+        event_types = self._poll_events()
+        now = time.monotonic()
+
+        for job in self.jobs.values():
+            if not enabled.get(job.id):
+                job.disarm()
+                continue
+            if job.event_driven:
+                due = self._due_on_events(job, event_types, now)
+            else:
+                due = self._due_on_interval(job, intervals[job.id] * 60, now)
+            if due:
+                job.running = True
+                self._executor.submit(self._execute, job)
+
+        if now - self._last_prune > 24 * 3600:
+            self._last_prune = now
+            pruned = prune_job_runs(JOB_RUNS_RETENTION_DAYS)
+            pruned_events = prune_pipeline_events(PIPELINE_EVENTS_RETENTION_DAYS)
+            if pruned or pruned_events:
+                logger.info(f"[Scheduler] Depuración: {pruned} ejecución(es) y {pruned_events} evento(s) antiguos.")
+
+    def _poll_events(self):
+        """
+        Tipos de los eventos nuevos del outbox desde la última lectura, incluidos
+        los de huecos anteriores cuya transacción confirmó después.
+        """
+        if PIPELINE_TRIGGER_MODE != "events":
+            return set()
+        try:
+            if self._last_event_id is None:
+                self._last_event_id = get_last_pipeline_event_id()
+                return set()
+            events = fetch_pipeline_events(self._last_event_id, also_ids=tuple(self._event_gaps))
+        except Exception as e:
+            logger.error(f"[Scheduler] Error leyendo el outbox de eventos: {e}")
+            return set()
+
+        now = time.monotonic()
+        for event in events:
+            if self._event_gaps.pop(event.id, None) is None:
+                # Ids entre el último leído y este: transacciones aún abiertas (o revertidas)
+                if event.id - self._last_event_id <= _MAX_TRACKED_GAP:
+                    for gap in range(self._last_event_id + 1, event.id):
+                        self._event_gaps[gap] = now
+                self._last_event_id = event.id
+            PIPELINE_EVENTS.inc(tipo=event.tipo)
+        for gap, detected in list(self._event_gaps.items()):
+            if now - detected > PIPELINE_EVENTS_GAP_SECONDS:
+                del self._event_gaps[gap]
+        return {event.tipo for event in events}
+
+    def _due_on_interval(self, job, interval: float, now: float) -> bool:
+        if not job.armed:
+            job.armed = True
+            job.next_run = now + random.uniform(0, SCHEDULER_JITTER * interval)
+        if now < job.next_run:
+            return False
+
+        # Turnos a ritmo fijo: el siguiente se calcula desde este, no desde el fin de la ejecución
+        job.next_run = now + interval + random.uniform(0, SCHEDULER_JITTER * interval)
+        if job.running:
+            self._skip(job, "Omitido: la ejecución anterior sigue en curso.")
+            return False
+        return True
+
+    def _due_on_events(self, job, event_types, now: float) -> bool:
+        if not job.armed:
+            # Puesta al día al activarse: cuenta como un evento ya vencido
+            job.armed = True
+            job.pending_since, job.last_event = now, now - job.debounce
+        if event_types & job.triggers:
+            job.pending_since = job.pending_since or now
+            job.last_event = now
+        if job.pending_since is None:
+            job.next_run = None
+            return False
+
+        job.next_run = min(job.last_event + job.debounce,
+                           job.pending_since + job.debounce * PIPELINE_DEBOUNCE_MAX_FACTOR)
+        # En curso: los eventos quedan pendientes y se atienden con una ejecución al terminar
+        if now < job.next_run or job.running:
+            return False
+        job.pending_since = job.last_event = job.next_run = None
+        return True
+
+    def _skip(self, job, message: str):
+        job.logger.info(message)
+        record_job_skip(job.id, message)
+        JOB_RUNS.inc(job=job.id, estado="skipped")
+        if job.event_driven and job.armed:
+            # Los eventos no se pierden: se reintenta tras otro periodo de debounce
+            job.pending_since = job.pending_since or time.monotonic()
+            job.last_event = time.monotonic()
+
+    def _execute(self, job):
+        try:
+            if job.bulkhead is not None and job.bulkhead.acquire(block=False) is not None:
+                self._skip(job, f"Omitido: '{job.bulkhead.name}' ocupado por otra ejecución.")
+                return
+            lease = Lease(job.lease) if job.lease else None
+            try:
+                if lease is not None and not lease.acquire():
+                    self._skip(job, f"Omitido: otra instancia ejecuta '{job.lease}'.")
+                    return
+                self._run(job)
+            finally:
+                if lease is not None:
+                    lease.release()
+                if job.bulkhead is not None:
+                    job.bulkhead.release()
+        except Exception as e:
+            logger.error(f"[Scheduler] No se pudo ejecutar el job '{job.id}': {e}", exc_info=True)
+        finally:
+            job.running = False
+            if job.pending_since is not None:
+                self.wake()  # Eventos llegados durante la ejecución
+
+    def _run(self, job):
+        run_id = start_job_run(job.id)
+        job.logger.info(f"Ejecutando {job.label}...")
+        start = time.perf_counter()
+        try:
+            success, message = job.func()
+            estado = "success" if success else "error"
+        except Exception as e:
+            logger.error(f"[Scheduler] Error en el job '{job.id}': {e}", exc_info=True)
+            estado, message = "error", str(e)
+
+        # Se cierra antes de soltar el lease: otra réplica no ve dos ejecuciones en 'running'
+        duration = time.perf_counter() - start
+        finish_job_run(run_id, estado, message, duration)
+        JOB_DURATION_SECONDS.observe(duration, job=job.id)
+        JOB_RUNS.inc(job=job.id, estado=estado)
+        job.logger.info(f"{estado.upper()} en {duration:.1f} s: {message}")
+
+
+SCHEDULER = Scheduler(JOBS, SCHEDULER_MAX_WORKERS)
+
+
+def start_scheduler() -> bool:
+    """Arranca el planificador del proceso (si SCHEDULER_ENABLED). Retorna True si quedó activo."""
+    if not SCHEDULER_ENABLED:
+        logger.info("[Scheduler] Deshabilitado por SCHEDULER_ENABLED.")
+        return False
+    return SCHEDULER.start()
@@ -0,0 +1,184 @@
+"""
+Histogramas de latencia del proceso y su exposición en formato de texto de Prometheus.
+
+- http_request_duration_seconds: por ruta (regla de Flask), método y status (api_bp).
+- db_query_duration_seconds: por tipo de sentencia (eventos de cursor de SQLAlchemy).
+- model_inference_seconds: por modelo (mlp, xgboost) y modo (single, batch).
+- training_stage_seconds: por etapa del pipeline de entrenamiento.
+
+Expuesto vía GET /metrics (las métricas de los modelos siguen en /api/v1/metrics).
+Como pool_stats, los valores son del proceso que atiende el scrape: con varios
+workers de gunicorn, cada uno lleva los suyos.
+"""
+import time
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+# Límites superiores (segundos): de consultas por PK a entrenamientos completos
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+class Histogram:
+    """Histograma acumulativo thread-safe con etiquetas (subconjunto del modelo de Prometheus)."""
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series = {}  # valores de etiquetas -> [conteo por bucket..., suma, total]
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            labels = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(labels + [le])} {cumulative}")
+            le_inf = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(labels + [le_inf])} {values[-1]}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {values[-2]}")
+            lines.append(f"{self.name}_count{_labels(labels)} {values[-1]}")
+        return lines
+
+
+class Counter:
+    """Contador monótono thread-safe con etiquetas."""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            labels = [f'{name}="{_escape(v)}"' for name, v in zip(self.labelnames, key)]
+            lines.append(f"{self.name}{_labels(labels)} {value}")
+        return lines
+
+
+class CallbackGauge:
+    """Gauge leído en el momento del scrape: callback() -> {valores de etiquetas: valor}."""
+
+    def __init__(self, name: str, documentation: str, labelnames, callback):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for key, value in sorted(self.callback().items()):
+            labels = [f'{name}="{_escape(str(v))}"' for name, v in zip(self.labelnames, key)]
+            lines.append(f"{self.name}{_labels(labels)} {value}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels) -> str:
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Latencia de las peticiones a la API.", ("route", "method", "status")
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds", "Duración de las sentencias SQL (ejecución en el cursor).", ("statement",)
+)
+MODEL_INFERENCE_SECONDS = Histogram(
+    "model_inference_seconds", "Duración de la inferencia por modelo.", ("model", "mode")
+)
+TRAINING_STAGE_SECONDS = Histogram(
+    "training_stage_seconds", "Duración de cada etapa del pipeline de entrenamiento.", ("stage",)
+)
+
+REGISTRY = [HTTP_REQUEST_SECONDS, DB_QUERY_SECONDS, MODEL_INFERENCE_SECONDS, TRAINING_STAGE_SECONDS]
+
+
+def register(metric):
+    """Añade una métrica definida en otro módulo (Counter, CallbackGauge...) a la exposición."""
+    REGISTRY.append(metric)
+    return metric
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render_prometheus() -> str:
+    """Todas las métricas registradas en formato de exposición de texto."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Consultas SQL ---
+
+_STATEMENT_KINDS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "COPY", "CREATE", "ALTER", "DROP", "TRUNCATE"}
+
+
+def _statement_kind(statement: str) -> str:
+    """Primera palabra de la sentencia (cardinalidad acotada: nunca el SQL completo)."""
+    head = statement.lstrip().split(None, 1)
+    kind = head[0].upper() if head else ""
+    return kind if kind in _STATEMENT_KINDS else "OTHER"
+
+
+def attach_query_timing(engine):
+    """Registra los eventos de cursor que alimentan db_query_duration_seconds."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("query_start")
+        if starts:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - starts.pop(), statement=_statement_kind(statement))
+
+    @event.listens_for(engine, "handle_error")
+    def _on_error(exception_context):
+        # La sentencia falló: after_cursor_execute no se dispara, se descarta su inicio
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start"):
+            conn.info["query_start"].pop()
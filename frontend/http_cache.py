@@ -0,0 +1,58 @@
+"""
+Cliente HTTP con revalidación por ETag para los endpoints de lectura del backend.
+
+Guarda la última respuesta 200 de cada petición (método + URL + parámetros +
+cuerpo) junto con su ETag y la reenvía en If-None-Match. Si el backend contesta
+304, se reutiliza la respuesta guardada: en los reruns de Streamlit el backend
+no consulta la BD ni vuelve a serializar el JSON.
+
+La caché vive en el proceso de Streamlit (compartida entre sesiones; estas
+respuestas no dependen del usuario) y se limita a MAX_ENTRIES peticiones.
+"""
+import json
+import threading
+from collections import OrderedDict
+
+import requests
+
+MAX_ENTRIES = 256
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _key(method, url, params, body):
+    return json.dumps([method, url, params, body], sort_keys=True, default=str)
+
+
+def _request(method, url, params=None, json_body=None, headers=None, timeout=10):
+    key = _key(method, url, params, json_body)
+    with _lock:
+        cached = _cache.get(key)
+    headers = dict(headers or {})
+    if cached is not None:
+        headers['If-None-Match'] = cached.headers['ETag']
+
+    response = requests.request(method, url, params=params, json=json_body, headers=headers, timeout=timeout)
+    if response.status_code == 304 and cached is not None:
+        with _lock:
+            _cache.move_to_end(key)
+        return cached
+
+    if response.status_code == 200 and response.headers.get('ETag'):
+        with _lock:
+            _cache[key] = response
+            _cache.move_to_end(key)
+            while len(_cache) > MAX_ENTRIES:
+                _cache.popitem(last=False)
+    return response
+
+
+def cached_get(url, params=None, headers=None, timeout=10):
+    """requests.get con revalidación por ETag (devuelve un requests.Response)."""
+    return _request('GET', url, params=params, headers=headers, timeout=timeout)
+
+
+def cached_post(url, json=None, headers=None, timeout=10):
+    """requests.post (JSON) con revalidación por ETag, para /history y /history/batch."""
+    return _request('POST', url, json_body=json, headers=headers, timeout=timeout)
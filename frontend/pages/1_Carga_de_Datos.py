@@ -5,6 +5,7 @@ import logging
 
 from frontend.config import get_setting
 from frontend.styles import get_app_css
+from frontend.http_cache import cached_get
 
 # --- PROTECCIÓN DE PÁGINA ---
 if 'authenticated' not in st.session_state or not st.session_state.authenticated:
@@ -132,6 +133,7 @@ BACKEND_PORT = os.getenv("BACKEND_PORT", "5000")
 BASE_URL     = f"http://{BACKEND_HOST}:{BACKEND_PORT}"
 URL_UPLOAD   = f"{BASE_URL}/upload"
 URL_FILES    = f"{BASE_URL}/api/v1/files"
+FILES_PAGE_SIZE = 50
 USUARIO_ACTUAL = st.session_state.user.get('username', 'Sistema')
 
 # ── Session state ──────────────────────────────────────────────────────────────
@@ -139,12 +141,20 @@ if "uploader_key"      not in st.session_state: st.session_state.uploader_key
 if "queue"             not in st.session_state: st.session_state.queue             = {}
 if "deleted_filenames" not in st.session_state: st.session_state.deleted_filenames = set()
 if "carga_refresh_key" not in st.session_state: st.session_state.carga_refresh_key = 0
+# Pila de cursores de la tabla de archivos registrados ([None] = primera página)
+if "carga_cursors"     not in st.session_state: st.session_state.carga_cursors     = [None]
 
 # ── Helpers ────────────────────────────────────────────────────────────────────
-def fetch_persisted_files():
-    """Consulta los archivos registrados en la BD vía API."""
+def fetch_persisted_files(cursor=None):
+    """
+    Consulta una página de archivos registrados en la BD vía API.
+    Retorna {"items", "next_cursor", "conteos"} o None si falla.
+    """
+    params = {"limit": FILES_PAGE_SIZE}
+    if cursor:
+        params["cursor"] = cursor
     try:
-        r = requests.get(URL_FILES, timeout=8)
+        r = cached_get(URL_FILES, params=params, timeout=8)
         if r.status_code == 200:
             return r.json()
     except Exception as e:
@@ -204,11 +214,13 @@ with st.container(border=True):
         unsafe_allow_html=True
     )
 
-    persisted = fetch_persisted_files()
+    page = fetch_persisted_files(st.session_state.carga_cursors[-1])
+    persisted = page["items"] if page else None
+    conteos   = page.get("conteos", {}) if page else {}
 
     if persisted is None:
         st.error("⚠️ No se pudo conectar al backend. Verifique que el servidor esté activo.")
-    elif len(persisted) == 0:
+    elif not conteos and len(persisted) == 0:
         st.markdown(
             '<div style="text-align:center;padding:30px 0;color:#94A3B8;font-size:14px;">'
             '📂 No hay archivos registrados. Cargue el primer archivo en la sección inferior.</div>',
@@ -216,12 +228,12 @@ with st.container(border=True):
         )
     else:
         # Contadores rápidos
-        validos    = sum(1 for f in persisted if f['estado'] == 'valido')
-        invalidos  = sum(1 for f in persisted if f['estado'] == 'invalido')
-        procesados = sum(1 for f in persisted if f['estado'] == 'procesado')
+        validos    = conteos.get('valido', 0)
+        invalidos  = conteos.get('invalido', 0)
+        procesados = conteos.get('procesado', 0)
 
         kc1, kc2, kc3, kc4 = st.columns(4)
-        kc1.metric("Total", len(persisted))
+        kc1.metric("Total", sum(conteos.values()))
         kc2.metric("✅ Válidos",    validos)
         kc3.metric("🔬 Procesados", procesados)
         kc4.metric("❌ Inválidos",  invalidos)
@@ -267,7 +279,7 @@ with st.container(border=True):
                 unsafe_allow_html=True
             )
 
-            if c5.button("🗑️", key=f"del_db_{fid}", help="Eliminar registro de la BD"):
+            if c5.button("🗑️", key=f"del_db_{fid}", help="Eliminar el archivo y sus ventas de la BD"):
                 ok, msg_del = delete_persisted_file(fid)
                 if ok:
                     st.toast(f"✅ Registro de '{fname}' eliminado del sistema.", icon="🗑️")
@@ -275,6 +287,19 @@ with st.container(border=True):
                     st.toast(f"❌ Error: {msg_del}", icon="⚠️")
                 st.rerun()
 
+        # Navegación por cursor (la API pagina por keyset, no por número de página)
+        n1, n2, n3 = st.columns([1, 3, 1])
+        if len(st.session_state.carga_cursors) > 1 and n1.button("← Recientes", key="carga_prev"):
+            st.session_state.carga_cursors.pop()
+            st.rerun()
+        n2.markdown(
+            f'<div style="text-align:center;font-size:12px;color:#94A3B8;">Página {len(st.session_state.carga_cursors)}</div>',
+            unsafe_allow_html=True
+        )
+        if page.get("next_cursor") and n3.button("Anteriores →", key="carga_next"):
+            st.session_state.carga_cursors.append(page["next_cursor"])
+            st.rerun()
+
 # ═══════════════════════════════════════════════════════════════════════════════
 #  SECCIÓN B: CARGAR NUEVOS ARCHIVOS
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -287,18 +312,18 @@ with st.container(border=True):
     st.markdown("""
     <div class="drop-hint">
         <div class="drop-icon">📥</div>
-        <div class="drop-title">Arrastre y suelte sus archivos Excel aquí</div>
-        <div class="drop-sub">Solo archivos .xlsx &nbsp;•&nbsp; Máx. 200 MB por archivo &nbsp;•&nbsp; Puede soltar varios a la vez</div>
+        <div class="drop-title">Arrastre y suelte sus archivos de ventas aquí</div>
+        <div class="drop-sub">Excel, CSV, Parquet o Arrow &nbsp;•&nbsp; Máx. 200 MB por archivo &nbsp;•&nbsp; Puede soltar varios a la vez</div>
     </div>
     """, unsafe_allow_html=True)
 
     # Zona de drag & drop
     new_files = st.file_uploader(
         label="📁 O haga clic en **Examinar archivos** para seleccionarlos manualmente:",
-        type=["xlsx"],
+        type=["xlsx", "csv", "parquet", "pq", "arrow", "feather", "ipc"],
         accept_multiple_files=True,
         key=f"uploader_{st.session_state.uploader_key}",
-        help="Solo archivos .xlsx con la hoja 'Detalle'. Se pueden subir varios al mismo tiempo."
+        help="Excel con la hoja 'Detalle', o CSV/Parquet/Arrow con las columnas SKU, Fecha Venta y Cantidad. Se pueden subir varios al mismo tiempo."
     )
 
     # Agregar a la cola (sin duplicados ni eliminados)
@@ -372,7 +397,7 @@ with st.container(border=True):
             ):
                 selected = {k: v for k, v in st.session_state.queue.items() if v['checked']}
                 total = len(selected)
-                ok_count = err_count = 0
+                ok_count = err_count = dup_count = 0
                 bar = st.progress(0, text="Iniciando...")
 
                 for i, (fname, fdata) in enumerate(selected.items()):
@@ -392,6 +417,9 @@ with st.container(border=True):
                         # necesitamos quitar el archivo de la cola local.
                         if resp.status_code == 201:
                             ok_count += 1
+                        elif resp.status_code == 409:
+                            # Mismo contenido ya ingerido: no se vuelve a guardar
+                            dup_count += 1
                         else:
                             err_count += 1
                     except requests.exceptions.ConnectionError:
@@ -410,6 +438,8 @@ with st.container(border=True):
 
                 if ok_count:
                     st.success(f"✅ {ok_count} archivo(s) guardado(s) correctamente en la base de datos.")
+                if dup_count:
+                    st.info(f"ℹ️ {dup_count} archivo(s) omitido(s): su contenido ya había sido cargado.")
                 if err_count:
                     st.warning(f"⚠️ {err_count} archivo(s) con errores. Revise la sección superior para ver el estado.")
 
@@ -417,6 +447,6 @@ with st.container(border=True):
     else:
         st.markdown(
             '<div style="text-align:center;padding:16px 0 8px 0;color:#94A3B8;font-size:13px;">'
-            '📂 Ningún archivo en cola. Arrastre archivos .xlsx arriba para comenzar.</div>',
+            '📂 Ningún archivo en cola. Arrastre archivos de ventas arriba para comenzar.</div>',
             unsafe_allow_html=True
         )
\ No newline at end of file
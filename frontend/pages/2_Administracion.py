@@ -7,6 +7,7 @@ from pathlib import Path
 
 # [NUEVO] Motor de estilos
 from frontend.styles import get_app_css
+from frontend.http_cache import cached_get
 
 
 # --- CONFIGURACIÓN DE RUTAS (Path Fix) ---
@@ -83,6 +84,11 @@ if st.button("Iniciar Re-entrenamiento del Modelo", type="primary", use_containe
             if response.status_code == 200:
                 st.success(f"✅ ¡Re-entrenamiento completado con éxito!")
                 st.json(response.json()) # Mostrar el JSON de respuesta (que tendrá el mensaje y métricas)
+            elif response.status_code == 409:
+                # Otra instancia (o el planificador) ya está entrenando: se muestra esa ejecución
+                run = response.json().get('run') or {}
+                desde = f" desde {run['inicio'][:19]}" if run.get('inicio') else ""
+                st.warning(f"⏳ Ya hay un re-entrenamiento en curso{desde}. Consulte su avance en Configuración → Historial de ejecuciones.")
             else:
                 # Mostrar el error devuelto por el backend
                 error_msg = response.json().get('error', 'Error desconocido del backend.')
@@ -106,7 +112,8 @@ st.markdown('<p style="color:#64748B;">Historial de precisión (MAE/RMSE) regist
 if st.button("🔄 Actualizar Gráficos de Rendimiento"):
     try:
         with st.spinner("Obteniendo historial de métricas..."):
-            response = requests.get(URL_METRICS, timeout=10)
+            # Página más reciente (tamaño máximo de la API): suficiente para la tendencia
+            response = cached_get(URL_METRICS, params={"limit": 500}, timeout=10)
             
         if response.status_code == 200:
             data = response.json().get("metrics", [])
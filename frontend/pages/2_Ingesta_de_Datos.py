@@ -4,6 +4,7 @@ import os
 import logging
 
 from frontend.styles import get_app_css
+from frontend.http_cache import cached_get
 
 # --- PROTECCIÓN DE PÁGINA ---
 if 'authenticated' not in st.session_state or not st.session_state.authenticated:
@@ -76,14 +77,29 @@ BASE_URL     = f"http://{BACKEND_HOST}:{BACKEND_PORT}"
 URL_FILES    = f"{BASE_URL}/api/v1/files"
 
 # ── Helpers ────────────────────────────────────────────────────────────────────
-def fetch_all_files():
+def fetch_files(estado: str, max_pages=None):
+    """
+    Recorre las páginas de /api/v1/files filtradas por estado siguiendo next_cursor.
+    Retorna (items, conteos por estado) o (None, None) si falla.
+    """
+    items, conteos, cursor, pages = [], {}, None, 0
     try:
-        r = requests.get(URL_FILES, timeout=8)
-        if r.status_code == 200:
-            return r.json()
+        while True:
+            params = {"estado": estado, "limit": 500}
+            if cursor:
+                params["cursor"] = cursor
+            r = cached_get(URL_FILES, params=params, timeout=8)
+            if r.status_code != 200:
+                return None, None
+            page = r.json()
+            items.extend(page["items"])
+            conteos = page.get("conteos", conteos)
+            cursor, pages = page.get("next_cursor"), pages + 1
+            if not cursor or (max_pages and pages >= max_pages):
+                return items, conteos
     except Exception as e:
         logging.warning(f"Error obteniendo archivos: {e}")
-    return None
+    return None, None
 
 def set_file_status(file_id: int, new_status: str):
     try:
@@ -148,18 +164,15 @@ with st.expander("ℹ️ Flujo de estados de archivos", expanded=False):
     """)
 
 # ── Cargar datos del backend ───────────────────────────────────────────────────
-all_files = fetch_all_files()
+# Pendientes y aprobados se necesitan completos; los procesados (la mayoría) solo la página más reciente
+validos, conteos = fetch_files('valido')
+aprobados, _     = fetch_files('aprobado')
+procesados, _    = fetch_files('procesado', max_pages=1)
 
-if all_files is None:
+if validos is None or aprobados is None or procesados is None:
     st.error("⚠️ No se pudo conectar al backend. Verifique que el servidor esté activo.")
     st.stop()
 
-# Separar por estado
-validos    = [f for f in all_files if f['estado'] == 'valido']
-aprobados  = [f for f in all_files if f['estado'] == 'aprobado']
-procesados = [f for f in all_files if f['estado'] == 'procesado']
-invalidos  = [f for f in all_files if f['estado'] == 'invalido']
-
 # ═══════════════════════════════════════════════════════════════════════════════
 #  MÉTRICAS RÁPIDAS
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -167,7 +180,7 @@ c1, c2, c3, c4 = st.columns(4)
 with c1:
     st.markdown(f"""
     <div class="stat-card">
-        <div class="num">{len(all_files)}</div>
+        <div class="num">{sum(conteos.values())}</div>
         <div class="lbl">Total archivos</div>
     </div>""", unsafe_allow_html=True)
 with c2:
@@ -185,7 +198,7 @@ with c3:
 with c4:
     st.markdown(f"""
     <div class="stat-card" style="border-top: 3px solid #8B5CF6;">
-        <div class="num" style="color:#4C1D95;">{len(procesados)}</div>
+        <div class="num" style="color:#4C1D95;">{conteos.get('procesado', 0)}</div>
         <div class="lbl">🔬 Procesados</div>
     </div>""", unsafe_allow_html=True)
 
@@ -349,7 +362,9 @@ with st.container(border=True):
 # ═══════════════════════════════════════════════════════════════════════════════
 if procesados:
     st.markdown("<br>", unsafe_allow_html=True)
-    with st.expander(f"🔬 Archivos ya Procesados en entrenamientos anteriores ({len(procesados)})", expanded=False):
+    with st.expander(f"🔬 Archivos ya Procesados en entrenamientos anteriores ({conteos.get('procesado', 0)})", expanded=False):
+        if conteos.get('procesado', 0) > len(procesados):
+            st.caption(f"Mostrando los {len(procesados)} más recientes.")
         hp0, hp1, hp2, hp3 = st.columns([4, 1.5, 1.8, 1.5])
         hp0.markdown('<span class="col-lbl">Archivo</span>', unsafe_allow_html=True)
         hp1.markdown('<span class="col-lbl">Filas</span>', unsafe_allow_html=True)
@@ -11,6 +11,8 @@ from pathlib import Path
 root_path = Path(__file__).parent.parent.parent
 sys.path.append(str(root_path))
 
+from frontend.http_cache import cached_get, cached_post
+
 # --- IMPORTACIÓN DE CONFIGURACIÓN ---
 try:
     from frontend.config import URL_PREDICT, BASE_URL, get_role_based_sidebar_css
@@ -27,7 +29,11 @@ except ImportError:
     URL_HISTORY = f"{BASE_URL}/history"
 
 URL_ALERTS = f"{BASE_URL}/api/alerts"
+# Puntos del gráfico de histórico: ~ancho útil del gráfico en px
+HISTORY_MAX_POINTS = 600
+RESOLUCIONES_HISTORIAL = {"Diaria": "day", "Semanal": "week", "Mensual": "month"}
 URL_ALERTS_STATUS = f"{BASE_URL}/api/alerts/{{}}/status"
+URL_HISTORY_BATCH = f"{BASE_URL}/history/batch"
 
 # Configuración básica de logging
 logging.basicConfig(level=logging.INFO)
@@ -53,15 +59,58 @@ st.markdown('<h1 style="color:#0F2942; margin-bottom: 5px;">📈 Visualización
 st.markdown('<p style="color:#64748B;">Utilice este panel para generar un pronóstico de demanda de unidades para cualquier SKU en una fecha futura.</p>', unsafe_allow_html=True)
 
 # --- INICIO DE AGREGADO: Alertas Activas (HU-007) ---
-def fetch_alerts():
+ALERTS_PAGE_SIZE = 50
+if "alert_pages" not in st.session_state:
+    st.session_state.alert_pages = 1
+
+def fetch_alerts(pages=1):
+    """
+    Trae las 'pages' primeras páginas de alertas activas siguiendo next_cursor.
+    Retorna (alertas, hay_mas).
+    """
+    alerts, cursor = [], None
     try:
-        response = requests.get(URL_ALERTS, timeout=10)
-        if response.status_code == 200:
-            return response.json()
-        return []
+        for _ in range(pages):
+            params = {"limit": ALERTS_PAGE_SIZE}
+            if cursor:
+                params["cursor"] = cursor
+            response = cached_get(URL_ALERTS, params=params, timeout=10)
+            if response.status_code != 200:
+                break
+            page = response.json()
+            alerts.extend(page["items"])
+            cursor = page.get("next_cursor")
+            if not cursor:
+                break
+        return alerts, bool(cursor)
     except Exception as e:
         logging.error(f"Error fetching alerts: {e}")
-        return []
+        return alerts, False
+
+def fetch_history_batch(skus, dias=90):
+    """
+    Histórico semanal de varios SKUs en una sola llamada (/history/batch).
+    Retorna un DataFrame ancho (índice fecha, una columna por SKU) o None.
+    """
+    try:
+        payload = {
+            "ids_producto": list(skus),
+            "desde": (datetime.date.today() - datetime.timedelta(days=dias)).strftime("%Y-%m-%d"),
+            "resolucion": "week",
+        }
+        response = cached_post(URL_HISTORY_BATCH, json=payload, timeout=30)
+        if response.status_code != 200:
+            return None
+        series = response.json().get("series", {})
+        if not series:
+            return None
+        return pd.DataFrame({
+            sku: pd.Series(s["cantidades"], index=pd.to_datetime(s["fechas"], format="%Y-%m-%d"))
+            for sku, s in series.items()
+        }).fillna(0)
+    except Exception as e:
+        logging.error(f"Error fetching history batch: {e}")
+        return None
 
 def update_alert_status(alert_id, new_status):
     try:
@@ -90,11 +139,16 @@ def confirm_discard_dialog(alert_id, original_display):
             st.rerun()
 
 with st.expander("🔔 Alertas Activas de Inventario", expanded=True):
-    alertas = fetch_alerts()
+    alertas, hay_mas = fetch_alerts(st.session_state.alert_pages)
     if not alertas:
         st.info("✅ No hay alertas pendientes. Todo en orden.")
     else:
-        st.warning(f"Se han detectado {len(alertas)} alertas pendientes que requieren su atención.")
+        st.warning(f"Se han detectado {'más de ' if hay_mas else ''}{len(alertas)} alertas pendientes que requieren su atención.")
+        # Ventas recientes de los SKUs con alerta: un solo viaje al backend
+        df_alert_hist = fetch_history_batch(dict.fromkeys(a['sku'] for a in alertas))
+        if df_alert_hist is not None:
+            st.caption("Ventas semanales (últimos 90 días) de los SKUs con alerta")
+            st.line_chart(df_alert_hist, use_container_width=True)
         # Utilizar columnas para mostrar las alertas de forma clara
         for alert in alertas:
             col1, col2, col3, col4 = st.columns([1.5, 1, 3, 1.5])
@@ -141,6 +195,9 @@ with st.expander("🔔 Alertas Activas de Inventario", expanded=True):
                         if update_alert_status(alert['id'], new_status):
                             st.rerun()
             st.markdown("---")
+        if hay_mas and st.button("Ver más alertas", key="alerts_more"):
+            st.session_state.alert_pages += 1
+            st.rerun()
 # --- FIN DE AGREGADO ---
 
 # --- Tarea HU-003.T1: Diseño de la interfaz (Rediseñado - Fase 4) ---
@@ -174,6 +231,20 @@ with st.form(key="prediction_form_mvp_redesign"):
             min_value=datetime.date.today() + datetime.timedelta(days=1) # Mínimo mañana
         )
 
+        # Ventana y resolución del histórico (agregado y reducido en el backend)
+        col_desde, col_res = st.columns(2)
+        with col_desde:
+            historial_desde = st.date_input(
+                label="Histórico desde",
+                value=datetime.date.today() - datetime.timedelta(days=365)
+            )
+        with col_res:
+            resolucion = st.selectbox(
+                label="Resolución del histórico",
+                options=list(RESOLUCIONES_HISTORIAL.keys()),
+                index=0
+            )
+
         # Botón de envío del formulario
         submit_button = st.form_submit_button(
             label="Generar Predicción de Unidades",
@@ -192,7 +263,12 @@ if submit_button:
 
         # Payloads para el backend
         payload_predict = {"id_producto": id_producto, "fecha_str": fecha_str}
-        payload_history = {"id_producto": id_producto}
+        payload_history = {
+            "id_producto": id_producto,
+            "desde": historial_desde.strftime("%Y-%m-%d"),
+            "resolucion": RESOLUCIONES_HISTORIAL[resolucion],
+            "max_points": HISTORY_MAX_POINTS,
+        }
 
         # --- Contenedor de Resultados (Fase 4 - Tarea 3) ---
         st.markdown(f'<h3 style="color:#0F2942; font-size: 18px; border-bottom: 1px solid #E2E8F0; padding-bottom: 10px;">Resultados para: {id_producto}</h3>', unsafe_allow_html=True)
@@ -202,7 +278,7 @@ if submit_button:
 # ... (rest of the logic)
                 # --- Llamadas a los Endpoints del Backend ---
                 response_pred = requests.post(URL_PREDICT, json=payload_predict, timeout=60)
-                response_hist = requests.post(URL_HISTORY, json=payload_history, timeout=60)
+                response_hist = cached_post(URL_HISTORY, json=payload_history, timeout=60)
 
                 # Dividir pantalla
                 col1, col2 = st.columns([1, 2])
@@ -241,16 +317,17 @@ if submit_button:
                     # [CORRECCIÓN] Reemplazo de st.subheader por título HTML
                     st.markdown('<h4 style="color: #64748B; font-size: 16px; margin-bottom: 0;">Histórico de Ventas</h4>', unsafe_allow_html=True)
                     if response_hist.status_code == 200:
-                        data_hist = response_hist.json().get("historial", [])
+                        body_hist = response_hist.json()
+                        data_hist = body_hist.get("historial", [])
 
                         if data_hist:
                             try:
+                                # Ya viene agregado, ordenado y tipado desde el backend
                                 df_hist = pd.DataFrame(data_hist)
-                                df_hist['fecha'] = pd.to_datetime(df_hist['fecha'])
-                                df_hist['cantidad_vendida'] = pd.to_numeric(df_hist['cantidad_vendida'])
-                                df_hist = df_hist.set_index('fecha').sort_index()
-                                
-                                st.line_chart(df_hist['cantidad_vendida'], use_container_width=True)
+                                df_hist['fecha'] = pd.to_datetime(df_hist['fecha'], format='%Y-%m-%d')
+                                st.line_chart(df_hist.set_index('fecha')['cantidad_vendida'], use_container_width=True)
+                                if body_hist.get("downsampled"):
+                                    st.caption(f"Mostrando {len(data_hist)} de {body_hist.get('puntos_totales')} puntos.")
                             
                             except Exception as e:
                                 st.error(f"Error al procesar o graficar el historial: {e}")
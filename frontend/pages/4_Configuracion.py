@@ -1,6 +1,8 @@
 import streamlit as st
 import sys
+import time
 import logging
+from collections import deque
 from pathlib import Path
 import requests
 
@@ -8,6 +10,8 @@ import requests
 root_path = Path(__file__).parent.parent.parent
 sys.path.append(str(root_path))
 
+from frontend.http_cache import cached_get
+
 # --- IMPORTACIÓN DE CONFIGURACIÓN ---
 try:
     from frontend.config import get_setting, update_setting, BASE_URL
@@ -48,9 +52,9 @@ URL_USERS_API = f"{BASE_URL}/api/v1/users"
 @st.cache_data(ttl=30)
 def fetch_users():
     try:
-        response = requests.get(URL_USERS_API, timeout=5)
+        response = requests.get(URL_USERS_API, params={"limit": 500}, timeout=5)
         if response.status_code == 200:
-            return response.json()
+            return response.json()["items"]
     except Exception as e:
         st.error(f"Error al obtener usuarios: {e}")
     return []
@@ -181,10 +185,21 @@ elif selected_tab == "📊 Umbrales de Alerta":
 
     @st.cache_data(ttl=60)
     def fetch_alert_configs():
+        # Todas las páginas (siguiendo next_cursor): el selector necesita el mapa completo SKU -> config
+        configs, cursor = [], None
         try:
-            response = requests.get(URL_ALERTS_CONFIG, headers=headers, timeout=5)
-            if response.status_code == 200:
-                return response.json()
+            while True:
+                params = {"limit": 500}
+                if cursor:
+                    params["cursor"] = cursor
+                response = cached_get(URL_ALERTS_CONFIG, params=params, headers=headers, timeout=5)
+                if response.status_code != 200:
+                    break
+                page = response.json()
+                configs.extend(page["items"])
+                cursor = page.get("next_cursor")
+                if not cursor:
+                    return configs
         except Exception as e:
             st.error(f"Error al obtener umbrales: {e}")
         return []
@@ -296,7 +311,6 @@ elif selected_tab == "⚠️ Reset BD":
 
     if confirm_reset_btn:
         log_box.info("⏳ Iniciando proceso de borrado...")
-        import time
         time.sleep(1)
         log_box.info("⏳ Borrando ventas...\n⏳ Borrando entrenamiento...")
         try:
@@ -367,11 +381,40 @@ elif selected_tab == "👥 Gestión de Usuarios":
 # ============================================================
 elif selected_tab == "🚀 Pipelines":
     st.markdown('<h2 style="color:#0F2942; font-size: 20px; border-bottom: 1px solid #E2E8F0; padding-bottom: 10px;">🚀 Control de Pipelines Automatizados</h2>', unsafe_allow_html=True)
-    st.markdown("Monitorea y controla los workers del sistema. Los procesos **persisten incluso si recargues la página**, porque corren de forma independiente del servidor web.")
+    st.markdown("Monitorea y controla los workers del sistema. Corren como jobs del planificador del backend y **persisten incluso si recargas la página**.")
 
     URL_PIPELINE_STATUS    = f"{BASE_URL}/api/v1/pipeline/status"
     URL_PIPELINE_START_ALL = f"{BASE_URL}/api/v1/pipeline/start-all"
     URL_PIPELINE_STOP_ALL  = f"{BASE_URL}/api/v1/pipeline/stop-all"
+    LOG_LIVE_SECONDS = 60  # Duración de cada sesión "En vivo" (la página queda ocupada mientras tanto)
+
+    def follow_worker_logs(wid, lines, offset, placeholder, max_lines):
+        """Consume el stream SSE del log desde 'offset' y va actualizando 'placeholder'."""
+        buffer = deque(lines, maxlen=max_lines)
+        deadline = time.monotonic() + LOG_LIVE_SECONDS
+        with requests.get(
+            f"{BASE_URL}/api/v1/pipeline/{wid}/logs/stream",
+            headers={"Last-Event-ID": str(offset)},
+            stream=True,
+            timeout=(5, 30)  # lectura > heartbeat del backend (15 s)
+        ) as r:
+            if r.status_code != 200:
+                st.warning(f"Vista en vivo no disponible: {r.json().get('error', r.text)}")
+                return
+            event = None
+            for raw in r.iter_lines(decode_unicode=True):
+                if raw.startswith("event:"):
+                    event = raw[len("event:"):].strip()
+                elif raw.startswith("data:"):
+                    data = raw[len("data:"):]
+                    if data.startswith(" "):
+                        data = data[1:]
+                    buffer.append("--- log rotado ---" if event == "rotated" else data)
+                    placeholder.code("\n".join(buffer), language="bash")
+                elif raw == "":
+                    event = None
+                if time.monotonic() > deadline:
+                    break
 
     WORKER_ICONS = {
         "worker_ingestion":  "📥",
@@ -394,6 +437,22 @@ elif selected_tab == "🚀 Pipelines":
         "worker_alerts":     3,
     }
 
+    RUN_STATE_LABELS = {
+        "running":     "⏳ en curso",
+        "success":     "✅ éxito",
+        "error":       "❌ error",
+        "skipped":     "⏭️ omitida",
+        "interrupted": "⚠️ interrumpida",
+    }
+
+    EVENT_LABELS = {
+        "file-uploaded":        "archivo cargado",
+        "file-approved":        "archivo aprobado",
+        "model-published":      "modelo publicado",
+        "inventory-updated":    "inventario actualizado",
+        "alert-config-updated": "configuración de alertas",
+    }
+
     # --- Carga del estado ---
     @st.cache_data(ttl=5)
     def fetch_pipeline_status():
@@ -449,18 +508,18 @@ elif selected_tab == "🚀 Pipelines":
         st.warning("⚠️ No se pudo obtener el estado de los pipelines. Verifica que el backend esté activo.")
     else:
         for worker in workers_status:
-            wid     = worker["id"]
-            label   = worker["label"]
-            running = worker["running"]
-            pid     = worker.get("pid")
-            icon    = WORKER_ICONS.get(wid, "🔧")
-            desc    = WORKER_DESCRIPTIONS.get(wid, "")
+            wid      = worker["id"]
+            label    = worker["label"]
+            running  = worker["enabled"]
+            last_run = worker.get("last_run")
+            icon     = WORKER_ICONS.get(wid, "🔧")
+            desc     = WORKER_DESCRIPTIONS.get(wid, "")
 
             # Badge de estado
             if running:
                 badge_color  = "#10B981"
                 badge_bg     = "#D1FAE5"
-                badge_text   = f"🟢 ACTIVO (PID {pid})"
+                badge_text   = "🟢 ACTIVO · ejecutando ahora" if worker.get("executing") else "🟢 ACTIVO"
                 border_color = "#10B981"
             else:
                 badge_color  = "#EF4444"
@@ -468,6 +527,23 @@ elif selected_tab == "🚀 Pipelines":
                 badge_text   = "🔴 DETENIDO"
                 border_color = "#EF4444"
 
+            # Última ejecución registrada en job_runs
+            if last_run:
+                duracion = f" en {last_run['duracion_s']:.1f} s" if last_run.get("duracion_s") is not None else ""
+                last_run_text = f"Última ejecución: {last_run['inicio'][:19]} · {RUN_STATE_LABELS.get(last_run['estado'], last_run['estado'])}{duracion}"
+                if last_run.get("mensaje"):
+                    last_run_text += f" — {last_run['mensaje']}"
+            else:
+                last_run_text = "Sin ejecuciones registradas."
+            event_driven = worker.get("trigger") == "events"
+            if event_driven:
+                triggers = ", ".join(EVENT_LABELS.get(t, t) for t in worker.get("triggers", []))
+                trigger_text = f"⚡ Se ejecuta ante: {triggers} (espera {worker.get('debounce_s', 0):.0f} s sin eventos nuevos)"
+            else:
+                trigger_text = f"⏱ Se ejecuta cada {worker.get('interval_minutes')} min"
+            if worker.get("next_run_in_s") is not None:
+                last_run_text += f" · Próxima en {worker['next_run_in_s']} s"
+
             # --- Card del worker ---
             st.markdown(f"""
             <div class="metric-card" style="padding: 16px 20px; border-left: 4px solid {border_color}; margin-bottom: 8px;">
@@ -481,15 +557,13 @@ elif selected_tab == "🚀 Pipelines":
                     </span>
                 </div>
                 <p style="color: #64748B; font-size: 13px; margin: 8px 0 0 0;">{desc}</p>
+                <p style="color: #94A3B8; font-size: 12px; margin: 4px 0 0 0;">{trigger_text}</p>
+                <p style="color: #94A3B8; font-size: 12px; margin: 4px 0 0 0;">{last_run_text}</p>
             </div>
             """, unsafe_allow_html=True)
 
-            # --- Obtener intervalo actual del backend ---
-            try:
-                r_iv = requests.get(f"{BASE_URL}/api/v1/pipeline/{wid}/interval", timeout=3)
-                current_minutes = r_iv.json().get("minutes", WORKER_DEFAULT_MINUTES.get(wid, 1)) if r_iv.status_code == 200 else WORKER_DEFAULT_MINUTES.get(wid, 1)
-            except Exception:
-                current_minutes = WORKER_DEFAULT_MINUTES.get(wid, 1)
+            # El estado ya trae el intervalo guardado (sin una petición extra por worker)
+            current_minutes = worker.get("interval_minutes") or WORKER_DEFAULT_MINUTES.get(wid, 1)
 
             # --- Fila de controles: Iniciar | Detener | Frecuencia | Guardar | Logs ---
             col_a, col_b, col_freq, col_save, col_logs = st.columns([1, 1, 1.4, 0.9, 1.6])
@@ -502,7 +576,7 @@ elif selected_tab == "🚀 Pipelines":
                                 r = requests.post(f"{BASE_URL}/api/v1/pipeline/{wid}/start", timeout=10)
                                 d = r.json()
                                 if r.status_code == 200:
-                                    st.toast(f"✅ {label} iniciado (PID {d.get('pid')})", icon="✅")
+                                    st.toast(f"✅ {label} iniciado", icon="✅")
                                 else:
                                     st.error(f"Error: {d.get('error', r.text)}")
                                 fetch_pipeline_status.clear()
@@ -538,12 +612,15 @@ elif selected_tab == "🚀 Pipelines":
                     value=int(current_minutes),
                     step=1,
                     key=f"freq_input_{wid}",
-                    help=f"Cada cuántos minutos se ejecuta. Valor actual guardado: {current_minutes} min. El cambio aplica al próximo ciclo sin reiniciar."
+                    disabled=event_driven,
+                    help=("Sin efecto: el backend corre en modo por eventos (PIPELINE_TRIGGER_MODE=events)."
+                          if event_driven else
+                          f"Cada cuántos minutos se ejecuta. Valor actual guardado: {current_minutes} min. El cambio aplica al próximo ciclo sin reiniciar.")
                 )
 
             with col_save:
                 st.markdown("<div style='height: 28px;'></div>", unsafe_allow_html=True)
-                if st.button("💾 Guardar", key=f"save_freq_{wid}", use_container_width=True):
+                if st.button("💾 Guardar", key=f"save_freq_{wid}", disabled=event_driven, use_container_width=True):
                     try:
                         r = requests.post(
                             f"{BASE_URL}/api/v1/pipeline/{wid}/interval",
@@ -587,22 +664,23 @@ elif selected_tab == "🚀 Pipelines":
                     )
                     if r.status_code == 200:
                         log_data = r.json()
-                        logs  = log_data.get("logs", [])
-                        total = log_data.get("total_lines", 0)
+                        logs    = log_data.get("logs", [])
+                        size_kb = log_data.get("size_bytes", 0) / 1024
 
                         st.markdown(f"""
                         <div style="background-color: #0F172A; border-radius: 8px; padding: 10px 16px;
                                     margin: 6px 0 4px 0; border: 1px solid #1E293B;">
                             <span style="color: #38BDF8; font-size: 12px; font-weight: 700;">
-                                📄 LOG: {wid} — Últimas {len(logs)} de {total} líneas
+                                📄 LOG: {wid} — Últimas {len(logs)} líneas ({size_kb:,.1f} KB)
                             </span>
                         </div>
                         """, unsafe_allow_html=True)
 
                         log_text = "\n".join(logs) if logs else "(Sin entradas de log aún)"
-                        st.code(log_text, language="bash")
+                        log_placeholder = st.empty()
+                        log_placeholder.code(log_text, language="bash")
 
-                        c_ref, c_more = st.columns([1, 1])
+                        c_ref, c_more, c_live = st.columns([1, 1, 1])
                         with c_ref:
                             if st.button("🔄 Actualizar Logs", key=f"refresh_log_{wid}", use_container_width=True):
                                 st.rerun()
@@ -610,14 +688,41 @@ elif selected_tab == "🚀 Pipelines":
                             if st.button("⬇️ Cargar más", key=f"more_log_{wid}", use_container_width=True):
                                 st.session_state[log_lines_key] += 40
                                 st.rerun()
+                        with c_live:
+                            live = st.button(f"🔴 En vivo ({LOG_LIVE_SECONDS} s)", key=f"live_log_{wid}", use_container_width=True)
+                        if live:
+                            follow_worker_logs(
+                                wid, logs, log_data.get("offset", 0), log_placeholder,
+                                max_lines=st.session_state[log_lines_key]
+                            )
                     else:
                         st.error(f"Error al obtener logs: {r.json().get('error', r.text)}")
                 except Exception as e:
                     st.error(f"Error de conexión al leer logs: {e}")
 
+            with st.expander("📜 Historial de ejecuciones"):
+                try:
+                    r_runs = requests.get(f"{BASE_URL}/api/v1/pipeline/{wid}/runs", params={"limit": 20}, timeout=5)
+                    runs = r_runs.json().get("items", []) if r_runs.status_code == 200 else []
+                    if runs:
+                        st.dataframe(
+                            [{
+                                "Inicio": run["inicio"][:19],
+                                "Estado": RUN_STATE_LABELS.get(run["estado"], run["estado"]),
+                                "Duración (s)": round(run["duracion_s"], 1) if run.get("duracion_s") is not None else None,
+                                "Mensaje": run.get("mensaje") or "",
+                            } for run in runs],
+                            use_container_width=True, hide_index=True
+                        )
+                    else:
+                        st.caption("Sin ejecuciones registradas.")
+                except Exception as e:
+                    st.error(f"Error de conexión al leer el historial: {e}")
+
             st.markdown("<hr style='margin: 10px 0; border-color: #E2E8F0;'>", unsafe_allow_html=True)
 
     # --- Notas informativas ---
     st.markdown("<div style='height: 8px;'></div>", unsafe_allow_html=True)
-    st.info("💡 **Persistencia:** Los workers usan `os.setsid()` para correr en su propio grupo de procesos, independiente del servidor web. Recargar la página con Ctrl+R **no los detiene**.")
-    st.info("⏱ **Frecuencia:** El nuevo valor aplica al **próximo ciclo de espera** del worker, sin necesidad de reiniciarlo. El worker lee el archivo de configuración al final de cada tarea.")
\ No newline at end of file
+    st.info("💡 **Persistencia:** Los workers son jobs del planificador del backend; su estado (activo / detenido) se guarda en la base de datos. Recargar la página o reiniciar el backend **no los detiene**.")
+    st.info("⚡ **Por eventos:** Cada etapa se ejecuta cuando la anterior publica su resultado (archivo cargado → aprobado → modelo publicado → métricas y alertas), agrupando ráfagas de eventos en una sola ejecución. La frecuencia solo aplica con `PIPELINE_TRIGGER_MODE=interval`.")
+    st.info("⏱ **Frecuencia:** El nuevo valor aplica al **próximo ciclo** del worker, sin necesidad de reiniciarlo. Si una ejecución dura más que el intervalo, los turnos intermedios se omiten en lugar de acumularse.")
\ No newline at end of file
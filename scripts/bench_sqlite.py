@@ -0,0 +1,89 @@
+"""
+Benchmark de la capa de datos sobre una base SQLite embebida (sin PostgreSQL).
+
+Mide en una sola máquina el camino completo: ingesta de ventas -> aprobación ->
+lectura para entrenamiento -> carga de inventario -> evaluación de alertas.
+
+Uso:
+    python scripts/bench_sqlite.py [--filas 200000] [--skus 500] [--db /tmp/bench.db]
+"""
+import sys
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark del backend sobre SQLite.")
+    parser.add_argument("--filas", type=int, default=200_000, help="Filas de ventas sintéticas.")
+    parser.add_argument("--skus", type=int, default=500, help="Cantidad de SKUs distintos.")
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "bench_teo.db"),
+                        help="Archivo SQLite (se recrea en cada corrida).")
+    return parser.parse_args()
+
+
+def _synthetic_sales(filas: int, skus: int) -> pd.DataFrame:
+    rng = np.random.default_rng(42)
+    fechas = pd.Timestamp.today().normalize() - pd.to_timedelta(rng.integers(0, 365, filas), unit="D")
+    return pd.DataFrame({
+        'SKU': np.char.add("SKU-", rng.integers(0, skus, filas).astype(str)),
+        'Fecha Venta': fechas,
+        'Cantidad': rng.integers(1, 50, filas),
+    })
+
+
+def _timed(label: str, fn, *args, **kwargs):
+    inicio = time.perf_counter()
+    result = fn(*args, **kwargs)
+    print(f"{label:<28} {time.perf_counter() - inicio:8.3f} s")
+    return result
+
+
+def main():
+    args = _parse_args()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(args.db + suffix):
+            os.remove(args.db + suffix)
+    # Debe fijarse antes de importar db_utils (lee DATABASE_URI al importar)
+    os.environ["DATABASE_URI"] = f"sqlite:///{args.db}"
+
+    from backend.database.db_utils import (
+        get_db_engine_and_init, update_file_status, upsert_inventory_data
+    )
+    from backend.services.ingestion_service import ingest_dataframe_to_db
+    from backend.ml_core.training import load_data_from_db
+    from backend.services.alert_service import AlertEvaluator
+
+    engine = get_db_engine_and_init()
+    if engine is None:
+        print("Error: No se pudo crear la base SQLite.")
+        sys.exit(1)
+
+    df_ventas = _synthetic_sales(args.filas, args.skus)
+    print(f"Base: {args.db} | {args.filas} filas, {args.skus} SKUs\n")
+
+    success, msg, _ = _timed("ingesta ventas", ingest_dataframe_to_db, df_ventas, "bench.csv", engine)
+    if not success:
+        print(f"Error en la ingesta: {msg}")
+        sys.exit(1)
+    _timed("aprobación", update_file_status, 1, 'aprobado', engine)
+    df_train, _ = _timed("lectura entrenamiento", load_data_from_db)
+    print(f"{'':<28} {len(df_train)} filas leídas")
+
+    df_stock = pd.DataFrame({
+        'id_producto': [f"SKU-{i}" for i in range(args.skus)],
+        'stock_actual': np.random.default_rng(7).integers(0, 500, args.skus),
+        'stock_seguridad': 20,
+    })
+    _timed("upsert inventario", upsert_inventory_data, df_stock, engine)
+    alertas = _timed("evaluación alertas", AlertEvaluator(engine).evaluate)
+    print(f"{'':<28} {len(alertas)} alertas")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,46 +7,26 @@ CLEANUP_ON_START=true
 
 # Directorios
 SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
-PID_DIR="$SCRIPT_DIR/pids"
 LOG_DIR="$SCRIPT_DIR/logs"
 
-# Crear directorios necesarios
-mkdir -p "$PID_DIR"
-mkdir -p "$LOG_DIR"
-
-start_worker() {
-    local script_name=$1
-    local pid_file="$PID_DIR/$script_name.pid"
-
-    if [ -f "$pid_file" ]; then
-        if kill -0 $(cat "$pid_file") 2>/dev/null; then
-            echo "⚠️  $script_name ya está corriendo (PID: $(cat $pid_file))."
-            return
-        else
-            rm "$pid_file"
-        fi
-    fi
+# Los jobs corren en el planificador del backend: este script solo los activa
+# o detiene a través de la API (el backend debe estar levantado).
+API_BASE="${API_BASE:-http://127.0.0.1:5000}/api/v1/pipeline"
 
-    echo "🚀 Iniciando $script_name..."
-    nohup "$SCRIPT_DIR/$script_name" > /dev/null 2>&1 &
-    echo $! > "$pid_file"
-    echo "   ✅ Iniciado con PID $(cat $pid_file)"
-}
-
-stop_worker() {
-    local script_name=$1
-    local pid_file="$PID_DIR/$script_name.pid"
+mkdir -p "$LOG_DIR"
 
-    if [ -f "$pid_file" ]; then
-        local pid=$(cat "$pid_file")
-        echo "🛑 Deteniendo $script_name (PID: $pid)..."
-        pkill -P $pid 2>/dev/null
-        kill $pid 2>/dev/null
-        rm "$pid_file"
-        echo "   ✅ Detenido."
-    else
-        echo "⚠️  $script_name no parece estar corriendo."
+pipeline_call() {
+    local method=$1
+    local path=$2
+    local response
+    response=$(curl -s -w "\n%{http_code}" -X "$method" "$API_BASE/$path")
+    local code=${response##*$'\n'}
+    local body=${response%$'\n'*}
+    if [ "$code" != "200" ]; then
+        echo "   ❌ Error HTTP $code: $body"
+        return 1
     fi
+    echo "$body"
 }
 
 case "$1" in
@@ -76,32 +56,22 @@ case "$1" in
         fi
         echo "------------------------------------------"
 
-        # --- FASE 1: WORKERS ---
-        start_worker "worker_ingestion.sh"
-        start_worker "worker_retraining.sh"
-        start_worker "worker_metrics.sh"
-        start_worker "worker_alerts.sh"
+        # --- FASE 1: JOBS ---
+        echo "🚀 Activando los jobs del planificador..."
+        pipeline_call POST start-all || exit 1
         echo "=========================================="
         ;;
     stop)
         echo "=========================================="
         echo "   APAGANDO PIPELINE AUTOMATIZADO"
         echo "=========================================="
-        stop_worker "worker_ingestion.sh"
-        stop_worker "worker_retraining.sh"
-        stop_worker "worker_metrics.sh"
-        stop_worker "worker_alerts.sh"
+        pipeline_call POST stop-all || exit 1
+        echo "   (Las ejecuciones en curso terminan normalmente.)"
         echo "=========================================="
         ;;
     status)
         echo "Estado del Pipeline (Cleanup Flag: $CLEANUP_ON_START):"
-        for script in "worker_ingestion.sh" "worker_retraining.sh" "worker_metrics.sh" "worker_alerts.sh"; do
-            if [ -f "$PID_DIR/$script.pid" ] && kill -0 $(cat "$PID_DIR/$script.pid") 2>/dev/null; then
-                echo "🟢 $script: CORRIENDO (PID $(cat $PID_DIR/$script.pid))"
-            else
-                echo "🔴 $script: DETENIDO"
-            fi
-        done
+        pipeline_call GET status || exit 1
         ;;
     *)
         echo "Uso: $0 {start|stop|status}"
@@ -11,11 +11,13 @@ LOG_FILE="$LOGS_DIR/cleanup.log"
 # --- CORRECCIÓN CRÍTICA: Apuntar al Python del Entorno Virtual ---
 PYTHON_EXEC="$PROJECT_ROOT/venv/bin/python"
 
-# 0. Borrar Logs Antiguos (NUEVO)
-# Limpiamos la carpeta de logs antes de generar el nuevo reporte
+# 0. Vaciar Logs Antiguos
+# Los logs de los jobs los mantiene abiertos el planificador del backend: se
+# truncan en lugar de borrarse (borrarlos dejaría al backend escribiendo en un
+# archivo ya desvinculado). Las copias rotadas (.log.N) sí se eliminan.
 if [ -d "$LOGS_DIR" ]; then
-    # Borra todo el contenido dentro de logs/ (archivos .log anteriores)
-    rm -rf "$LOGS_DIR"/*
+    find "$LOGS_DIR" -type f -name '*.log.[0-9]*' -delete
+    find "$LOGS_DIR" -type f -name '*.log' -exec truncate -s 0 {} +
 fi
 
 # Asegurar directorio de logs (se recrea si no existe)
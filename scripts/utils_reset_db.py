@@ -1,9 +1,9 @@
 import sys
 import os
-from sqlalchemy import text
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from backend.database.db_utils import get_db_engine
+from backend.database.dialects import get_dialect
 
 def reset_tables():
     """Trunca las tablas del sistema (Versión PostgreSQL)."""
@@ -19,13 +19,17 @@ def reset_tables():
             # --- CAMBIO CRÍTICO: Sintaxis PostgreSQL ---
             # Usamos CASCADE para borrar datos dependientes y RESTART IDENTITY para los IDs
             # <-- CAMBIO: Nombre de tabla actualizado a 'ventas_detalle'
-            conn.execute(text("TRUNCATE TABLE ventas_detalle RESTART IDENTITY CASCADE;"))
+            # TRUNCATE ... RESTART IDENTITY CASCADE en PostgreSQL (DELETE en SQLite)
+            get_dialect(conn).truncate(conn, ["ventas_detalle", "ventas_diarias"])
+            # El hash de contenido de archivos_cargados decide si una carga se acepta:
+            # sin vaciarlo, volver a subir los mismos archivos daría 409 "ya cargado"
+            get_dialect(conn).truncate(conn, ["archivos_cargados"])
             
             # Nota: 'entrenamiento' se crea automáticamente al entrenar, 
             # pero si existe, la limpiamos. Usamos un bloque try/except por si no existe aún.
             try:
                 # <-- CAMBIO: Nombre de tabla actualizado a 'entrenamiento'
-                conn.execute(text("TRUNCATE TABLE entrenamiento RESTART IDENTITY CASCADE;"))
+                get_dialect(conn).truncate(conn, ["entrenamiento"])
             except Exception:
                 print("ℹ️  Tabla entrenamiento no existía (no pasa nada).")
 
@@ -0,0 +1,231 @@
+import datetime
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+sqlalchemy = pytest.importorskip("sqlalchemy")
+
+from backend.database.dialects import SQLITE_ENGINE_KWARGS, configure_sqlite_engine, create_sqlite_schema
+from backend.services import history_service
+from backend.services.history_service import lttb_indices, get_product_history, MIN_POINTS
+
+
+# --- Historial: LTTB y tope de puntos ---
+
+@pytest.fixture
+def sqlite_engine(tmp_path):
+    engine = sqlalchemy.create_engine(f"sqlite:///{tmp_path / 'test.db'}", **SQLITE_ENGINE_KWARGS)
+    configure_sqlite_engine(engine)
+    create_sqlite_schema(engine)
+    yield engine
+    engine.dispose()
+
+
+def _insert_daily_sales(engine, sku, start, unidades):
+    rows = [{"sku": sku, "fecha": start + datetime.timedelta(days=i), "u": int(u)} for i, u in enumerate(unidades)]
+    with engine.begin() as conn:
+        conn.execute(sqlalchemy.text(
+            "INSERT INTO ventas_diarias (id_producto, fecha, unidades, lineas) VALUES (:sku, :fecha, :u, 1)"
+        ), rows)
+
+
+@pytest.mark.parametrize("n, n_out", [(10, 3), (100, 7), (1000, 50), (1001, 999), (5, 4)])
+def test_lttb_length_order_and_endpoints(n, n_out):
+    rng = np.random.default_rng(n)
+    x = np.arange(n)
+    y = rng.integers(0, 100, n)
+    idx = lttb_indices(x, y, n_out)
+    assert len(idx) == n_out
+    assert idx[0] == 0 and idx[-1] == n - 1
+    assert np.all(np.diff(idx) > 0)
+
+
+@pytest.mark.parametrize("n_out", [0, 1, MIN_POINTS - 1, 10, 11])
+def test_lttb_returns_everything_when_no_reduction_is_possible(n_out):
+    x = np.arange(10)
+    idx = lttb_indices(x, x * 2, n_out)
+    assert list(idx) == list(range(10))
+
+
+def test_lttb_keeps_the_peak():
+    y = np.zeros(500)
+    y[321] = 1000
+    idx = lttb_indices(np.arange(500), y, 20)
+    assert 321 in idx
+
+
+def test_history_is_not_downsampled_under_the_limit(sqlite_engine):
+    _insert_daily_sales(sqlite_engine, "SKU1", datetime.date(2024, 1, 1), [1, 2, 3, 4, 5])
+    ok, _, data = get_product_history("SKU1", datetime.date(2024, 1, 1), datetime.date(2024, 12, 31),
+                                      max_points=10, engine=sqlite_engine)
+    assert ok
+    assert data["puntos_totales"] == 5
+    assert not data["downsampled"]
+    assert [p["cantidad_vendida"] for p in data["historial"]] == [1, 2, 3, 4, 5]
+
+
+def test_history_max_points_downsamples_with_endpoints(sqlite_engine):
+    _insert_daily_sales(sqlite_engine, "SKU1", datetime.date(2024, 1, 1), range(1, 101))
+    ok, _, data = get_product_history("SKU1", datetime.date(2024, 1, 1), datetime.date(2024, 12, 31),
+                                      max_points=10, engine=sqlite_engine)
+    assert ok
+    fechas = [p["fecha"] for p in data["historial"]]
+    assert len(fechas) == 10
+    assert data["puntos_totales"] == 100 and data["downsampled"]
+    assert fechas[0] == "2024-01-01" and fechas[-1] == "2024-04-09"
+    assert fechas == sorted(set(fechas))
+
+
+def test_history_max_points_is_clamped_to_the_global_cap(sqlite_engine, monkeypatch):
+    monkeypatch.setattr(history_service, "HISTORY_MAX_POINTS", 20)
+    _insert_daily_sales(sqlite_engine, "SKU1", datetime.date(2024, 1, 1), range(1, 101))
+    ok, _, data = get_product_history("SKU1", datetime.date(2024, 1, 1), datetime.date(2024, 12, 31),
+                                      max_points=500, engine=sqlite_engine)
+    assert ok
+    assert len(data["historial"]) == 20
+
+
+def test_history_tiny_max_points_keeps_the_lttb_minimum(sqlite_engine):
+    _insert_daily_sales(sqlite_engine, "SKU1", datetime.date(2024, 1, 1), range(1, 101))
+    ok, _, data = get_product_history("SKU1", datetime.date(2024, 1, 1), datetime.date(2024, 12, 31),
+                                      max_points=1, engine=sqlite_engine)
+    assert ok
+    assert len(data["historial"]) == MIN_POINTS
+
+
+# --- Ingesta CSV: fechas día-primero con y sin relectura como texto ---
+
+@pytest.mark.parametrize("cantidad_extra", ["4", "cuatro"])
+def test_csv_dates_are_day_first_on_both_read_paths(tmp_path, cantidad_extra):
+    pytest.importorskip("pyarrow")
+    from backend.services.ingestion_service import read_sales_file, validate_and_transform_df
+
+    path = tmp_path / "ventas.csv"
+    # 'cuatro' no encaja en int64: Arrow falla y el archivo se relee como texto
+    path.write_text(
+        "SKU,Fecha Venta,Cantidad\n"
+        "A1,05/01/2024,3\n"
+        "A2,13-02-2024,2\n"
+        "A3,2024-03-07,1\n"
+        f"A4,06/01/2024,{cantidad_extra}\n"
+    )
+    df_clean, msg, _ = validate_and_transform_df(read_sales_file(str(path), "ventas.csv"), "ventas.csv")
+    assert msg == "Success"
+    fechas = dict(zip(df_clean['id_producto'], df_clean['fecha'].dt.strftime('%Y-%m-%d')))
+    assert fechas["A1"] == "2024-01-05"
+    assert fechas["A2"] == "2024-02-13"
+    assert fechas["A3"] == "2024-03-07"
+    if cantidad_extra == "4":
+        assert fechas["A4"] == "2024-01-06"
+    else:
+        assert "A4" not in fechas
+
+
+# --- Borrado de archivos: sus filas y huellas no bloquean una nueva carga ---
+
+def _sales_frame():
+    import pandas as pd
+    return pd.DataFrame({
+        'SKU': ['A1', 'A1', 'B2'],
+        'Fecha Venta': ['2024-01-05', '2024-01-05', '2024-01-06'],
+        'Cantidad': [3, 2, 7],
+    })
+
+
+def _daily_sales(engine):
+    with engine.connect() as conn:
+        return sorted(tuple(r) for r in conn.execute(sqlalchemy.text(
+            "SELECT id_producto, CAST(fecha AS TEXT), unidades, lineas FROM ventas_diarias"
+        )))
+
+
+def test_deleted_file_can_be_loaded_again(sqlite_engine):
+    from backend.database.db_utils import delete_uploaded_file
+    from backend.services.ingestion_service import ingest_dataframe_to_db
+
+    ok, _, filas = ingest_dataframe_to_db(_sales_frame(), "ventas.csv", engine=sqlite_engine)
+    assert ok and filas == 3
+    assert _daily_sales(sqlite_engine) == [("A1", "2024-01-05", 5, 2), ("B2", "2024-01-06", 7, 1)]
+
+    with sqlite_engine.connect() as conn:
+        archivo_id = conn.execute(sqlalchemy.text("SELECT id FROM archivos_cargados")).scalar()
+    assert delete_uploaded_file(archivo_id, engine=sqlite_engine)
+    assert _daily_sales(sqlite_engine) == []
+
+    ok, _, filas = ingest_dataframe_to_db(_sales_frame(), "ventas.csv", engine=sqlite_engine)
+    assert ok and filas == 3
+    assert _daily_sales(sqlite_engine) == [("A1", "2024-01-05", 5, 2), ("B2", "2024-01-06", 7, 1)]
+
+
+def test_deleting_a_file_keeps_other_files_rows(sqlite_engine):
+    import pandas as pd
+    from backend.database.db_utils import delete_uploaded_file
+    from backend.services.ingestion_service import ingest_dataframe_to_db
+
+    otro = pd.DataFrame({'SKU': ['A1'], 'Fecha Venta': ['2024-01-05'], 'Cantidad': [10]})
+    assert ingest_dataframe_to_db(otro, "otro.csv", engine=sqlite_engine)[0]
+    assert ingest_dataframe_to_db(_sales_frame(), "ventas.csv", engine=sqlite_engine)[0]
+    with sqlite_engine.connect() as conn:
+        archivo_id = conn.execute(sqlalchemy.text(
+            "SELECT id FROM archivos_cargados WHERE nombre_archivo = 'ventas.csv'"
+        )).scalar()
+    assert delete_uploaded_file(archivo_id, engine=sqlite_engine)
+    assert _daily_sales(sqlite_engine) == [("A1", "2024-01-05", 10, 1)]
+
+
+# --- Huellas por archivo (ingesta) y por carga histórica (backfill de v12) ---
+
+def test_fingerprints_count_occurrences_per_batch():
+    import pandas as pd
+    pytest.importorskip("pyarrow")
+    from backend.services.ingestion_service import add_row_fingerprints
+
+    fila = {'id_producto': 'A1', 'fecha': pd.Timestamp('2024-01-05'), 'cantidad_vendida': 3}
+    df = pd.DataFrame([{**fila, 'fecha_carga': 1}, {**fila, 'fecha_carga': 1},
+                       {**fila, 'fecha_carga': 2}, {**fila, 'fecha_carga': 2}])
+    por_carga = add_row_fingerprints(df, lote='fecha_carga')['fingerprint'].tolist()
+    # Repetición dentro de una carga: huellas distintas; la misma carga dos veces: colisiona
+    assert por_carga[0] != por_carga[1]
+    assert por_carga[:2] == por_carga[2:]
+    # Y coincide con la huella de ese mismo archivo cargado hoy
+    un_archivo = add_row_fingerprints(df[df['fecha_carga'] == 2].drop(columns='fecha_carga'))
+    assert un_archivo['fingerprint'].tolist() == por_carga[2:]
+
+
+# --- Alertas: un refresco no mueve la alerta entre páginas ---
+
+def test_alert_refresh_keeps_keyset_position(sqlite_engine):
+    from backend.database.db_utils import bulk_upsert_alerts, get_active_alerts
+    from backend.database.pagination import decode_cursor
+
+    alertas = [{"sku": f"SKU{i}", "tipo_alerta": "STOCK_BAJO", "mensaje": "m", "fecha_proyeccion": "2024-02-01"}
+               for i in range(4)]
+    assert bulk_upsert_alerts(alertas, sqlite_engine) == (4, 0)
+    with sqlite_engine.begin() as conn:
+        conn.execute(sqlalchemy.text("UPDATE alertas_inventario SET creado_en = '2024-01-01 00:00:00'"))
+
+    pagina, cursor = get_active_alerts(sqlite_engine, limit=2)
+    # Una evaluación refresca una alerta de la página siguiente mientras se pagina
+    vistas = {a["sku"] for a in pagina}
+    pendiente = next(a["sku"] for a in alertas if a["sku"] not in vistas)
+    assert bulk_upsert_alerts([{**alertas[0], "sku": pendiente, "mensaje": "nuevo"}], sqlite_engine) == (0, 1)
+
+    resto, _ = get_active_alerts(sqlite_engine, limit=2, after=decode_cursor(cursor))
+    assert vistas | {a["sku"] for a in resto} == {a["sku"] for a in alertas}
+    refrescada = next(a for a in resto if a["sku"] == pendiente)
+    assert refrescada["mensaje"] == "nuevo"
+    assert refrescada["creado_en"].startswith("2024-01-01")
+    assert refrescada["actualizado_en"] > refrescada["creado_en"]
+
+
+def test_rejected_rows_report_the_file_line_number():
+    import pandas as pd
+    from backend.services.ingestion_service import validate_and_transform_df
+
+    df = pd.DataFrame({'SKU': ['A1', 'A2', 'A3'], 'Fecha Venta': ['2024-01-05', 'no', '2024-01-06'],
+                       'Cantidad': [1, 2, 0.5]})
+    _, _, rechazadas = validate_and_transform_df(df, "ventas.csv")
+    # Cabecera en la línea 1: la segunda fila de datos está en la línea 3
+    assert rechazadas['fila'].tolist() == [3, 4]
+    assert rechazadas['motivo'].tolist() == ['fecha_invalida', 'cantidad_no_positiva']
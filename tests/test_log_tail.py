@@ -0,0 +1,137 @@
+import os
+
+import pytest
+
+from backend.services.log_tail import tail_lines, follow
+
+
+def _write(path, data, mode="ab"):
+    with open(path, mode) as f:
+        f.write(data)
+
+
+def _next_event(events):
+    """Siguiente evento de follow() que no sea 'idle'."""
+    for event in events:
+        if event[0] != "idle":
+            return event
+    pytest.fail("follow() terminó sin emitir eventos")
+
+
+def _follow(path, offset=0):
+    return follow(str(path), offset, poll_interval=0.01, max_seconds=5)
+
+
+# --- tail_lines: lectura hacia atrás por bloques ---
+
+@pytest.mark.parametrize("block_size", [1, 3, 4, 7, 8192])
+def test_tail_lines_across_block_boundaries(tmp_path, block_size):
+    path = tmp_path / "job.log"
+    lines = [f"linea {i} " + "x" * i for i in range(20)]
+    _write(path, ("\n".join(lines) + "\n").encode())
+    tail, end = tail_lines(str(path), 5, block_size=block_size)
+    assert tail == lines[-5:]
+    assert end == path.stat().st_size
+
+
+def test_tail_lines_without_trailing_newline(tmp_path):
+    path = tmp_path / "job.log"
+    _write(path, b"uno\ndos\ntres")
+    assert tail_lines(str(path), 2, block_size=2) == (["dos", "tres"], 12)
+
+
+def test_tail_lines_n_larger_than_file(tmp_path):
+    path = tmp_path / "job.log"
+    _write(path, b"uno\r\ndos\n")
+    assert tail_lines(str(path), 100, block_size=3) == (["uno", "dos"], 9)
+
+
+def test_tail_lines_empty_file_and_zero_lines(tmp_path):
+    path = tmp_path / "job.log"
+    _write(path, b"")
+    assert tail_lines(str(path), 10) == ([], 0)
+    _write(path, b"uno\n")
+    assert tail_lines(str(path), 0) == ([], 4)
+
+
+# --- follow: offsets, líneas parciales y rotación ---
+
+def test_follow_resumes_from_offset(tmp_path):
+    path = tmp_path / "job.log"
+    _write(path, b"a\nbb\nccc\n")
+    events = _follow(path, offset=2)
+    assert _next_event(events) == ("line", 5, "bb")
+    assert _next_event(events) == ("line", 9, "ccc")
+    events.close()
+
+
+def test_follow_offsets_resume_without_duplicates(tmp_path):
+    path = tmp_path / "job.log"
+    _write(path, b"uno\ndos\n")
+    events = _follow(path)
+    _, offset, _ = _next_event(events)
+    events.close()
+
+    events = _follow(path, offset)
+    assert _next_event(events) == ("line", 8, "dos")
+    events.close()
+
+
+def test_follow_waits_for_partial_line(tmp_path):
+    path = tmp_path / "job.log"
+    _write(path, b"uno\nparc")
+    events = _follow(path)
+    assert _next_event(events) == ("line", 4, "uno")
+    assert next(events)[0] == "idle"  # "parc" no se publica hasta completar la línea
+
+    _write(path, b"ial\ndos\n")
+    assert _next_event(events) == ("line", 12, "parcial")
+    assert _next_event(events) == ("line", 16, "dos")
+    events.close()
+
+
+def test_follow_detects_rotation_by_inode(tmp_path):
+    path = tmp_path / "job.log"
+    _write(path, b"viejo 1\nviejo 2\n")
+    events = _follow(path)
+    assert _next_event(events)[2] == "viejo 1"
+    assert _next_event(events)[2] == "viejo 2"
+
+    # Como RotatingFileHandler: renombra a .1 y abre un archivo nuevo, más largo que el offset
+    os.rename(path, tmp_path / "job.log.1")
+    _write(path, b"nuevo 1 con texto largo\nnuevo 2\n", mode="wb")
+    assert _next_event(events) == ("rotated", 0, None)
+    assert _next_event(events) == ("line", 24, "nuevo 1 con texto largo")
+    assert _next_event(events) == ("line", 32, "nuevo 2")
+    events.close()
+
+
+def test_follow_detects_truncation(tmp_path):
+    path = tmp_path / "job.log"
+    _write(path, b"linea larga 1\nlinea larga 2\n")
+    events = _follow(path)
+    _next_event(events)
+    _next_event(events)
+
+    _write(path, b"corta\n", mode="wb")
+    assert _next_event(events) == ("rotated", 0, None)
+    assert _next_event(events) == ("line", 6, "corta")
+    events.close()
+
+
+def test_follow_offset_past_end_restarts_from_beginning(tmp_path):
+    # Last-Event-ID de un log que ya rotó: se lee el archivo actual desde el inicio, sin 'rotated'
+    path = tmp_path / "job.log"
+    _write(path, b"uno\n")
+    events = _follow(path, offset=1000)
+    assert _next_event(events) == ("line", 4, "uno")
+    events.close()
+
+
+def test_follow_waits_for_missing_file(tmp_path):
+    path = tmp_path / "job.log"
+    events = _follow(path)
+    assert next(events) == ("idle", 0, None)
+    _write(path, b"uno\n")
+    assert _next_event(events) == ("line", 4, "uno")
+    events.close()
@@ -0,0 +1,144 @@
+from collections import namedtuple
+
+import pytest
+
+# El planificador importa el backend completo (Flask, BD y los modelos de ML)
+for module in ("flask", "sqlalchemy", "pandas", "sklearn", "joblib", "tensorflow", "xgboost"):
+    pytest.importorskip(module)
+
+from backend.services import scheduler
+from backend.services.scheduler import Scheduler, ScheduledJob
+
+Event = namedtuple("Event", "id tipo")
+
+
+@pytest.fixture(autouse=True)
+def events_mode(monkeypatch):
+    monkeypatch.setattr(scheduler, "PIPELINE_TRIGGER_MODE", "events")
+    monkeypatch.setattr(scheduler, "PIPELINE_DEBOUNCE_MAX_FACTOR", 3)
+
+
+@pytest.fixture
+def job():
+    return ScheduledJob("worker_test", "Test", "test.log", lambda: (True, "ok"),
+                        triggers=("file-approved",), debounce=10)
+
+
+@pytest.fixture
+def sched(job):
+    return Scheduler([job], max_workers=1)
+
+
+def _armed(sched, job, now=0.0):
+    """Activa el job y consume su ejecución de puesta al día."""
+    assert sched._due_on_events(job, set(), now)
+    return job
+
+
+# --- _due_on_events: debounce, tope y ejecución de seguimiento ---
+
+def test_catch_up_run_when_armed(sched, job):
+    assert sched._due_on_events(job, set(), 0.0)
+    assert job.armed and job.pending_since is None
+    assert not sched._due_on_events(job, set(), 1.0)
+
+
+def test_unrelated_events_do_not_trigger(sched, job):
+    _armed(sched, job)
+    assert not sched._due_on_events(job, {"inventory-updated"}, 100.0)
+    assert job.next_run is None
+
+
+def test_debounce_waits_for_quiet_period(sched, job):
+    _armed(sched, job)
+    assert not sched._due_on_events(job, {"file-approved"}, 100.0)
+    assert not sched._due_on_events(job, {"file-approved"}, 105.0)
+    assert not sched._due_on_events(job, set(), 114.0)
+    assert job.next_run == 115.0
+    assert sched._due_on_events(job, set(), 115.0)
+    assert job.pending_since is None and job.next_run is None
+
+
+def test_debounce_is_capped_by_max_factor(sched, job):
+    _armed(sched, job)
+    # Un evento cada 5 s nunca deja 10 s de calma: el tope es 3 * 10 s desde el primero
+    for now in range(100, 130, 5):
+        assert not sched._due_on_events(job, {"file-approved"}, float(now))
+    assert sched._due_on_events(job, {"file-approved"}, 130.0)
+
+
+def test_events_during_a_run_trigger_a_follow_up(sched, job):
+    _armed(sched, job)
+    job.running = True
+    assert not sched._due_on_events(job, {"file-approved"}, 100.0)
+    assert not sched._due_on_events(job, set(), 200.0)
+    assert job.pending_since == 100.0
+
+    job.running = False
+    assert sched._due_on_events(job, set(), 201.0)
+    assert not sched._due_on_events(job, set(), 300.0)
+
+
+def test_skipped_run_is_retried_after_debounce(sched, job, monkeypatch):
+    monkeypatch.setattr(scheduler, "record_job_skip", lambda *args: None)
+    _armed(sched, job)
+    sched._skip(job, "Omitido: ocupado.")
+    assert job.pending_since is not None
+    assert not sched._due_on_events(job, set(), job.last_event + 9)
+    assert sched._due_on_events(job, set(), job.last_event + 10)
+
+
+# --- _poll_events: huecos del outbox ---
+
+def _fake_outbox(monkeypatch, *responses):
+    calls = []
+    responses = list(responses)
+
+    def fetch(after_id, limit=1000, also_ids=(), engine=None):
+        calls.append((after_id, tuple(sorted(also_ids))))
+        return responses.pop(0) if responses else []
+
+    monkeypatch.setattr(scheduler, "fetch_pipeline_events", fetch)
+    return calls
+
+
+def test_poll_reads_new_events(sched, monkeypatch):
+    calls = _fake_outbox(monkeypatch, [Event(10, "file-uploaded"), Event(11, "file-approved")])
+    sched._last_event_id = 9
+    assert sched._poll_events() == {"file-uploaded", "file-approved"}
+    assert sched._last_event_id == 11
+    assert sched._event_gaps == {}
+    assert sched._poll_events() == set()
+    assert calls == [(9, ()), (11, ())]
+
+
+def test_poll_picks_up_events_committed_out_of_order(sched, monkeypatch):
+    # Id 10 (subida) confirma después que el 11 (inventario)
+    calls = _fake_outbox(monkeypatch, [Event(11, "inventory-updated")], [Event(10, "file-uploaded")], [])
+    sched._last_event_id = 9
+    assert sched._poll_events() == {"inventory-updated"}
+    assert sched._last_event_id == 11
+    assert set(sched._event_gaps) == {10}
+
+    assert sched._poll_events() == {"file-uploaded"}
+    assert sched._last_event_id == 11
+    assert sched._event_gaps == {}
+
+    sched._poll_events()
+    assert calls == [(9, ()), (11, (10,)), (11, ())]
+
+
+def test_poll_forgets_gaps_after_timeout(sched, monkeypatch):
+    _fake_outbox(monkeypatch)
+    sched._last_event_id = 11
+    sched._event_gaps = {10: scheduler.time.monotonic() - scheduler.PIPELINE_EVENTS_GAP_SECONDS - 1}
+    assert sched._poll_events() == set()
+    assert sched._event_gaps == {}
+
+
+def test_poll_does_not_track_huge_jumps(sched, monkeypatch):
+    _fake_outbox(monkeypatch, [Event(5_000_000, "file-uploaded")])
+    sched._last_event_id = 1
+    assert sched._poll_events() == {"file-uploaded"}
+    assert sched._last_event_id == 5_000_000
+    assert sched._event_gaps == {}